@@ -0,0 +1,130 @@
+# encoding: utf-8
+import gc
+import json
+import os
+import subprocess
+
+import tornado.gen
+import tornado.ioloop
+import tornado.web
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.websocket import websocket_connect
+
+from wsrpc.websocket.metrics import clock
+
+
+def start_server(handlers):
+    """ Starts the application on the random localhost port of the current IOLoop """
+    server = HTTPServer(tornado.web.Application(handlers))
+    sock, port = bind_unused_port()
+    server.add_socket(sock)
+    return server, port
+
+
+def rss():
+    """ Resident set size of the process in bytes """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError):
+        import resource
+        # Peak value in kilobytes, the best we have without procfs
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, q):
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def latency_summary(latencies, elapsed):
+    return {
+        'calls': len(latencies),
+        'calls_per_second': len(latencies) / elapsed if elapsed else None,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'p999': percentile(latencies, 0.999),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=open(os.devnull, 'w')
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Client(object):
+    """ Minimal wsrpc client on top of tornado's websocket_connect """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.serial = 1
+        self.futures = {}
+        self.notifications = 0
+        self.on_notification = None
+
+    @classmethod
+    @tornado.gen.coroutine
+    def connect(cls, url):
+        client = cls((yield websocket_connect(url)))
+        tornado.ioloop.IOLoop.current().spawn_callback(client._reader)
+        raise tornado.gen.Return(client)
+
+    @tornado.gen.coroutine
+    def _reader(self):
+        while True:
+            message = yield self.connection.read_message()
+            if message is None:
+                break
+
+            message = json.loads(message)
+            for msg in (message if isinstance(message, list) else [message]):
+                self._on_message(msg)
+
+        for future in self.futures.values():
+            future.set_exception(IOError('Connection closed'))
+
+    def _on_message(self, msg):
+        if msg.get('type') == 'call':
+            self.notifications += 1
+            if self.on_notification is not None:
+                self.on_notification(msg)
+            return
+
+        future = self.futures.pop(msg['serial'], None)
+        if future is None:
+            return
+
+        if msg['type'] == 'callback':
+            future.set_result(msg.get('data'))
+        else:
+            future.set_exception(Exception(msg.get('data')))
+
+    def call(self, func, **kwargs):
+        self.serial += 2
+        future = self.futures[self.serial] = tornado.gen.Future()
+        self.connection.write_message(json.dumps({'serial': self.serial, 'call': func, 'arguments': kwargs}))
+        return future
+
+    @tornado.gen.coroutine
+    def timed_call(self, func, **kwargs):
+        start = clock()
+        yield self.call(func, **kwargs)
+        raise tornado.gen.Return(clock() - start)
+
+    def close(self):
+        self.connection.close()
+
+
+def collect():
+    gc.collect()
+    return rss()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# encoding: utf-8
+""" permessage-deflate CPU time vs bandwidth on representative payloads.
+
+    python -m benchmarks.compression --messages 2000
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import time
+
+from wsrpc.websocket.compression import Compressor
+
+
+clock = getattr(time, 'process_time', time.clock if hasattr(time, 'clock') else time.time)
+
+WORDS = ('order', 'status', 'client', 'price', 'amount', 'delivered', 'pending', 'warehouse', 'route', 'update')
+
+
+def rows(serial):
+    return {
+        'serial': serial,
+        'type': 'callback',
+        'data': [
+            {
+                'id': serial * 100 + i,
+                'name': ' '.join(random.choice(WORDS) for _ in range(3)),
+                'price': round(random.random() * 1000, 2),
+                'tags': random.sample(WORDS, 3),
+                'updated': 1500000000 + serial + i,
+            } for i in range(50)
+        ],
+    }
+
+
+def text(serial):
+    return {
+        'serial': serial,
+        'type': 'callback',
+        'data': ' '.join(random.choice(WORDS) for _ in range(200)),
+    }
+
+
+def ack(serial):
+    return {'serial': serial, 'type': 'callback', 'data': True}
+
+
+def packed(serial):
+    # Already compressed data, e.g. images or archives
+    return {
+        'serial': serial,
+        'type': 'callback',
+        'data': base64.b64encode(os.urandom(2048)).decode('ascii'),
+    }
+
+
+PAYLOADS = {'rows': rows, 'text': text, 'ack': ack, 'packed': packed}
+
+
+def bench(messages, level, mem_level, takeover, min_size):
+    compressor = Compressor(persistent=takeover, level=level, mem_level=mem_level)
+    raw = sent = 0
+
+    start = clock()
+    for message in messages:
+        raw += len(message)
+        if len(message) < min_size:
+            sent += len(message)
+        else:
+            sent += len(compressor.compress(message))
+    elapsed = clock() - start
+
+    return {
+        'ratio': sent / float(raw),
+        'us_per_message': elapsed / len(messages) * 1e6,
+        'mb_per_second': raw / elapsed / 1e6 if elapsed else float('inf'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--payloads', default=','.join(sorted(PAYLOADS)))
+    parser.add_argument('--levels', default='1,6,9')
+    parser.add_argument('--mem-levels', default='8,9')
+    parser.add_argument('--min-size', type=int, default=256)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = []
+
+    for payload in args.payloads.split(','):
+        messages = [json.dumps(PAYLOADS[payload](i)).encode('utf-8') for i in range(args.messages)]
+        size = sum(map(len, messages)) // len(messages)
+
+        for level in map(int, args.levels.split(',')):
+            for mem_level in map(int, args.mem_levels.split(',')):
+                for takeover in (True, False):
+                    result = bench(messages, level, mem_level, takeover, args.min_size)
+                    result.update(
+                        payload=payload, size=size, level=level,
+                        mem_level=mem_level, context_takeover=takeover
+                    )
+                    results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=1))
+        return
+
+    print("{0:<8} {1:>6} {2:>5} {3:>4} {4:>9} {5:>7} {6:>10} {7:>8}".format(
+        'payload', 'size', 'level', 'mem', 'takeover', 'ratio', 'us/msg', 'MB/s'
+    ))
+    for r in results:
+        print("{payload:<8} {size:>6} {level:>5} {mem_level:>4} {context_takeover!s:>9} "
+              "{ratio:>7.3f} {us_per_message:>10.1f} {mb_per_second:>8.1f}".format(**r))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# encoding: utf-8
+""" Route resolution microbenchmark: the legacy per-message resolver vs the precompiled dispatch table.
+
+    python -m benchmarks.dispatch --routes 50 --methods 20
+"""
+import argparse
+import time
+import types
+from functools import partial
+
+from wsrpc import WebSocketRoute, WebSocket
+from wsrpc.websocket.route import decorators
+
+
+def make_route(index, methods):
+    body = dict(('method{0}'.format(i), lambda self, **kw: kw) for i in range(methods))
+    body['init'] = lambda self, **kw: True
+    return type('Route{0}'.format(index), (WebSocketRoute,), body)
+
+
+class LegacyResolver(object):
+    """ The resolution logic of wsrpc <= 0.5.6 kept here as a baseline """
+
+    def __init__(self, routes):
+        self.ROUTES = routes
+        self.handlers = {}
+
+    def _unresolvable(self, *args, **kwargs):
+        raise NotImplementedError('Callback function not implemented')
+
+    @staticmethod
+    def _route_resolve(route, method):
+        if method.startswith('_'):
+            raise AttributeError('Trying to get private method.')
+
+        if hasattr(route, method):
+            func = getattr(route, method)
+            if func in decorators._NOPROXY:
+                raise NotImplementedError('Method not implemented')
+            return func
+        raise NotImplementedError('Method not implemented')
+
+    def resolver(self, func_name):
+        class_name, method = func_name.split('.') if '.' in func_name else (func_name, 'init')
+        callee = self.ROUTES.get(class_name, self._unresolvable)
+        if callee == self._unresolvable or (hasattr(callee, '__self__') and isinstance(callee.__self__, WebSocketRoute)) or \
+                (not isinstance(callee, types.FunctionType) and issubclass(callee, WebSocketRoute)):
+            if self.handlers.get(class_name, None) is None:
+                self.handlers[class_name] = callee(self)
+
+            return self._route_resolve(self.handlers[class_name], method)
+
+        return self.ROUTES.get(func_name, self._unresolvable)
+
+    def prepare(self, func_name, args, kwargs):
+        callee = self.resolver(func_name)
+        if not (hasattr(callee, '__self__') and isinstance(callee.__self__, WebSocketRoute)):
+            args = [self] + list(args)
+        return partial(callee, *args, **kwargs)
+
+
+def bench(prepare, names, rounds):
+    kwargs = {'a': 1}
+    start = time.time()
+    for _ in range(rounds):
+        for name in names:
+            prepare(name, (), kwargs)()
+    return (rounds * len(names)) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--routes', type=int, default=50)
+    parser.add_argument('--methods', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    routes = dict(('route{0}'.format(i), make_route(i, args.methods)) for i in range(args.routes))
+    routes['func'] = lambda socket, **kw: kw
+
+    names = ['route{0}.method{1}'.format(r, m) for r in range(args.routes) for m in range(args.methods)]
+    names.append('func')
+
+    class Handler(WebSocket):
+        ROUTES = dict(routes)
+
+    handler = Handler.__new__(Handler)
+    handler._WebSocketBase__handlers = {}
+
+    legacy = bench(LegacyResolver(dict(routes)).prepare, names, args.rounds)
+    compiled = bench(lambda *a: handler._resolve(*a)[0], names, args.rounds)
+
+    print("legacy resolver:  {0:>12.0f} calls/s".format(legacy))
+    print("dispatch table:   {0:>12.0f} calls/s".format(compiled))
+    print("speedup:          {0:>12.2f}x".format(compiled / legacy))
+
+
+if __name__ == '__main__':
+    main()
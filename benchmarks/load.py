@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# encoding: utf-8
+""" Throughput, tail latency, memory and broadcast fan-out of WebSocket, WebSocketThreaded and WebSocketHybrid.
+
+The handlers are started in-process on localhost and driven by concurrent
+``websocket_connect`` clients of the same process. Results are written as
+JSON, so runs of different commits might be compared.
+
+    python -m benchmarks.load --clients 50 --calls 200 --output results.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import tornado
+import tornado.gen
+import tornado.ioloop
+
+from wsrpc import WebSocket, WebSocketThreaded, WebSocketHybrid, WebSocketRoute
+
+from .common import Client, start_server, latency_summary, git_revision, collect, clock
+
+
+class AsyncHandler(WebSocket):
+    pass
+
+
+class ThreadedHandler(WebSocketThreaded):
+    pass
+
+
+class HybridHandler(WebSocketHybrid):
+    pass
+
+
+class Bench(WebSocketRoute):
+    def echo(self, **kwargs):
+        return kwargs
+
+    @tornado.gen.coroutine
+    def async_echo(self, **kwargs):
+        yield tornado.gen.moment
+        raise tornado.gen.Return(kwargs)
+
+
+WebSocket.ROUTES['bench'] = Bench
+
+HANDLERS = [
+    (r'/ws/async', AsyncHandler),
+    (r'/ws/threaded', ThreadedHandler),
+    (r'/ws/hybrid', HybridHandler),
+]
+
+
+@tornado.gen.coroutine
+def connect(port, path, count):
+    url = 'ws://localhost:{0}{1}'.format(port, path)
+    clients = []
+
+    # Connect in chunks, too many simultaneous handshakes overflow the listen backlog
+    for offset in range(0, count, 100):
+        clients.extend((yield [Client.connect(url) for _ in range(min(100, count - offset))]))
+
+    raise tornado.gen.Return(clients)
+
+
+@tornado.gen.coroutine
+def calls(port, path, func, clients, calls, payload):
+    clients = yield connect(port, path, clients)
+    latencies = []
+
+    @tornado.gen.coroutine
+    def worker(client):
+        for _ in range(calls):
+            latencies.append((yield client.timed_call(func, payload=payload)))
+
+    start = clock()
+    yield [worker(client) for client in clients]
+    elapsed = clock() - start
+
+    for client in clients:
+        client.close()
+
+    raise tornado.gen.Return(latency_summary(latencies, elapsed))
+
+
+@tornado.gen.coroutine
+def idle(port, path, clients):
+    before = collect()
+    connections = yield connect(port, path, clients)
+    yield tornado.gen.sleep(0.5)
+    after = collect()
+
+    for client in connections:
+        client.close()
+
+    raise tornado.gen.Return({
+        'clients': clients,
+        'rss_before': before,
+        'rss_after': after,
+        # client side objects live in the same process and are counted too
+        'bytes_per_connection': (after - before) / float(clients),
+    })
+
+
+@tornado.gen.coroutine
+def broadcast(port, path, handler, clients, rounds):
+    connections = yield connect(port, path, clients)
+    timings = []
+
+    for _ in range(rounds):
+        done = tornado.gen.Future()
+        received = [0]
+
+        def on_notification(msg):
+            received[0] += 1
+            if received[0] == len(connections) and not done.done():
+                done.set_result(None)
+
+        for client in connections:
+            client.on_notification = on_notification
+
+        start = clock()
+        handler.broadcast('notify', value=1)
+        yield done
+        timings.append(clock() - start)
+
+    for client in connections:
+        client.close()
+
+    raise tornado.gen.Return({
+        'clients': clients,
+        'rounds': rounds,
+        'best': min(timings),
+        'mean': sum(timings) / len(timings),
+    })
+
+
+@tornado.gen.coroutine
+def run(args):
+    server, port = start_server(HANDLERS)
+    ThreadedHandler.init_pool(args.workers)
+    HybridHandler.init_pool(args.workers)
+
+    large = 'x' * args.large_payload
+    scenarios = {
+        'sync': lambda: calls(port, '/ws/threaded', 'bench.echo', args.clients, args.calls, 'x'),
+        'async': lambda: calls(port, '/ws/async', 'bench.async_echo', args.clients, args.calls, 'x'),
+        # coroutines are run on the IOLoop by the hybrid handler and in the pool by the threaded one
+        'threaded_async': lambda: calls(port, '/ws/threaded', 'bench.async_echo', args.clients, args.calls, 'x'),
+        'hybrid_async': lambda: calls(port, '/ws/hybrid', 'bench.async_echo', args.clients, args.calls, 'x'),
+        'large': lambda: calls(port, '/ws/async', 'bench.echo', args.clients, max(1, args.calls // 10), large),
+        'idle': lambda: idle(port, '/ws/async', args.idle_clients),
+        'broadcast': lambda: broadcast(port, '/ws/async', AsyncHandler, args.idle_clients, args.rounds),
+    }
+
+    names = sorted(scenarios) if args.scenario == 'all' else args.scenario.split(',')
+    results = {}
+
+    for name in names:
+        sys.stderr.write('Running {0}...\n'.format(name))
+        results[name] = yield scenarios[name]()
+        # let the server close the connections of the scenario
+        yield tornado.gen.sleep(0.5)
+
+    server.stop()
+    raise tornado.gen.Return(results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', default='all',
+                        help='Comma separated: sync,async,threaded_async,hybrid_async,large,idle,broadcast')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--calls', type=int, default=200, help='Calls per client')
+    parser.add_argument('--large-payload', type=int, default=256 * 1024, help='Bytes')
+    parser.add_argument('--idle-clients', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=10, help='Broadcast rounds')
+    parser.add_argument('--workers', type=int, default=4, help='Thread pool size of WebSocketThreaded and WebSocketHybrid')
+    parser.add_argument('--output', help='JSON file, stdout by default')
+    args = parser.parse_args()
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'tornado': tornado.version,
+        'arguments': vars(args),
+        'results': tornado.ioloop.IOLoop.current().run_sync(lambda: run(args)),
+    }
+
+    output = json.dumps(results, indent=1, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# encoding: utf-8
+""" Server memory per idle connection.
+
+The handler is started in-process and the idle clients are connected from
+a child process, so the client side objects aren't counted. Python heap is
+measured by tracemalloc (Python 3.4+), RSS includes the sockets and tornado's
+stream buffers too.
+
+    python -m benchmarks.memory --clients 10000
+"""
+import argparse
+import gc
+import json
+import subprocess
+import sys
+
+import tornado.gen
+import tornado.ioloop
+import tornado.iostream
+from tornado.websocket import websocket_connect
+
+from wsrpc import WebSocket
+
+from .common import start_server, collect, git_revision
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+
+class Handler(WebSocket):
+    pass
+
+
+@tornado.gen.coroutine
+def clients(port, count):
+    """ The child process: connects the idle clients and waits for EOF of stdin """
+
+    url = 'ws://localhost:{0}/ws/'.format(port)
+    connections = []
+
+    for offset in range(0, count, 100):
+        connections.extend((yield [websocket_connect(url) for _ in range(min(100, count - offset))]))
+
+    sys.stdout.write('connected\n')
+    sys.stdout.flush()
+
+    stdin = tornado.iostream.PipeIOStream(sys.stdin.fileno())
+    try:
+        yield stdin.read_until_close()
+    except tornado.iostream.StreamClosedError:
+        pass
+
+
+def traced():
+    if tracemalloc is None:
+        return None
+
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+@tornado.gen.coroutine
+def run(count):
+    server, port = start_server([(r'/ws/', Handler)])
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+    heap_before, rss_before = traced(), collect()
+
+    child = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.memory', '--connect', str(port), '--clients', str(count)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+    output = tornado.iostream.PipeIOStream(child.stdout.fileno())
+    yield output.read_until(b'\n')
+
+    # let the server finish the handshakes
+    while len(Handler._CLIENTS) < count:
+        yield tornado.gen.sleep(0.1)
+
+    yield tornado.gen.sleep(0.5)
+    heap_after, rss_after = traced(), collect()
+
+    child.stdin.close()
+    child.wait()
+    output.close()
+    server.stop()
+
+    result = {
+        'clients': count,
+        'rss_bytes_per_connection': (rss_after - rss_before) / float(count),
+        'heap_bytes_per_connection': None,
+    }
+
+    if tracemalloc is not None:
+        result['heap_bytes_per_connection'] = (heap_after - heap_before) / float(count)
+
+    raise tornado.gen.Return(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--connect', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    ioloop = tornado.ioloop.IOLoop.current()
+
+    if args.connect:
+        return ioloop.run_sync(lambda: clients(args.connect, args.clients))
+
+    results = {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'results': ioloop.run_sync(lambda: run(args.clients)),
+    }
+
+    print(json.dumps(results, indent=1, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
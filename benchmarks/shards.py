@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# encoding: utf-8
+""" Throughput of the one IOLoop against the connections sharded across the IOLoop threads.
+
+The route compresses the buffer by zlib, which releases the GIL like most of
+the I/O and C extensions do. The clients are connected from the child
+processes, so they don't compete with the server for its GIL. The gain is
+bounded by the number of cores.
+
+    python -m benchmarks.shards --shards 0,2,4 --clients 64 --duration 5
+
+``0`` is the plain HTTPServer in the main IOLoop.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import zlib
+
+import tornado.gen
+import tornado.ioloop
+import tornado.iostream
+import tornado.web
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from wsrpc import WebSocket, ShardedHTTPServer
+
+from .common import Client, git_revision, latency_summary, clock
+
+
+PAYLOAD = os.urandom(64 * 1024) + b'\x00' * 192 * 1024
+
+
+def usable_cpus():
+    # The gain is bounded by the CPUs the process may run on, not by the CPUs of the host
+    affinity = getattr(os, 'sched_getaffinity', None)
+    return len(affinity(0)) if affinity is not None else multiprocessing.cpu_count()
+
+
+def compress(socket, level=6):
+    return len(zlib.compress(PAYLOAD, level))
+
+
+class Handler(WebSocket):
+    ROUTES = {'compress': compress}
+
+
+@tornado.gen.coroutine
+def clients(port, count, duration):
+    """ The child process: calls the route in the closed loop and prints the latencies """
+
+    url = 'ws://localhost:{0}/ws/'.format(port)
+    connections = yield [Client.connect(url) for _ in range(count)]
+    latencies = []
+    deadline = clock() + duration
+
+    @tornado.gen.coroutine
+    def worker(client):
+        while clock() < deadline:
+            latencies.append((yield client.timed_call('compress')))
+
+    yield [worker(client) for client in connections]
+
+    for client in connections:
+        client.close()
+
+    sys.stdout.write(json.dumps(latencies) + '\n')
+    sys.stdout.flush()
+
+
+@tornado.gen.coroutine
+def run(shards, count, processes, duration):
+    application = tornado.web.Application([(r'/ws/', Handler)])
+    server = ShardedHTTPServer(application, shards=shards) if shards else HTTPServer(application)
+    sock, port = bind_unused_port()
+    server.add_socket(sock)
+
+    children = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.shards', '--connect', str(port),
+             '--clients', str(count // processes), '--duration', str(duration)],
+            stdout=subprocess.PIPE
+        )
+        for _ in range(processes)
+    ]
+
+    latencies = []
+    for child in children:
+        output = tornado.iostream.PipeIOStream(child.stdout.fileno())
+        latencies.extend(json.loads((yield output.read_until(b'\n')).decode('utf-8')))
+        output.close()
+        child.wait()
+
+    server.stop()
+
+    result = latency_summary(latencies, duration)
+    result['shards'] = shards
+    raise tornado.gen.Return(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', default='0,{0}'.format(usable_cpus()),
+                        help='comma separated numbers of shards, 0 is the single IOLoop')
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--processes', type=int, default=min(4, usable_cpus()))
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--connect', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    ioloop = tornado.ioloop.IOLoop.current()
+
+    if args.connect:
+        return ioloop.run_sync(lambda: clients(args.connect, args.clients, args.duration))
+
+    results = {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'cpus': usable_cpus(),
+        'results': [
+            ioloop.run_sync(lambda: run(int(shards), args.clients, args.processes, args.duration))
+            for shards in args.shards.split(',')
+        ],
+    }
+
+    print(json.dumps(results, indent=1, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding: utf-8
+""" IOLoop timer heap size and per-call allocation under sustained load.
+
+    python -m benchmarks.timers --rate 5000 --duration 5
+"""
+import argparse
+import json
+import time
+
+import tornado.gen
+import tornado.ioloop
+from tornado.websocket import websocket_connect
+
+from wsrpc import WebSocket
+
+from .common import start_server
+
+
+def echo(socket, **kwargs):
+    return kwargs
+
+
+WebSocket.ROUTES['echo'] = echo
+
+
+@tornado.gen.coroutine
+def load(port, rate, duration):
+    ioloop = tornado.ioloop.IOLoop.current()
+    connection = yield websocket_connect('ws://localhost:{0}/ws/'.format(port))
+
+    heap = []
+    serial = 1
+    tick = 0.01
+    per_tick = max(1, int(rate * tick))
+    deadline = time.time() + duration
+
+    @tornado.gen.coroutine
+    def reader():
+        while True:
+            message = yield connection.read_message()
+            if message is None:
+                break
+
+    ioloop.spawn_callback(reader)
+
+    while time.time() < deadline:
+        for _ in range(per_tick):
+            serial += 2
+            connection.write_message(json.dumps({'serial': serial, 'call': 'echo', 'arguments': {'i': serial}}))
+
+        heap.append(len(ioloop._timeouts))
+        yield tornado.gen.sleep(tick)
+
+    connection.close()
+    raise tornado.gen.Return({
+        'messages': (serial - 1) // 2,
+        'rate': (serial - 1) // 2 / float(duration),
+        'timer_heap_max': max(heap),
+        'timer_heap_avg': sum(heap) / float(len(heap)),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=int, default=5000, help='Messages per second')
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+
+    server, port = start_server([(r'/ws/', WebSocket)])
+
+    result = tornado.ioloop.IOLoop.current().run_sync(lambda: load(port, args.rate, args.duration))
+    print(json.dumps(result, indent=1))
+
+
+if __name__ == '__main__':
+    main()
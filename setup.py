@@ -55,4 +55,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require={
+        'msgpack': ['msgpack'],
+    },
 )
@@ -11,11 +11,14 @@ except ImportError:
     import builtins as exceptions
 
 from tornado import testing, websocket
+from tornado.queues import Queue
 from tornado.httpserver import HTTPServer
-from wsrpc import WebSocket, WebSocketThreaded
+from wsrpc import WebSocket, WebSocketThreaded, WebSocketHybrid
+from wsrpc.websocket import attachments, codecs
 
 from .async import TestRoute as TestAsyncRoute
 from .sync import TestRoute as TestSyncRoute
+from .hybrid import TestRoute as TestHybridRoute
 
 try:
     import ujson as json
@@ -28,6 +31,7 @@ class Application(tornado.web.Application):
         handlers = (
             (r"/ws/async", WebSocket),
             (r"/ws/sync", WebSocketThreaded),
+            (r"/ws/hybrid", WebSocketHybrid),
         )
 
         tornado.web.Application.__init__(self, handlers)
@@ -38,6 +42,9 @@ class TestBase(testing.AsyncTestCase):
         super(TestBase, self).setUp()
         self._serial = 0
         self._futures = {}
+        self._chunks = {}
+        self.grant_credits = True
+        self.incoming = Queue()
 
         self.application = Application()
         self.server = HTTPServer(self.application)
@@ -59,18 +66,39 @@ class TestBase(testing.AsyncTestCase):
             self.connection = yield self.connection
 
         while self.connection.protocol is not None:
-            message = json.loads((yield self.connection.read_message()))
-            data = message.get('data')
-            typ = message.get('type')
-
-            f = self._futures.pop(message['serial'])
-
-            if typ == 'callback':
-                f.set_result(data)
-            elif typ == 'error':
-                f.set_exception(getattr(exceptions, data['type'], Exception)(data['message']))
-            else:
-                f.set_exception(TypeError('Unknown message type {0}'.format(typ)))
+            message = yield self.connection.read_message()
+            if message is None:
+                # The connection is closed
+                break
+
+            message = codecs.JSON.loads(message)
+            for msg in (message if isinstance(message, list) else [message]):
+                self._on_response(msg)
+
+    def _on_response(self, message):
+        data = message.get('data')
+        typ = message.get('type')
+
+        if typ in ('call', 'drain'):
+            self.incoming.put(message)
+            return
+
+        if typ == 'chunk':
+            self._chunks.setdefault(message['serial'], []).append(data)
+            if self.grant_credits:
+                self.grant(message['serial'])
+            return
+
+        f = self._futures.pop(message['serial'])
+
+        if typ == 'callback':
+            f.set_result(data)
+        elif typ == 'end':
+            f.set_result(self._chunks.pop(message['serial'], []))
+        elif typ == 'error':
+            f.set_exception(getattr(exceptions, data['type'], Exception)(data['message']))
+        else:
+            f.set_exception(TypeError('Unknown message type {0}'.format(typ)))
 
     @coroutine
     def tearDown(self):
@@ -90,23 +118,46 @@ class TestBase(testing.AsyncTestCase):
 
         self.io_loop.add_callback(
             self.connection.write_message,
-            data
+            data,
+            binary=attachments.is_frame(data)
         )
 
-    def call(self, func, **kwargs):
+    def _make_call(self, func, kwargs):
         assert isinstance(func, str)
 
         serial = self._get_serial()
+        self._futures[serial] = Future()
+
+        return {
+            'call': func,
+            'serial': serial,
+            'arguments': kwargs
+        }
+
+    def call(self, func, **kwargs):
+        message = self._make_call(func, kwargs)
+        self.io_loop.add_callback(self._call_coro, codecs.JSON.dumps(message))
+        return self._futures[message['serial']]
+
+    def traced_call(self, trace, func, **kwargs):
+        message = self._make_call(func, kwargs)
+        message['trace'] = trace
+        self.io_loop.add_callback(self._call_coro, codecs.JSON.dumps(message))
+        return self._futures[message['serial']]
+
+    def grant(self, serial, credit=1):
+        self.io_loop.add_callback(
+            self._call_coro,
+            json.dumps({'serial': serial, 'type': 'credit', 'data': credit})
+        )
 
+    def cancel(self, serial):
         self.io_loop.add_callback(
             self._call_coro,
-            json.dumps({
-                'call': func,
-                'serial': serial,
-                'arguments': kwargs
-            })
+            json.dumps({'serial': serial, 'type': 'cancel'})
         )
 
-        f = Future()
-        self._futures[serial] = f
-        return f
+    def batch(self, *calls):
+        messages = [self._make_call(func, kwargs) for func, kwargs in calls]
+        self.io_loop.add_callback(self._call_coro, json.dumps(messages))
+        return [self._futures[message['serial']] for message in messages]
@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 # encoding: utf-8
+import sys
+
 from tornado.gen import coroutine, sleep, Return
-from wsrpc import WebSocketRoute, WebSocket
+from wsrpc import WebSocketRoute, WebSocket, decorators
+from wsrpc.websocket import tracing
 
 
 class TestRoute(WebSocketRoute):
@@ -26,3 +29,81 @@ def sync_func(socket, **kwargs):
     return kwargs
 
 WebSocket.ROUTES['sync_func'] = sync_func
+
+
+@coroutine
+def call_client(socket, timeout):
+    try:
+        result = yield socket.call_with_timeout(timeout, 'echo', value=1)
+    except Exception as e:
+        raise Return(type(e).__name__)
+
+    raise Return(result)
+
+WebSocket.ROUTES['call_client'] = call_client
+
+
+@coroutine
+def sleep_func(socket, seconds):
+    yield sleep(seconds)
+    raise Return(seconds)
+
+WebSocket.ROUTES['sleep_func'] = sleep_func
+
+
+def trace_func(socket):
+    trace = tracing.current()
+    return trace and trace.id
+
+WebSocket.ROUTES['trace_func'] = trace_func
+
+
+@decorators.rate_limit(1, burst=2)
+def limited_func(socket):
+    return True
+
+WebSocket.ROUTES['limited_func'] = limited_func
+
+
+def binary_func(socket, data, **kwargs):
+    return {'size': len(data), 'data': data, 'reversed': bytes(data)[::-1]}
+
+WebSocket.ROUTES['binary_func'] = binary_func
+
+
+def unencodable_func(socket):
+    return object()
+
+WebSocket.ROUTES['unencodable_func'] = unencodable_func
+
+
+if sys.version_info >= (3, 6):
+    # The syntax of async generators can't be compiled by the older Pythons
+    exec('''
+async def async_stream_func(socket, count):
+    for value in range(count):
+        await sleep(0)
+        yield value
+''')
+
+    WebSocket.ROUTES['async_stream_func'] = async_stream_func
+
+
+class GuardedRoute(WebSocketRoute):
+    def _resolve(self, method):
+        if method == 'secret':
+            raise AttributeError('Access denied')
+
+        return super(GuardedRoute, self)._resolve(method)
+
+    def secret(self):
+        return 'dropped!'
+
+    def public(self):
+        return True
+
+    @decorators.rate_limit(1, burst=1)
+    def limited(self):
+        return True
+
+WebSocket.ROUTES['guarded'] = GuardedRoute
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import sys
+import threading
+from tornado.concurrent import futures
+from tornado.gen import coroutine, moment, Return
+from wsrpc import WebSocketRoute, WebSocketHybrid, decorators
+
+
+pool = futures.ThreadPoolExecutor(1)
+
+
+def thread_name():
+    return threading.current_thread().name
+
+
+class TestRoute(WebSocketRoute):
+    def blocking(self):
+        return thread_name()
+
+    @coroutine
+    def coroutine(self):
+        name = thread_name()
+        yield moment
+        raise Return(name)
+
+    @decorators.nonblocking
+    def getter(self):
+        return thread_name()
+
+    def future(self):
+        # The blocking route returns the future of another pool
+        return pool.submit(thread_name)
+
+
+
+if sys.version_info >= (3, 5):
+    # The syntax of native coroutines can't be compiled by the older Pythons
+    exec('''
+async def native(self):
+    name = thread_name()
+    await moment
+    return name
+''')
+
+    TestRoute.native = native
+
+
+WebSocketHybrid.ROUTES['hybrid'] = TestRoute
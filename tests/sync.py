@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 # encoding: utf-8
+import os
+import threading
 from time import sleep
-from wsrpc import WebSocketRoute, WebSocketThreaded
+from wsrpc import WebSocketRoute, WebSocketThreaded, decorators
+from wsrpc.websocket import cancellation
 
 
 class TestRoute(WebSocketRoute):
@@ -16,6 +19,42 @@ class TestRoute(WebSocketRoute):
         sleep(0.1)
         return args, kwargs
 
+    def stream(self, count):
+        for i in range(count):
+            yield i
+
+    @decorators.executor('inline')
+    def inline_method(self):
+        return threading.current_thread().name
+
+    @decorators.executor('io')
+    def io_method(self):
+        return threading.current_thread().name
+
+    executions = 0
+    cancelled = threading.Event()
+
+    def long_method(self):
+        token = cancellation.current()
+        for _ in range(100):
+            if token.cancelled:
+                TestRoute.cancelled.set()
+                return
+            sleep(0.01)
+
+    @decorators.cached(ttl=60)
+    def cached_method(self, value):
+        sleep(0.1)
+        TestRoute.executions += 1
+        return value
+
+    @decorators.cached(ttl=60)
+    def cached_long_method(self, value):
+        for _ in range(20):
+            cancellation.current().check()
+            sleep(0.01)
+        return value
+
 
 WebSocketThreaded.ROUTES['sync'] = TestRoute
 
@@ -25,3 +64,11 @@ def sync_func(socket, **kwargs):
 
 
 WebSocketThreaded.ROUTES['sync_func'] = sync_func
+
+
+@decorators.executor('cpu')
+def cpu_func(**kwargs):
+    return os.getpid(), sum(kwargs.values())
+
+
+WebSocketThreaded.ROUTES['cpu_func'] = cpu_func
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from unittest import TestCase
+
+from wsrpc import WebSocket
+from wsrpc.websocket.admission import Overloaded, TokenBucket
+
+
+class TestTokenBucket(TestCase):
+    def test_burst(self):
+        bucket = TokenBucket(2, burst=3, now=0)
+
+        self.assertEqual([bucket.take(0) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(bucket.take(0), 0.5)
+
+    def test_refill(self):
+        bucket = TokenBucket(10, burst=1, now=0)
+
+        self.assertEqual(bucket.take(0), 0)
+        self.assertAlmostEqual(bucket.take(0.05), 0.05)
+        self.assertEqual(bucket.take(0.1), 0)
+
+        # Tokens aren't accumulated over the burst
+        self.assertEqual(bucket.take(100), 0)
+        self.assertGreater(bucket.take(100), 0)
+
+    def test_default_burst(self):
+        self.assertEqual(TokenBucket(0.5).burst, 1)
+        self.assertEqual(TokenBucket(20).burst, 20)
+
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+    def test_error(self):
+        error = WebSocket._format_error(Overloaded('Server is overloaded', 1.5))
+        self.assertEqual(error, {'type': 'Overloaded', 'message': 'Server is overloaded', 'retry_after': 1.5})
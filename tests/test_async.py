@@ -1,6 +1,16 @@
 #!/usr/bin/env python
 # encoding: utf-8
+import json
+import sys
+from unittest import skipUnless
+
+from tornado.gen import sleep
+from tornado.httpclient import HTTPError
 from tornado.testing import gen_test
+from tornado.websocket import websocket_connect
+from wsrpc import WebSocket
+from wsrpc.websocket.bus import LocalBus
+from wsrpc.websocket.tracing import MemorySink, Tracer
 from . import TestBase
 
 
@@ -21,3 +31,376 @@ class TestAsync(TestBase):
         kw = dict(test=True, arg0=1, arg1=2, arg2=3, arg3=4)
         result = yield self.call('sync_func', **kw)
         self.assertEqual(result, kw)
+
+    @gen_test
+    def test_batch(self):
+        kw = dict(test=True, arg0=1)
+        futures = self.batch(('sync.simple_method', kw), ('sync_func', kw), ('sync.unknown', {}))
+        self.assertEqual((yield futures[:2]), [kw, kw])
+
+        with self.assertRaises(NotImplementedError):
+            yield futures[2]
+
+    @gen_test
+    def test_batch_max_delay(self):
+        slow, fast = self.batch(('sleep_func', {'seconds': 0.5}), ('sync_func', {'value': 1}))
+
+        # The slow call doesn't hold the reply of the fast one
+        self.assertEqual((yield fast), {'value': 1})
+        self.assertFalse(slow.done())
+        self.assertEqual((yield slow), 0.5)
+
+    @gen_test
+    def test_unencodable_result(self):
+        with self.assertRaises(TypeError):
+            yield self.call('unencodable_func')
+
+        # The rest of the batch is replied
+        kw = dict(value=1)
+        futures = self.batch(('sync_func', kw), ('unencodable_func', {}), ('sync.simple_method', kw))
+        self.assertEqual((yield [futures[0], futures[2]]), [kw, kw])
+
+        with self.assertRaises(TypeError):
+            yield futures[1]
+
+    @gen_test
+    def test_broadcast(self):
+        yield self.call('sync_func')
+        yield WebSocket.broadcast('notify', value=1)
+
+        message = yield self.incoming.get()
+        self.assertEqual(message['serial'], 0)
+        self.assertEqual(message['call'], 'notify')
+        self.assertEqual(message['arguments'], {'value': 1})
+
+    @gen_test
+    def test_broadcast_bus(self):
+        yield self.call('sync_func')
+        WebSocket.use_bus(LocalBus())
+        self.addCleanup(WebSocket.use_bus, None)
+
+        yield WebSocket.broadcast('notify', value=1)
+
+        message = yield self.incoming.get()
+        self.assertEqual(message['call'], 'notify')
+        self.assertEqual(message['arguments'], {'value': 1})
+
+    @gen_test
+    def test_send_to(self):
+        yield self.call('sync_func')
+
+        for client_id in list(WebSocket._CLIENTS):
+            yield WebSocket.send_to(client_id, 'notify', value=2)
+
+        message = yield self.incoming.get()
+        self.assertEqual(message['serial'], 0)
+        self.assertEqual(message['arguments'], {'value': 2})
+
+    @gen_test
+    def test_publish(self):
+        WebSocket._WILDCARD_SUBSCRIPTIONS = True
+        self.addCleanup(delattr, WebSocket, '_WILDCARD_SUBSCRIPTIONS')
+
+        self.assertTrue((yield self.call('subscribe', channel='news.*')))
+        yield WebSocket.publish('weather', 'notify', value=1)
+        yield WebSocket.publish('news.sport', 'notify', value=2)
+
+        message = yield self.incoming.get()
+        self.assertEqual(message['arguments'], {'value': 2})
+
+        yield self.call('unsubscribe', channel='news.*')
+        self.assertNotIn('news.*', WebSocket._CHANNELS)
+
+    @gen_test
+    def test_subscription_limits(self):
+        WebSocket._MAX_SUBSCRIPTIONS = 2
+        self.addCleanup(delattr, WebSocket, '_MAX_SUBSCRIPTIONS')
+
+        # Clients can't subscribe to everything unless it's allowed
+        for channel in ('*', 'news.*'):
+            with self.assertRaises(Exception) as context:
+                yield self.call('subscribe', channel=channel)
+            self.assertIn(channel, str(context.exception))
+
+        for channel in ('news', 'sport', 'news'):
+            self.assertTrue((yield self.call('subscribe', channel=channel)))
+
+        with self.assertRaises(Exception) as context:
+            yield self.call('subscribe', channel='weather')
+        self.assertIn('Too many subscriptions', str(context.exception))
+
+        yield self.call('unsubscribe', channel='sport')
+        self.assertTrue((yield self.call('subscribe', channel='weather')))
+
+    @gen_test
+    def test_publish_closed(self):
+        yield self.call('subscribe', channel='closed')
+        self.connection.close()
+        yield sleep(0.1)
+
+        self.assertNotIn('closed', WebSocket._CHANNELS)
+
+    def reply(self, serial, data):
+        return self._call_coro(json.dumps({'serial': serial, 'type': 'callback', 'data': data}))
+
+    @gen_test
+    def test_call_timeout(self):
+        result = self.call('call_client', timeout=0.2)
+        message = yield self.incoming.get()
+
+        self.assertEqual(message['call'], 'echo')
+        self.assertEqual((yield result), 'CallTimeout')
+
+        # The late reply is ignored
+        yield self.reply(message['serial'], 1)
+        self.assertEqual((yield self.call('sync_func', value=1)), {'value': 1})
+
+    @gen_test
+    def test_pending_calls_limit(self):
+        WebSocket._MAX_PENDING_CALLS = 1
+        self.addCleanup(delattr, WebSocket, '_MAX_PENDING_CALLS')
+
+        first = self.call('call_client', timeout=5)
+        message = yield self.incoming.get()
+        self.assertEqual((yield self.call('call_client', timeout=5)), 'TooManyPendingCalls')
+
+        yield self.reply(message['serial'], 'reply')
+        self.assertEqual((yield first), 'reply')
+
+    @gen_test
+    def test_cancel(self):
+        cancelled = WebSocket.metrics.cancelled
+        future = self.call('sleep_func', seconds=0.3)
+        self.cancel(self._serial)
+
+        self.assertEqual((yield self.call('sleep_func', seconds=0.01)), 0.01)
+        yield sleep(0.4)
+
+        self.assertFalse(future.done())
+        self.assertEqual(WebSocket.metrics.cancelled, cancelled + 1)
+
+    @gen_test
+    def test_cancel_queued(self):
+        WebSocket._MAX_CONCURRENT_CALLS = 1
+        self.addCleanup(delattr, WebSocket, '_MAX_CONCURRENT_CALLS')
+        yield self.call('sync_func')
+
+        first = self.call('sleep_func', seconds=0.1)
+        self.call('sleep_func', seconds=0.1)
+        self.cancel(self._serial)
+
+        self.assertEqual((yield first), 0.1)
+        # The slot of the cancelled call isn't lost
+        self.assertEqual((yield self.call('sleep_func', seconds=0.01)), 0.01)
+
+    @gen_test
+    def test_connection_rate_limit(self):
+        WebSocket._RATE_LIMIT, WebSocket._RATE_BURST = 1, 2
+        self.addCleanup(delattr, WebSocket, '_RATE_LIMIT')
+        self.addCleanup(delattr, WebSocket, '_RATE_BURST')
+        shed = WebSocket.metrics.shed['connection']
+
+        self.assertEqual((yield self.call('sync_func', value=1)), {'value': 1})
+        self.assertEqual((yield self.call('sync_func', value=2)), {'value': 2})
+
+        with self.assertRaises(Exception) as context:
+            yield self.call('sync_func', value=3)
+        self.assertIn('Rate limit of the connection', str(context.exception))
+
+        self.assertEqual(WebSocket.metrics.shed['connection'], shed + 1)
+
+    @gen_test
+    def test_route_rate_limit(self):
+        shed = WebSocket.metrics.shed['route']
+        results = yield [self.call('limited_func'), self.call('limited_func')]
+        self.assertEqual(results, [True, True])
+
+        with self.assertRaises(Exception) as context:
+            yield self.call('limited_func')
+        self.assertIn('Rate limit of limited_func', str(context.exception))
+
+        # Other routes aren't limited
+        self.assertEqual((yield self.call('sync_func', value=1)), {'value': 1})
+        self.assertEqual(WebSocket.metrics.shed['route'], shed + 1)
+
+    @gen_test
+    def test_max_in_flight(self):
+        WebSocket._MAX_IN_FLIGHT = 1
+        self.addCleanup(delattr, WebSocket, '_MAX_IN_FLIGHT')
+        shed = WebSocket.metrics.shed['concurrency']
+
+        first = self.call('sleep_func', seconds=0.1)
+
+        with self.assertRaises(Exception) as context:
+            yield self.call('sync_func', value=1)
+        self.assertIn('overloaded', str(context.exception))
+
+        self.assertEqual((yield first), 0.1)
+        self.assertEqual((yield self.call('sync_func', value=1)), {'value': 1})
+        self.assertEqual(WebSocket.metrics.shed['concurrency'], shed + 1)
+
+    @gen_test
+    def test_max_in_flight_queued(self):
+        WebSocket._MAX_IN_FLIGHT, WebSocket._MAX_CONCURRENT_CALLS = 2, 1
+        self.addCleanup(delattr, WebSocket, '_MAX_IN_FLIGHT')
+        self.addCleanup(delattr, WebSocket, '_MAX_CONCURRENT_CALLS')
+        yield self.call('sync_func')
+
+        # The queued call counts as well
+        first, second = self.call('sleep_func', seconds=0.1), self.call('sleep_func', seconds=0.1)
+        with self.assertRaises(Exception) as context:
+            yield self.call('sync_func', value=1)
+        self.assertIn('overloaded', str(context.exception))
+
+        self.assertEqual((yield [first, second]), [0.1, 0.1])
+        self.assertEqual(WebSocket.metrics.in_flight, 0)
+
+    @gen_test
+    def test_drain(self):
+        self.addCleanup(delattr, WebSocket, '_DRAINING')
+        shed = WebSocket.metrics.shed['drain']
+
+        # Connections left by the previous tests are served by their closed IOLoops
+        for client in WebSocket._CLIENTS.snapshot():
+            if client.ioloop is not self.io_loop:
+                WebSocket._CLIENTS.discard(client.id, client)
+
+        call = self.call('sleep_func', seconds=0.2)
+        yield sleep(0.05)
+        drained = WebSocket.drain(timeout=5, reconnect_min=1, reconnect_max=2)
+
+        message = yield self.incoming.get()
+        self.assertEqual(message['type'], 'drain')
+        self.assertTrue(1 <= message['data']['reconnect'] <= 2)
+
+        # New calls are rejected, the call in flight is finished
+        with self.assertRaises(Exception) as context:
+            yield self.call('sync_func', value=1)
+        self.assertIn('draining', str(context.exception))
+        self.assertEqual(WebSocket.metrics.shed['drain'], shed + 1)
+
+        self.assertEqual((yield call), 0.2)
+        yield drained
+        while self.connection.close_code is None:
+            yield sleep(0.01)
+        self.assertEqual(self.connection.close_code, 1001)
+
+        with self.assertRaises(HTTPError) as context:
+            yield websocket_connect('ws://localhost:{0.port}{0.URI}'.format(self))
+        self.assertEqual(context.exception.code, 503)
+
+    @gen_test
+    def test_route_resolve(self):
+        self.assertTrue((yield self.call('guarded.public')))
+
+        with self.assertRaises(AttributeError) as context:
+            yield self.call('guarded.secret')
+        self.assertIn('Access denied', str(context.exception))
+
+        # Decorators of the methods which aren't in the dispatch table are applied too
+        self.assertTrue((yield self.call('guarded.limited')))
+        with self.assertRaises(Exception) as context:
+            yield self.call('guarded.limited')
+        self.assertIn('Rate limit of guarded.limited', str(context.exception))
+
+    @gen_test
+    def test_attachments(self):
+        data = bytearray(range(256)) * 10
+        result = yield self.call('binary_func', data=data, text='text')
+
+        self.assertEqual(result['size'], len(data))
+        self.assertIsInstance(result['data'], memoryview)
+        self.assertEqual(result['data'].tobytes(), bytes(data))
+        self.assertEqual(result['reversed'].tobytes(), bytes(data)[::-1])
+
+    @gen_test
+    def test_idle_state(self):
+        yield self.call('sync_func')
+        clients = set(WebSocket._CLIENTS)
+
+        connection = yield websocket_connect('ws://localhost:{0.port}{0.URI}'.format(self))
+        while set(WebSocket._CLIENTS) == clients:
+            yield sleep(0.01)
+
+        client_id, = set(WebSocket._CLIENTS) - clients
+        handler = WebSocket._CLIENTS[client_id]
+
+        # Idle connections don't allocate the state of calls
+        for name in ('store', 'serial', '_inflight', '_calls', '_streams', '_WebSocketBase__handlers', 'outbound'):
+            self.assertNotIn(name, vars(handler))
+
+        connection.write_message(json.dumps({'serial': 1, 'call': 'sync.simple_method', 'arguments': {'a': 1}}))
+        self.assertEqual(json.loads((yield connection.read_message()))['data'], {'a': 1})
+        self.assertIn('_inflight', vars(handler))
+        self.assertIn('sync', vars(handler)['_WebSocketBase__handlers'])
+        connection.close()
+
+    @gen_test
+    def test_tracing(self):
+        sink = MemorySink()
+        WebSocket.use_tracer(Tracer(sink, rate=1))
+        self.addCleanup(WebSocket.use_tracer, None)
+
+        self.assertEqual((yield self.call('sync_func', value=1)), {'value': 1})
+
+        trace, = sink.traces
+        self.assertEqual(trace.call, 'sync_func')
+        self.assertEqual(
+            [name for name, start, end in trace.spans],
+            ['decode', 'dispatch', 'queue', 'execute', 'encode', 'write']
+        )
+        self.assertTrue(all(end >= start for name, start, end in trace.spans))
+
+        # Traces of the batch share the encode and write spans
+        sink.clear()
+        kw = dict(value=1)
+        yield self.batch(('sync_func', kw), ('sync.simple_method', kw))
+
+        self.assertEqual(len(sink.traces), 2)
+        self.assertEqual(*[[span for span in trace.spans if span[0] == 'write'] for trace in sink.traces])
+
+    @gen_test
+    def test_trace_propagation(self):
+        sink = MemorySink()
+        WebSocket.use_tracer(Tracer(sink, rate=0))
+        self.addCleanup(WebSocket.use_tracer, None)
+
+        self.assertEqual((yield self.traced_call('abc', 'trace_func')), 'abc')
+        self.assertIsNone((yield self.call('trace_func')))
+
+        result = self.traced_call('abc', 'call_client', timeout=5)
+        message = yield self.incoming.get()
+        self.assertEqual(message['trace'], 'abc')
+
+        yield self.reply(message['serial'], 'reply')
+        self.assertEqual((yield result), 'reply')
+
+        # Unsampled traces aren't exported
+        self.assertEqual(len(sink.traces), 0)
+
+    @gen_test
+    def test_metrics(self):
+        calls = WebSocket.metrics.route('sync_func').calls
+        yield self.call('sync_func')
+        self.assertEqual(WebSocket.metrics.route('sync_func').calls, calls + 1)
+
+    @gen_test
+    def test_stream(self):
+        self.assertEqual((yield self.call('sync.stream', count=100)), list(range(100)))
+
+    @skipUnless(sys.version_info >= (3, 6), 'Async generators require Python 3.6+')
+    @gen_test
+    def test_async_stream(self):
+        self.assertEqual((yield self.call('async_stream_func', count=20)), list(range(20)))
+
+    @gen_test
+    def test_stream_credit(self):
+        self.grant_credits = False
+        future = self.call('sync.stream', count=20)
+
+        yield sleep(0.2)
+        self.assertFalse(future.done())
+        self.assertEqual(len(self._chunks[self._serial]), 16)
+
+        self.grant(self._serial, 4)
+        self.assertEqual((yield future), list(range(20)))
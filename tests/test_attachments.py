@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from unittest import TestCase
+from wsrpc.websocket import attachments, codecs
+
+
+class TestAttachments(TestCase):
+    def test_pack(self):
+        blob = bytearray(b'\x00\xff' * 100)
+        frame = attachments.pack({'serial': 1, 'data': [blob, memoryview(blob)[:10]], 'text': u'текст'})
+
+        self.assertTrue(attachments.is_frame(frame))
+
+        message = attachments.unpack(frame)
+        self.assertEqual(message['text'], u'текст')
+        self.assertEqual(message['data'][0].tobytes(), bytes(blob))
+        self.assertEqual(message['data'][1].tobytes(), bytes(blob[:10]))
+
+    def test_codec(self):
+        codec = codecs.JSON
+
+        text = codec.dumps({'data': [1, 2]})
+        self.assertFalse(attachments.is_frame(text))
+        self.assertEqual(codec.loads(text), {'data': [1, 2]})
+
+        frame = codec.dumps({'data': bytearray(b'binary')})
+        self.assertTrue(attachments.is_frame(frame))
+        self.assertEqual(codec.loads(frame)['data'].tobytes(), b'binary')
+
+    def test_header_limit(self):
+        blob = bytearray(b'binary')
+        with self.assertRaises(ValueError):
+            attachments.pack({'data': blob, 'text': u'x' * (1 << 24)})
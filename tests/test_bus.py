@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import os
+import shutil
+import tempfile
+
+from tornado.gen import sleep
+from tornado.testing import AsyncTestCase, gen_test
+from wsrpc.websocket import bus
+
+
+class TestBus(AsyncTestCase):
+    def test_pack(self):
+        data = bus.pack(u'{"call": "notify"}', key='notify', target='client')
+        self.assertEqual(bus.unpack(data), ('client', 'notify', None, b'{"call": "notify"}'))
+
+        data = bus.pack(b'{}', channel='news')
+        self.assertEqual(bus.unpack(data), (None, None, 'news', b'{}'))
+
+    def test_local(self):
+        local = bus.LocalBus()
+        received = []
+        local.subscribe(received.append)
+        local.publish(b'message')
+        local.unsubscribe(received.append)
+        local.publish(b'lost')
+
+        self.assertEqual(received, [b'message'])
+
+    @gen_test
+    def test_unix(self):
+        path = os.path.join(tempfile.mkdtemp(), 'bus.sock')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+
+        broker = bus.UnixBroker(path)
+        broker.listen()
+        self.addCleanup(broker.stop)
+
+        buses = [bus.UnixBus(path), bus.UnixBus(path)]
+        received = [[], []]
+
+        for worker, messages in zip(buses, received):
+            self.addCleanup(worker.close)
+            worker.subscribe(messages.append)
+            yield worker.connect()
+
+        # The broker accepts connections on the next IOLoop iteration
+        yield sleep(0.05)
+
+        buses[0].publish(b'first')
+        buses[1].publish(b'second')
+        yield sleep(0.05)
+
+        self.assertEqual(received[0], [b'first', b'second'])
+        self.assertEqual(received[1], [b'second', b'first'])
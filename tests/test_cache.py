@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import threading
+
+from tornado.concurrent import Future
+from tornado.gen import sleep
+from tornado.ioloop import IOLoop
+from tornado.testing import AsyncTestCase, gen_test
+from wsrpc import decorators
+from wsrpc.websocket.cache import ResultCache
+
+
+class TestResultCache(AsyncTestCase):
+    def test_key(self):
+        self.assertEqual(
+            ResultCache.key([{'a': 1, 'b': [1, 2]}], {'x': 1, 'y': {'z': None}}),
+            ResultCache.key([{'b': [1, 2], 'a': 1}], {'y': {'z': None}, 'x': 1}),
+        )
+
+    def test_lru(self):
+        cache = ResultCache(60, max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), (True, 1))
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(len(cache), 2)
+
+    @gen_test
+    def test_ttl(self):
+        cache = ResultCache(0.01)
+        cache.set('a', 1)
+        yield sleep(0.02)
+
+        self.assertEqual(cache.get('a'), (False, None))
+
+    @gen_test
+    def test_single_flight(self):
+        cache = ResultCache(60)
+        future = Future()
+        calls = []
+
+        def func():
+            calls.append(1)
+            return future
+
+        first, second = cache.call('key', func), cache.call('key', func)
+        future.set_result('result')
+
+        self.assertEqual((yield first), ('result', False))
+        self.assertEqual((yield second), ('result', True))
+        self.assertEqual(((yield cache.call('key', func))), ('result', True))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    @gen_test
+    def test_ioloops(self):
+        cache = ResultCache(60)
+        future = Future()
+        first = cache.call('key', lambda: future)
+        results = []
+
+        def shard():
+            ioloop = IOLoop()
+            other = Future()
+            other.set_result('other')
+            results.append(ioloop.run_sync(lambda: cache.call('key', lambda: other), timeout=1))
+            ioloop.close()
+
+        # The execution pending in one IOLoop isn't shared with another
+        thread = threading.Thread(target=shard)
+        thread.start()
+        thread.join()
+        self.assertEqual(results, [('other', False)])
+
+        future.set_result('result')
+        self.assertEqual((yield first), ('result', False))
+        self.assertEqual(cache.get('key'), (True, 'result'))
+
+    @gen_test
+    def test_error(self):
+        cache = ResultCache(60)
+        future = Future()
+        first, second = cache.call('key', lambda: future), cache.call('key', lambda: future)
+        future.set_exception(ValueError())
+
+        for waiter in (first, second):
+            with self.assertRaises(ValueError):
+                yield waiter
+
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = ResultCache(60)
+        cache.set(cache.key((), {'value': 1}), 1)
+        cache.invalidate(value=1)
+
+        self.assertEqual(len(cache), 0)
+
+    def test_generator(self):
+        with self.assertRaises(TypeError):
+            @decorators.cached(ttl=1)
+            def stream():
+                yield 1
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from unittest import skipUnless
+
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase, gen_test
+from wsrpc.websocket import cancellation
+
+
+class Awaitable(object):
+    # Native awaitable like the one of the async generator
+    def __init__(self, future):
+        self.future = future
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class TestCancellation(AsyncTestCase):
+    @gen_test
+    def test_wait(self):
+        token = cancellation.Cancellation()
+        future = Future()
+        waiter = token.wait(future)
+        future.set_result(1)
+
+        self.assertEqual((yield waiter), 1)
+
+    @skipUnless(hasattr(Future, '__await__'), 'Native awaitables require Python 3.5+')
+    @gen_test
+    def test_wait_awaitable(self):
+        token = cancellation.Cancellation()
+        future = Future()
+        waiter = token.wait(Awaitable(future))
+        future.set_result(1)
+
+        self.assertEqual((yield waiter), 1)
+
+    @gen_test
+    def test_cancel(self):
+        token = cancellation.Cancellation()
+        waiter = token.wait(Future())
+        token.cancel()
+
+        with self.assertRaises(cancellation.CancelledError):
+            yield waiter
+
+        with self.assertRaises(cancellation.CancelledError):
+            yield token.wait(Future())
+
+        self.assertRaises(cancellation.CancelledError, token.check)
+
+    def test_current(self):
+        token = cancellation.Cancellation()
+
+        self.assertIsNone(cancellation.current())
+        self.assertIs(token.run(cancellation.current), token)
+        self.assertIsNone(cancellation.current())
+
+    def test_drop_queued(self):
+        pool = ThreadPoolExecutor(1)
+        self.addCleanup(pool.shutdown)
+
+        event = Event()
+        pool.submit(event.wait, 1)
+
+        token = cancellation.Cancellation()
+        queued = pool.submit(lambda: None)
+        token.wait(queued)
+        token.cancel()
+        event.set()
+
+        self.assertTrue(queued.cancelled())
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from unittest import TestCase
+from wsrpc.websocket.channels import Channels
+
+
+class TestChannels(TestCase):
+    def test_exact(self):
+        channels = Channels()
+        channels.add('news', 1)
+        channels.add('news', 2)
+        channels.add('sport', 3)
+
+        self.assertEqual(channels.subscribers('news'), {1, 2})
+        self.assertEqual(channels.subscribers('new'), set())
+
+        channels.remove('news', 1)
+        channels.remove('news', 2)
+        self.assertNotIn('news', channels)
+        self.assertEqual(len(channels), 1)
+
+    def test_prefix(self):
+        channels = Channels()
+        channels.add('news.*', 1)
+        channels.add('*', 2)
+        channels.add('news.sport', 3)
+
+        self.assertEqual(channels.subscribers('news.sport'), {1, 2, 3})
+        self.assertEqual(channels.subscribers('news.weather'), {1, 2})
+        self.assertEqual(channels.subscribers('weather'), {2})
+
+        channels.remove('news.*', 1)
+        self.assertEqual(channels.subscribers('news.weather'), {2})
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from unittest import skipIf
+from tornado.testing import AsyncTestCase
+from wsrpc.websocket import codecs
+
+
+MESSAGE = {'serial': 1, 'type': 'call', 'call': 'route.method', 'arguments': {'key': u'значение', 'list': [1, 2.5]}}
+
+
+class TestCodecs(AsyncTestCase):
+    def test_json(self):
+        codec = codecs.CODECS['json']
+        self.assertFalse(codec.binary)
+        self.assertEqual(codec.loads(codec.dumps(MESSAGE)), MESSAGE)
+
+    @skipIf(codecs.msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        codec = codecs.CODECS['msgpack']
+        self.assertTrue(codec.binary)
+        self.assertEqual(codec.loads(codec.dumps(MESSAGE)), MESSAGE)
+        self.assertEqual(codec.loads(codec.dumps({'data': b'\x00\xff'})), {'data': b'\x00\xff'})
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import json
+import zlib
+
+import tornado.web
+from tornado import testing, websocket
+from tornado.httpserver import HTTPServer
+from wsrpc import WebSocket, WebSocketRoute, decorators
+from wsrpc.websocket import compression
+
+
+def text(socket, size):
+    return 'x' * size
+
+
+@decorators.uncompressed
+def packed(socket, size):
+    return 'x' * size
+
+
+class Packer(WebSocketRoute):
+    def _resolve(self, method):
+        # The route which resolves its methods isn't compiled to the dispatch table
+        return super(Packer, self)._resolve(method)
+
+    @decorators.uncompressed
+    def packed(self, size):
+        return 'x' * size
+
+
+class Compressed(WebSocket):
+    ROUTES = {'text': text, 'packed': packed, 'packer': Packer}
+
+    _COMPRESSION_LEVEL = 1
+    _COMPRESSION_MIN_SIZE = 100
+    _COMPRESSION_CLIENT_CONTEXT_TAKEOVER = False
+
+
+class TestCompressor(testing.AsyncTestCase):
+    def decompress(self, data, decompressor=None):
+        decompressor = decompressor or zlib.decompressobj(-zlib.MAX_WBITS)
+        return decompressor.decompress(data + b'\x00\x00\xff\xff')
+
+    def test_persistent(self):
+        compressor = compression.Compressor(persistent=True, level=9, mem_level=9)
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        first = compressor.compress(b'message' * 10)
+        second = compressor.compress(b'message' * 10)
+
+        self.assertLess(len(second), len(first))
+        self.assertEqual(self.decompress(first, decompressor), b'message' * 10)
+        self.assertEqual(self.decompress(second, decompressor), b'message' * 10)
+
+    def test_no_context_takeover(self):
+        compressor = compression.Compressor(persistent=False)
+        first = compressor.compress(b'message' * 10)
+
+        self.assertEqual(compressor.compress(b'message' * 10), first)
+        self.assertEqual(self.decompress(first), b'message' * 10)
+
+    def test_client_no_context_takeover(self):
+        self.assertEqual(
+            compression.no_client_context_takeover('permessage-deflate; client_max_window_bits, x-custom'),
+            'permessage-deflate; client_max_window_bits; client_no_context_takeover, x-custom'
+        )
+
+
+class TestCompressedHandler(testing.AsyncTestCase):
+    def setUp(self):
+        super(TestCompressedHandler, self).setUp()
+        self.server = HTTPServer(tornado.web.Application([(r'/ws/', Compressed)]))
+        self.socket, self.port = testing.bind_unused_port()
+        self.server.add_socket(self.socket)
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestCompressedHandler, self).tearDown()
+
+    def test_unknown_internals(self):
+        # The connection of the tornado version which has other internals
+        compressor = object()
+        handler = Compressed.__new__(Compressed)
+        handler.ws_connection = type('Connection', (object,), {'_compressor': compressor})()
+        handler._setup_compression()
+
+        self.assertIs(handler.ws_connection._compressor, compressor)
+        self.assertFalse(handler._uncompressed_frames)
+
+    @testing.gen_test
+    def test_compression(self):
+        connection = yield websocket.websocket_connect(
+            'ws://localhost:{0}/ws/'.format(self.port), compression_options={}
+        )
+        protocol = connection.protocol
+
+        for serial, (call, size, compressed) in enumerate((
+            ('text', 10, False),
+            ('text', 10000, True),
+            ('packed', 10000, False),
+            ('packer.packed', 10000, False),
+        )):
+            connection.write_message(json.dumps({'serial': serial * 2 + 1, 'call': call, 'arguments': {'size': size}}))
+            response = json.loads((yield connection.read_message()))
+
+            self.assertEqual(response['data'], 'x' * size)
+            self.assertEqual(protocol._frame_compressed, compressed)
+
+        handler, = [client for client in Compressed._CLIENTS.values() if isinstance(client, Compressed)]
+        self.assertIsInstance(handler.ws_connection._compressor, compression.Compressor)
+        self.assertEqual(handler.ws_connection._compressor.level, 1)
+
+        # The client has accepted client_no_context_takeover
+        self.assertIsNone(protocol._compressor._compressor)
+        connection.close()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from tornado.gen import sleep
+from tornado.testing import AsyncTestCase, gen_test
+from wsrpc.websocket.deadlines import Deadlines
+
+
+class TestDeadlines(AsyncTestCase):
+    @gen_test
+    def test_deadlines(self):
+        deadlines = Deadlines(self.io_loop)
+        now = self.io_loop.time()
+        expired = []
+
+        deadlines.add(now + 0.3, lambda: expired.append(('late', self.io_loop.time())))
+        deadlines.add(now + 0.1, lambda: expired.append(('early', self.io_loop.time())))
+        deadlines.add(now - 1, lambda: expired.append(('past', self.io_loop.time())))
+        self.assertEqual(len(deadlines), 3)
+
+        yield sleep(0.5)
+
+        self.assertEqual([name for name, _ in expired], ['past', 'early', 'late'])
+        self.assertGreaterEqual(expired[1][1], now + 0.1)
+        self.assertGreaterEqual(expired[2][1], now + 0.3)
+        self.assertEqual(len(deadlines), 0)
+        self.assertIsNone(deadlines._timeout)
+
+    def test_shared(self):
+        self.assertIs(Deadlines.get(self.io_loop), Deadlines.get(self.io_loop))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from tornado.gen import coroutine, sleep, Return
+from tornado.testing import AsyncTestCase
+from wsrpc import WebSocketRoute, decorators
+from wsrpc.websocket.dispatch import DispatchTable, RouteTable
+
+
+class Route(WebSocketRoute):
+    def init(self):
+        return True
+
+    def method(self):
+        return True
+
+    @coroutine
+    def coro(self):
+        yield sleep(0)
+        raise Return(True)
+
+    @decorators.noproxy
+    def hidden(self):
+        return False
+
+    def _private(self):
+        return False
+
+
+class Guarded(Route):
+    def _resolve(self, method):
+        raise AttributeError('Access denied')
+
+
+def func(socket):
+    return True
+
+
+class TestDispatchTable(AsyncTestCase):
+    def setUp(self):
+        super(TestDispatchTable, self).setUp()
+        self.table = DispatchTable({'route': Route, 'func': func, 'guarded': Guarded})
+
+    def test_route_methods(self):
+        self.assertTrue(self.table.get('route.method').is_route)
+        self.assertFalse(self.table.get('route.method').is_async)
+        self.assertTrue(self.table.get('route.coro').is_async)
+        self.assertEqual(self.table.get('route').method, 'init')
+
+    def test_hidden_methods(self):
+        self.assertNotIn('route.hidden', self.table)
+        self.assertNotIn('route._private', self.table)
+        self.assertNotIn('route.placebo', self.table)
+
+    def test_resolve_override(self):
+        # Calls are resolved by the route's own _resolve
+        self.assertNotIn('guarded.method', self.table)
+        self.assertNotIn('guarded', self.table)
+        self.assertIs(self.table.routes['guarded'], Guarded)
+
+    def test_function(self):
+        self.assertFalse(self.table.get('func').is_route)
+        self.assertIs(self.table.get('func').func, func)
+
+    def test_route_table_invalidation(self):
+        routes = RouteTable({'func': func})
+        table = routes.table
+        self.assertIs(routes.table, table)
+
+        routes['route'] = Route
+        self.assertIsNot(routes.table, table)
+        self.assertIn('route.method', routes.table)
+
+    def test_bound_invalidation(self):
+        class Handler(object):
+            pass
+
+        routes = RouteTable({'func': func})
+        calls = routes.bound(Handler)
+        calls['func'] = routes.table.get('func'), None
+        self.assertIs(routes.bound(Handler), calls)
+
+        routes['func'] = lambda socket: None
+        self.assertIs(routes.bound(Handler), calls)
+        self.assertEqual(calls, {})
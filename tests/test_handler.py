@@ -12,6 +12,7 @@ from random import randint
 from tornado.concurrent import Future
 from tornado.testing import AsyncTestCase, gen_test
 from wsrpc.websocket.handler import WebSocketBase
+from wsrpc.websocket import codecs
 from wsrpc import WebSocket, WebSocketThreaded
 
 try:
@@ -87,5 +88,8 @@ class TestWebSocketBase(AsyncTestCase):
         result = yield self.send_message({'serial': 999, 'type': 'callback'})
         result = yield self.send_message({'serial': 999, 'type': 'error'})
 
+    def test_select_subprotocol(self):
+        self.assertIsNone(self.instance.select_subprotocol(['unknown']))
+        self.assertIs(self.instance.codec, codecs.JSON)
 
-
+        self.assertEqual(self.instance.select_subprotocol(['unknown', 'json']), 'json')
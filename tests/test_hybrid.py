@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import sys
+import threading
+from unittest import skipUnless
+from tornado.testing import gen_test
+from wsrpc import WebSocketHybrid
+from . import TestBase
+
+
+class TestHybrid(TestBase):
+    URI = '/ws/hybrid'
+
+    def setUp(self):
+        WebSocketHybrid.init_pool(2)
+        super(TestHybrid, self).setUp()
+
+    @gen_test
+    def test_blocking(self):
+        self.assertNotEqual((yield self.call('hybrid.blocking')), threading.current_thread().name)
+
+    @gen_test
+    def test_coroutine(self):
+        self.assertEqual((yield self.call('hybrid.coroutine')), threading.current_thread().name)
+
+    @skipUnless(sys.version_info >= (3, 5), 'Native coroutines require Python 3.5+')
+    @gen_test
+    def test_native_coroutine(self):
+        self.assertEqual((yield self.call('hybrid.native')), threading.current_thread().name)
+
+    @gen_test
+    def test_nonblocking(self):
+        self.assertEqual((yield self.call('hybrid.getter')), threading.current_thread().name)
+
+    @gen_test
+    def test_future(self):
+        name = yield self.call('hybrid.future')
+        self.assertNotEqual(name, threading.current_thread().name)
+        self.assertNotEqual(name, (yield self.call('hybrid.blocking')))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from tornado.testing import AsyncTestCase, gen_test
+from wsrpc.websocket.inflight import InFlight, TooManyCalls
+
+
+class TestInFlight(AsyncTestCase):
+    def test_unlimited(self):
+        inflight = InFlight()
+
+        for serial in range(100):
+            self.assertIsNone(inflight.acquire(serial))
+
+        self.assertIn(1, inflight)
+        self.assertEqual(len(inflight), 100)
+
+        for serial in range(100):
+            inflight.release(serial)
+
+        self.assertNotIn(1, inflight)
+        self.assertEqual(inflight.running, 0)
+
+    @gen_test
+    def test_queue(self):
+        inflight = InFlight(limit=1)
+
+        self.assertIsNone(inflight.acquire(1))
+        waiter = inflight.acquire(3)
+        self.assertIn(3, inflight)
+        self.assertFalse(waiter.done())
+
+        inflight.release(1)
+        yield waiter
+        self.assertEqual(inflight.running, 1)
+
+        inflight.release(3)
+        self.assertEqual(inflight.running, 0)
+
+    def test_reject(self):
+        inflight = InFlight(limit=1, reject=True)
+        inflight.acquire(1)
+
+        with self.assertRaises(TooManyCalls):
+            inflight.acquire(3)
+
+        self.assertNotIn(3, inflight)
+
+    def test_cancel(self):
+        inflight = InFlight(limit=1)
+        inflight.acquire(1)
+        waiter = inflight.acquire(3)
+
+        inflight.cancel(RuntimeError())
+        self.assertIsInstance(waiter.exception(), RuntimeError)
+
+        inflight.discard(3, waiter)
+        inflight.release(1)
+        self.assertEqual(inflight.running, 0)
+        self.assertEqual(len(inflight), 0)
+
+    def test_discard(self):
+        inflight = InFlight(limit=1)
+        inflight.acquire(1)
+        queued, granted = inflight.acquire(3), inflight.acquire(5)
+
+        # The queued call is dropped, the slot goes to the next one
+        inflight.discard(3, queued)
+        inflight.release(1)
+        self.assertFalse(queued.done())
+        self.assertTrue(granted.done())
+
+        # The slot is released when the call is dropped after it got one
+        inflight.discard(5, granted)
+        self.assertEqual(inflight.running, 0)
+        self.assertEqual(len(inflight), 0)
+        self.assertIsNone(inflight.acquire(7))
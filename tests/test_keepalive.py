@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from tornado.testing import AsyncTestCase
+from wsrpc.websocket.keepalive import Keepalive
+
+
+class Connection(object):
+    def __init__(self, last_activity=0):
+        self._last_activity = last_activity
+        self._ping_sent = None
+        self.pings = 0
+        self.closed = False
+
+    def _send_ping(self, now):
+        self._ping_sent = now
+        self.pings += 1
+
+    def _keepalive_timeout(self):
+        self.closed = True
+
+
+class TestKeepalive(AsyncTestCase):
+    def setUp(self):
+        super(TestKeepalive, self).setUp()
+        self.keepalive = Keepalive(self.io_loop, 30)
+
+    def tearDown(self):
+        for conn in list(self.conns):
+            self.keepalive.remove(conn)
+        super(TestKeepalive, self).tearDown()
+
+    def visit_all(self):
+        for slot in self.keepalive.slots:
+            self.keepalive.process(slot)
+
+    def test_spread(self):
+        self.conns = [Connection() for _ in range(300)]
+        for conn in self.conns:
+            self.keepalive.add(conn)
+
+        self.assertEqual(len(self.keepalive), 300)
+        self.assertEqual(len(self.keepalive.slots), 30)
+        self.assertTrue(all(len(slot) < 300 for slot in self.keepalive.slots))
+
+    def test_ping_and_timeout(self):
+        idle, active = Connection(), Connection(last_activity=self.io_loop.time())
+        self.conns = [idle, active]
+        for conn in self.conns:
+            self.keepalive.add(conn)
+
+        self.visit_all()
+        self.assertEqual(idle.pings, 1)
+        self.assertEqual(active.pings, 0)
+
+        self.visit_all()
+        self.assertTrue(idle.closed)
+        self.assertFalse(active.closed)
+        self.assertEqual(len(self.keepalive), 1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import threading
+
+import tornado.web
+from tornado import testing
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import AsyncTestCase, gen_test
+from wsrpc import wsrpc_metrics
+from wsrpc.websocket.metrics import Metrics, Histogram
+
+
+class TestMetrics(AsyncTestCase):
+    def setUp(self):
+        super(TestMetrics, self).setUp()
+        self.metrics = Metrics()
+        self.application = tornado.web.Application((
+            wsrpc_metrics('/metrics', self.metrics),
+        ))
+        self.server = HTTPServer(self.application)
+        self.socket, self.port = testing.bind_unused_port()
+        self.server.add_socket(self.socket)
+
+    def test_histogram(self):
+        hist = Histogram(buckets=(1, 2))
+        for value in (0.5, 1.5, 1.7, 3):
+            hist.observe(value)
+
+        self.assertEqual(list(hist.cumulative()), [(1, 1), (2, 3), (float('inf'), 4)])
+        self.assertEqual(hist.count, 4)
+
+    def test_snapshot(self):
+        self.metrics.counters.route('route.method').observe(0.001, 0.01)
+        self.metrics.counters.route('route.method').observe(0.001, 0.01, error=True)
+        self.metrics.gauge('clients', lambda: 3)
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['routes']['route.method']['calls'], 2)
+        self.assertEqual(snapshot['routes']['route.method']['errors'], 1)
+        self.assertEqual(snapshot['gauges'], {'clients': 3})
+
+    def test_threads(self):
+        def count():
+            counters = self.metrics.counters
+            for _ in range(1000):
+                counters.in_flight += 1
+                counters.shed['route'] += 1
+            counters.route('route.method').observe(0.001, 0.01)
+
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every thread has its own counters, they are summed on read
+        self.assertEqual(self.metrics.in_flight, 4000)
+        self.assertEqual(self.metrics.shed['route'], 4000)
+        self.assertEqual(self.metrics.route('route.method').calls, 4)
+        self.assertEqual(self.metrics.snapshot()['routes']['route.method']['execution']['count'], 4)
+
+        self.metrics.reset()
+        self.assertEqual(self.metrics.in_flight, 0)
+
+    @gen_test
+    def test_prometheus(self):
+        self.metrics.counters.route('route.method').observe(0.001, 0.01)
+        self.metrics.counters.bytes_in += 10
+        self.metrics.counters.shed['route'] += 2
+
+        response = yield AsyncHTTPClient().fetch("http://localhost:{0}/metrics".format(self.port))
+        body = response.body.decode('utf-8')
+
+        self.assertIn('wsrpc_calls_total{route="route.method"} 1', body)
+        self.assertIn('wsrpc_call_execution_seconds_bucket{le="+Inf",route="route.method"} 1', body)
+        self.assertIn('wsrpc_bytes_in_total 10', body)
+        self.assertIn('wsrpc_shed_calls_total{reason="route"} 2', body)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import json
+
+import tornado.web
+from tornado import testing, websocket
+from tornado.concurrent import Future
+from tornado.httpserver import HTTPServer
+from tornado.testing import AsyncTestCase
+from wsrpc import WebSocket
+from wsrpc.websocket import outbound
+
+
+def flood(socket, count, size):
+    # The frames are queued while the client can't read them
+    for index in range(count):
+        socket._send(serial=0, type='call', call='flood', arguments={'index': index, 'data': 'x' * size})
+
+    return count
+
+
+class Flooded(WebSocket):
+    ROUTES = {'flood': flood}
+
+    _OUTBOUND_HIGH_WATERMARK = 64 * 1024
+    _OUTBOUND_LOW_WATERMARK = 16 * 1024
+    _OUTBOUND_QUEUE_LIMIT = 5000
+
+
+class Socket(object):
+    def __init__(self):
+        self.written = []
+        self.flags = []
+        self.futures = []
+        self.closed = False
+
+    def write(self, data, binary, compress=True):
+        self.written.append(data)
+        self.flags.append((binary, compress))
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        self.closed = True
+
+    def flush(self):
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.set_result(None)
+
+
+class TestOutbound(AsyncTestCase):
+    def make(self, policy, limit=2):
+        self.socket = Socket()
+        return outbound.Outbound(self.socket.write, self.socket.close, high=10, low=0, limit=limit, policy=policy)
+
+    def test_backpressure(self):
+        queue = self.make(outbound.WAIT)
+        queue.send('x' * 10, False)
+        queue.send('y', False)
+
+        self.assertEqual(self.socket.written, ['x' * 10])
+        self.assertEqual(queue.depth, 1)
+
+        drained = queue.drained()
+        self.assertFalse(drained.done())
+
+        self.socket.flush()
+        self.assertEqual(self.socket.written, ['x' * 10, 'y'])
+        self.assertEqual(queue.depth, 0)
+        self.assertTrue(drained.done())
+
+    def test_drop_oldest(self):
+        queue = self.make(outbound.DROP_OLDEST)
+        for data in ('x' * 10, 'a', 'b', 'c'):
+            queue.send(data, False)
+
+        self.assertEqual(queue.dropped, 1)
+        self.socket.flush()
+        self.assertEqual(self.socket.written, ['x' * 10, 'b', 'c'])
+
+    def test_coalesce(self):
+        queue = self.make(outbound.COALESCE)
+        queue.send('x' * 10, False)
+        queue.send('a1', False, key='a')
+        queue.send('b', False)
+        queue.send('a2', False, key='a')
+
+        self.assertEqual(queue.depth, 2)
+        self.socket.flush()
+        self.assertEqual(self.socket.written, ['x' * 10, 'a2', 'b'])
+
+    def test_coalesce_flags(self):
+        queue = self.make(outbound.COALESCE)
+        queue.send('x' * 10, False)
+        queue.send('a1', False, key='a')
+        queue.send(b'a2', True, key='a', compress=False)
+
+        self.socket.flush()
+        self.assertEqual(self.socket.written, ['x' * 10, b'a2'])
+        self.assertEqual(self.socket.flags[1], (True, False))
+
+    def test_disconnect(self):
+        queue = self.make(outbound.DISCONNECT, limit=1)
+        for data in ('x' * 10, 'a', 'b'):
+            queue.send(data, False)
+
+        self.assertTrue(self.socket.closed)
+        self.assertEqual(queue.depth, 0)
+
+    def test_wait_limit(self):
+        queue = self.make(outbound.WAIT, limit=1)
+        for data in ('x' * 10, 'a', 'b'):
+            queue.send(data, False)
+
+        # Replies and broadcasts can't wait for the drain
+        self.assertTrue(self.socket.closed)
+        self.assertEqual(queue.depth, 0)
+
+    def test_flushed_at_once(self):
+        written = []
+
+        def write(data, binary, compress=True):
+            written.append(data)
+            future = Future()
+            if len(written) > 1:
+                future.set_result(None)
+            return future
+
+        queue = outbound.Outbound(write, lambda: None, high=10, low=0, limit=5000)
+        for index in range(3000):
+            queue.send('x' * 10, False)
+
+        # The first write is flushed later, the rest of them at once without the recursion
+        self.assertEqual(queue.depth, 2999)
+        queue.last.set_result(None)
+        self.assertEqual(len(written), 3000)
+        self.assertIsNone(queue.queue)
+
+
+class TestOutboundSocket(AsyncTestCase):
+    def setUp(self):
+        super(TestOutboundSocket, self).setUp()
+        self.server = HTTPServer(tornado.web.Application([(r'/ws/', Flooded)]))
+        self.socket, self.port = testing.bind_unused_port()
+        self.server.add_socket(self.socket)
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestOutboundSocket, self).tearDown()
+
+    @testing.gen_test(timeout=30)
+    def test_drain(self):
+        connection = yield websocket.websocket_connect('ws://localhost:{0}/ws/'.format(self.port))
+        connection.write_message(json.dumps({'serial': 1, 'call': 'flood', 'arguments': {'count': 3000, 'size': 4096}}))
+
+        indexes = []
+        while len(indexes) < 3000:
+            message = json.loads((yield connection.read_message()))
+            if message['type'] == 'call':
+                indexes.append(message['arguments']['index'])
+            else:
+                self.assertEqual(message['data'], 3000)
+
+        self.assertEqual(indexes, list(range(3000)))
+        connection.close()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import json
+
+import tornado.web
+from tornado import testing, websocket
+from tornado.gen import coroutine, sleep, Return
+from tornado.httpserver import HTTPServer
+from wsrpc import WebSocket, WebSocketRoute
+from wsrpc.websocket.sessions import Session, Sessions
+
+
+class Profile(WebSocketRoute):
+    loaded = 0
+    closed = 0
+
+    def init(self, user):
+        # The expensive initialisation which isn't repeated on resume
+        Profile.loaded += 1
+        self.user = user
+        return user
+
+    def user_name(self):
+        return self.user
+
+    @coroutine
+    def slow(self, seconds):
+        yield sleep(seconds)
+        raise Return(self.user)
+
+    def _onclose(self):
+        Profile.closed += 1
+
+
+class Resumable(WebSocket):
+    ROUTES = {'profile': Profile}
+
+    _SESSION_TTL = 0.5
+    _SESSION_REPLAY_LIMIT = 4
+
+
+class FakeSocket(object):
+    def __init__(self):
+        self.written = []
+
+    def _write_socket(self, data, binary, compress=True):
+        self.written.append(data)
+
+    def _in_ioloop(self, func, *args):
+        return func(*args)
+
+
+class TestSession(testing.AsyncTestCase):
+    def test_replay(self):
+        socket = FakeSocket()
+        session = Session(socket, limit=3)
+
+        for data in ('a', 'b', 'c'):
+            session.write(data, False)
+
+        self.assertEqual(socket.written, ['a', 'b', 'c'])
+        self.assertEqual(session.missed(1), [('b', False, True), ('c', False, True)])
+        self.assertEqual(session.missed(3), [])
+
+        session.detach(0)
+        session.write('d', False)
+        self.assertEqual(socket.written, ['a', 'b', 'c'])
+        self.assertEqual([data for data, _, _ in session.missed(2)], ['c', 'd'])
+
+        # The frame "a" is dropped from the buffer
+        self.assertIsNone(session.missed(0))
+        # The client can't receive more than it's sent
+        self.assertIsNone(session.missed(5))
+
+    def test_ack(self):
+        session = Session(FakeSocket(), limit=10)
+
+        for data in ('a', 'b', 'c'):
+            session.write(data, False)
+
+        session.ack(2)
+        self.assertEqual(list(session.frames), [('c', False, True)])
+        self.assertEqual(session.missed(2), [('c', False, True)])
+        self.assertIsNone(session.missed(1))
+
+        session.ack(3)
+        self.assertEqual(len(session.frames), 0)
+        self.assertEqual(session.missed(3), [])
+
+
+class TestSessions(testing.AsyncTestCase):
+    def test_resume(self):
+        registry = Sessions()
+        first, second = FakeSocket(), FakeSocket()
+        session = registry['token'] = Session(first, limit=3, token='token')
+        session.write('a', False)
+
+        self.assertEqual(registry.resume('unknown', second, 0), (None, None, None))
+        self.assertEqual(registry.resume('token', second, 5), (session, None, None))
+        self.assertEqual(registry.resume('token', second, 0), (session, first, [('a', False, True)]))
+        self.assertIs(session.socket, second)
+
+        # The previous connection is closed after the session is resumed
+        self.assertFalse(registry.detach(session, first, 10))
+        self.assertTrue(session.attached)
+
+        self.assertTrue(registry.detach(session, second, 10))
+        self.assertFalse(registry.expire(session, second, 5))
+        self.assertTrue(registry.expire(session, second, 10))
+        self.assertNotIn('token', registry)
+
+
+class TestResumable(testing.AsyncTestCase):
+    def setUp(self):
+        super(TestResumable, self).setUp()
+        self.server = HTTPServer(tornado.web.Application([(r'/ws/', Resumable)]))
+        self.socket, self.port = testing.bind_unused_port()
+        self.server.add_socket(self.socket)
+        Profile.loaded = Profile.closed = 0
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestResumable, self).tearDown()
+
+    @coroutine
+    def connect(self, token=None, received=0):
+        url = 'ws://localhost:{0}/ws/'.format(self.port)
+        if token is not None:
+            url += '?session={0}&received={1}'.format(token, received)
+
+        connection = yield websocket.websocket_connect(url)
+        message = yield self.read(connection)
+        self.assertEqual(message['type'], 'session')
+        raise Return((connection, message['data']))
+
+    @coroutine
+    def read(self, connection):
+        message = yield connection.read_message()
+        raise Return(json.loads(message))
+
+    @coroutine
+    def call(self, connection, serial, call, **kwargs):
+        connection.write_message(json.dumps({'serial': serial, 'call': call, 'arguments': kwargs}))
+        response = yield self.read(connection)
+        self.assertEqual(response['serial'], serial)
+        raise Return(response['data'])
+
+    @testing.gen_test
+    def test_resume(self):
+        connection, session = yield self.connect()
+        self.assertFalse(session['resumed'])
+
+        self.assertEqual((yield self.call(connection, 1, 'profile', user='alice')), 'alice')
+        handler = Resumable._SESSIONS[session['token']].socket
+
+        # The reply is written after the disconnect
+        connection.write_message(json.dumps({'serial': 3, 'call': 'profile.slow', 'arguments': {'seconds': 0.1}}))
+        yield sleep(0.01)
+        connection.close()
+        yield sleep(0.2)
+
+        connection, resumed = yield self.connect(session['token'], received=1)
+        self.assertEqual(resumed, {'token': session['token'], 'resumed': True})
+
+        replayed = yield self.read(connection)
+        self.assertEqual((replayed['serial'], replayed['data']), (3, 'alice'))
+
+        self.assertEqual((yield self.call(connection, 5, 'profile.user_name')), 'alice')
+        self.assertEqual((Profile.loaded, Profile.closed), (1, 0))
+
+        current = Resumable._SESSIONS[session['token']].socket
+        self.assertIsNot(current, handler)
+        self.assertEqual(current.id, handler.id)
+        self.assertIs(Resumable._CLIENTS[current.id], current)
+        connection.close()
+
+    @testing.gen_test
+    def test_takeover(self):
+        first, session = yield self.connect()
+        self.assertEqual((yield self.call(first, 1, 'profile', user='bob')), 'bob')
+
+        # The server hasn't noticed the first connection is lost
+        second, resumed = yield self.connect(session['token'], received=1)
+        self.assertTrue(resumed['resumed'])
+        self.assertIsNone((yield first.read_message()))
+        self.assertEqual(first.close_code, 1000)
+
+        self.assertEqual((yield self.call(second, 3, 'profile.user_name')), 'bob')
+        yield sleep(0.05)
+        self.assertEqual(Profile.closed, 0)
+        second.close()
+
+    @testing.gen_test
+    def test_not_resumed(self):
+        connection, session = yield self.connect()
+        for serial in range(1, 12, 2):
+            yield self.call(connection, serial, 'profile', user='carol')
+
+        connection.close()
+        yield sleep(0.05)
+
+        # The unknown token and the frames dropped from the buffer start the new session
+        for token, received in (('unknown', 0), (session['token'], 1)):
+            connection, started = yield self.connect(token, received)
+            self.assertFalse(started['resumed'])
+            self.assertNotEqual(started['token'], session['token'])
+            connection.close()
+
+        connection, resumed = yield self.connect(session['token'], received=6)
+        self.assertTrue(resumed['resumed'])
+        connection.close()
+
+    @testing.gen_test
+    def test_ack(self):
+        connection, session = yield self.connect()
+        for serial in (1, 3, 5):
+            yield self.call(connection, serial, 'profile', user='dave')
+
+        frames = Resumable._SESSIONS[session['token']].frames
+        self.assertEqual(len(frames), 3)
+
+        connection.write_message(json.dumps({'serial': 0, 'type': 'ack', 'data': 2}))
+        yield self.call(connection, 7, 'profile.user_name')
+        self.assertEqual(len(frames), 2)
+        connection.close()
+
+    @testing.gen_test
+    def test_expire(self):
+        connection, session = yield self.connect()
+        yield self.call(connection, 1, 'profile', user='eve')
+        connection.close()
+
+        yield sleep(0.1)
+        self.assertIn(session['token'], Resumable._SESSIONS)
+        self.assertEqual(Profile.closed, 0)
+
+        yield sleep(Resumable._SESSION_TTL + 0.2)
+        self.assertNotIn(session['token'], Resumable._SESSIONS)
+        self.assertEqual(Profile.closed, 1)
+
+        connection, started = yield self.connect(session['token'], received=1)
+        self.assertFalse(started['resumed'])
+        connection.close()
+
+    @testing.gen_test
+    def test_server_close(self):
+        connection, session = yield self.connect()
+        yield self.call(connection, 1, 'profile', user='frank')
+
+        Resumable._SESSIONS[session['token']].socket.close()
+        self.assertIsNone((yield connection.read_message()))
+        yield sleep(0.05)
+
+        self.assertNotIn(session['token'], Resumable._SESSIONS)
+        self.assertEqual(Profile.closed, 1)
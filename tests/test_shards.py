@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import json
+import threading
+
+import tornado.web
+from tornado import testing, websocket
+from tornado.gen import coroutine, Return
+from wsrpc import WebSocket, ShardedHTTPServer
+from wsrpc.websocket.shards import Clients, by_ioloop
+
+
+def whoami(socket):
+    return {'id': socket.id, 'thread': threading.current_thread().name}
+
+
+class Sharded(WebSocket):
+    ROUTES = {'whoami': whoami}
+
+
+class Client(object):
+    def __init__(self, ioloop):
+        self.ioloop = ioloop
+
+
+class TestClients(testing.AsyncTestCase):
+    def test_discard(self):
+        clients = Clients()
+        first, second = Client(None), Client(None)
+
+        clients['id'] = first
+        clients['id'] = second
+        clients.discard('id', first)
+        self.assertIs(clients['id'], second)
+
+        self.assertEqual(clients.snapshot(), [second])
+        clients.discard('id', second)
+        self.assertEqual(len(clients), 0)
+
+    def test_by_ioloop(self):
+        first, second, third = Client('a'), Client('b'), Client('a')
+        self.assertEqual(by_ioloop([first, second, third]), {'a': [first, third], 'b': [second]})
+
+
+class TestShardedServer(testing.AsyncTestCase):
+    def setUp(self):
+        super(TestShardedServer, self).setUp()
+        self.server = ShardedHTTPServer(tornado.web.Application([(r'/ws/', Sharded)]), shards=2)
+        self.socket, self.port = testing.bind_unused_port()
+        self.server.add_socket(self.socket)
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestShardedServer, self).tearDown()
+
+    @coroutine
+    def read(self, connection):
+        message = yield connection.read_message()
+        raise Return(json.loads(message))
+
+    @testing.gen_test
+    def test_shards(self):
+        url = 'ws://localhost:{0}/ws/'.format(self.port)
+        connections = []
+        clients = []
+
+        for serial in range(4):
+            connection = yield websocket.websocket_connect(url)
+            connection.write_message(json.dumps({'serial': 1, 'call': 'whoami'}))
+            connections.append(connection)
+            clients.append((yield self.read(connection))['data'])
+
+        # Connections are handed over to the shards in turn
+        self.assertEqual(
+            [client['thread'] for client in clients],
+            ['wsrpc-shard-0', 'wsrpc-shard-1', 'wsrpc-shard-0', 'wsrpc-shard-1']
+        )
+        self.assertEqual([shard.accepted for shard in self.server.shards], [2, 2])
+
+        handlers = [Sharded._CLIENTS[client['id']] for client in clients]
+        self.assertEqual([handler.ioloop for handler in handlers], [shard.ioloop for shard in self.server.shards] * 2)
+
+        # Every connection is written by its own shard
+        yield Sharded.broadcast('notify', value=1)
+        for connection in connections:
+            message = yield self.read(connection)
+            self.assertEqual((message['call'], message['arguments']), ('notify', {'value': 1}))
+
+        yield Sharded.send_to(clients[1]['id'], 'notify', value=2)
+        self.assertEqual((yield self.read(connections[1]))['arguments'], {'value': 2})
+
+        for connection in connections:
+            connection.close()
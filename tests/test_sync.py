@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 # encoding: utf-8
+import json
+import os
+import threading
+from tornado.gen import sleep
 from tornado.testing import gen_test
+from tornado.websocket import websocket_connect
 from wsrpc import WebSocketThreaded
-from . import TestBase
+from . import TestBase, TestSyncRoute
 
 
 class TestSync(TestBase):
@@ -10,6 +15,8 @@ class TestSync(TestBase):
 
     def setUp(self):
         WebSocketThreaded.init_pool()
+        WebSocketThreaded.add_executor('io', 2)
+        WebSocketThreaded.add_executor('cpu', 2, process=True)
         super(TestSync, self).setUp()
 
 
@@ -27,3 +34,88 @@ class TestSync(TestBase):
         kw = dict(test=True, arg0=1, arg1=2, arg2=3, arg3=4)
         result = yield self.call('sync_func', **kw)
         self.assertEqual(result, kw)
+
+    @gen_test
+    def test_batch(self):
+        kw = dict(test=True, arg0=1)
+        futures = self.batch(('sync.simple_method', kw), ('sync_func', kw), ('sync.unknown', {}))
+        self.assertEqual((yield futures[:2]), [kw, kw])
+
+        with self.assertRaises(NotImplementedError):
+            yield futures[2]
+
+    @gen_test
+    def test_inline_executor(self):
+        self.assertEqual((yield self.call('sync.inline_method')), threading.current_thread().name)
+
+    @gen_test
+    def test_thread_executor(self):
+        self.assertNotEqual((yield self.call('sync.io_method')), threading.current_thread().name)
+
+    @gen_test(timeout=30)
+    def test_process_executor(self):
+        pid, result = yield self.call('cpu_func', a=1, b=2)
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(result, 3)
+
+    @gen_test
+    def test_stream(self):
+        self.assertEqual((yield self.call('sync.stream', count=100)), list(range(100)))
+
+    @gen_test
+    def test_cached(self):
+        cache = TestSyncRoute.cached_method.__cache__
+        cache.clear()
+        executions = TestSyncRoute.executions
+
+        results = yield [self.call('sync.cached_method', value=i % 2) for i in range(10)]
+        self.assertEqual(results, [i % 2 for i in range(10)])
+        self.assertEqual(TestSyncRoute.executions, executions + 2)
+
+        yield self.call('sync.cached_method', value=1)
+        self.assertEqual(TestSyncRoute.executions, executions + 2)
+
+        cache.invalidate(value=1)
+        yield self.call('sync.cached_method', value=1)
+        self.assertEqual(TestSyncRoute.executions, executions + 3)
+
+        stats = WebSocketThreaded.metrics.route('sync.cached_method')
+        self.assertGreaterEqual(stats.cache_hits, 9)
+
+    @gen_test
+    def test_cancel(self):
+        TestSyncRoute.cancelled.clear()
+        future = self.call('sync.long_method')
+        yield sleep(0.1)
+        self.cancel(self._serial)
+
+        yield sleep(0.1)
+        self.assertTrue(TestSyncRoute.cancelled.is_set())
+        self.assertFalse(future.done())
+
+    @gen_test
+    def test_cancel_cached(self):
+        connection = yield websocket_connect('ws://localhost:{0.port}{0.URI}'.format(self))
+        self.addCleanup(connection.close)
+
+        self.call('sync.cached_long_method', value=1)
+        yield sleep(0.05)
+        connection.write_message(json.dumps({'serial': 1, 'call': 'sync.cached_long_method', 'arguments': {'value': 1}}))
+        yield sleep(0.05)
+
+        # The shared execution isn't cancelled by the first of its callers
+        self.cancel(self._serial)
+        response = json.loads((yield connection.read_message()))
+        self.assertEqual((response['type'], response['data']), ('callback', 1))
+
+    @gen_test
+    def test_stream_credit(self):
+        self.grant_credits = False
+        future = self.call('sync.stream', count=20)
+
+        yield sleep(0.2)
+        self.assertFalse(future.done())
+        self.assertEqual(len(self._chunks[self._serial]), 16)
+
+        self.grant(self._serial, 4)
+        self.assertEqual((yield future), list(range(20)))
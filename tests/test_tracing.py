@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import logging
+from unittest import TestCase
+
+from wsrpc.websocket import tracing
+from wsrpc.websocket.metrics import clock
+
+
+class BrokenSink(tracing.Sink):
+    def export(self, trace):
+        raise RuntimeError('broken')
+
+
+class TestTracing(TestCase):
+    def test_sampling(self):
+        sink = tracing.MemorySink()
+
+        unsampled = tracing.Tracer(sink, rate=0)
+        self.assertIsNone(unsampled.start(None, 'route', 1))
+
+        trace = unsampled.start('abc', 'route', 1)
+        self.assertEqual(trace.id, 'abc')
+        self.assertFalse(trace.sampled)
+
+        trace.span('decode', clock())
+        trace.finish()
+        self.assertIsNone(trace.spans)
+        self.assertEqual(len(sink.traces), 0)
+
+        trace = tracing.Tracer(sink, rate=1).start(None, 'route', 1)
+        self.assertTrue(trace.sampled)
+        self.assertEqual(len(trace.id), 16)
+
+        trace.span('execute', clock())
+        trace.finish()
+        self.assertEqual(list(sink.traces), [trace])
+
+    def test_rate(self):
+        with self.assertRaises(ValueError):
+            tracing.Tracer(tracing.MemorySink(), rate=2)
+
+    def test_current(self):
+        trace = tracing.Tracer(tracing.MemorySink(), rate=1).start('abc', 'route', 1)
+
+        self.assertIsNone(tracing.current())
+        self.assertIs(trace.run(tracing.current), trace)
+        self.assertIsNone(tracing.current())
+
+    def test_to_dict(self):
+        trace = tracing.Tracer(tracing.MemorySink(), rate=1).start('abc', 'route', 3, 'client')
+        trace.span('decode', 10.0, 10.5)
+        trace.span('execute', 11.0, 12.0)
+
+        result = trace.to_dict()
+        self.assertEqual(result['duration'], 2.0)
+        self.assertEqual(result['spans'], [('decode', 0.0, 0.5), ('execute', 1.0, 1.0)])
+        self.assertEqual((result['id'], result['call'], result['serial'], result['client']), ('abc', 'route', 3, 'client'))
+
+    def test_broken_sink(self):
+        logging.getLogger('wsrpc.tracing').disabled = True
+        self.addCleanup(setattr, logging.getLogger('wsrpc.tracing'), 'disabled', False)
+
+        trace = tracing.Tracer(BrokenSink(), rate=1).start(None, 'route', 1)
+        trace.finish()
@@ -2,8 +2,9 @@
 # encoding: utf-8
 import os.path
 import tornado.web
-from .websocket import WebSocketRoute, WebSocket, WebSocketThreaded
+from .websocket import WebSocketRoute, WebSocket, WebSocketThreaded, WebSocketHybrid, ShardedHTTPServer
 from .websocket.route import decorators
+from .websocket.metrics import MetricsHandler
 
 STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 
@@ -14,3 +15,11 @@ def wsrpc_static(url):
         tornado.web.StaticFileHandler,
         {'path': STATIC_DIR}
     )
+
+
+def wsrpc_metrics(url, metrics=WebSocket.metrics):
+    return (
+        url,
+        MetricsHandler,
+        {'metrics': metrics}
+    )
@@ -1,6 +1,12 @@
 (function (global) {
-	function WSRPCConstructor (URL, reconnectTimeout) {
+	function WSRPCConstructor (URL, reconnectTimeout, options) {
 		var self = this;
+		options = options || {};
+
+		var codec = global.WSRPC.CODECS[options.codec || 'json'];
+		if (typeof codec === 'undefined') {
+			throw Error('Unknown codec: ' + options.codec);
+		}
 		self.serial = 1;
 		self.eventId = 0;
 		self.socketStarted = false;
@@ -19,6 +25,27 @@
 		};
 
 		self.callQueue = [];
+		self.batchQueue = [];
+		self.batchScheduled = false;
+		self.streams = {};
+		self.credits = {};
+		self.creditScheduled = false;
+
+		// Reconnects are delayed exponentially from reconnectTimeout up to options.maxReconnectTimeout
+		// with the random jitter, so clients of the restarted server don't reconnect at once.
+		// The delay sent by the draining server is used instead once.
+		self.reconnectAttempts = 0;
+		self.reconnectHint = null;
+
+		// The server with sessions enabled issues the token, the client reconnects with it and
+		// the number of the received frames, so the server replays the missed ones and keeps
+		// the routes and the calls in flight. Received frames are acknowledged periodically.
+		self.sessionToken = null;
+		self.received = 0;
+		self.acknowledged = 0;
+		self.ackTimer = null;
+		self.resumeSerial = 0;
+		self.resent = {};
 		
 		var log = function (msg) {
 			if (global.WSRPC.DEBUG) {
@@ -37,7 +64,7 @@
 				if ('group' in console && 'groupEnd' in console && 'dir' in console) {
 					console.group('WSRPC.TRACE');
 					if ('data' in msg) {
-						console.dir(JSON.parse(msg.data));
+						console.dir(codec.decode(msg.data));
 					} else {
 						console.dir(msg)
 					}
@@ -59,21 +86,45 @@
 			3: 'CLOSED'
 		};
 
+		function reconnectDelay() {
+			if (self.reconnectHint !== null) {
+				var hint = self.reconnectHint;
+				self.reconnectHint = null;
+				return hint;
+			}
+
+			var timeout = reconnectTimeout || 1000;
+			if (options.backoff === false) {
+				return timeout;
+			}
+
+			var delay = Math.min(options.maxReconnectTimeout || 30000, timeout * Math.pow(2, self.reconnectAttempts));
+			self.reconnectAttempts++;
+
+			return delay / 2 + Math.random() * delay / 2;
+		}
+
 		function reconnect(callEvents) {
 			setTimeout(function () {
 				try {
 					self.socket = createSocket();
-					self.serial = 1;
+					if (self.sessionToken === null) {
+						self.serial = 1;
+					}
 				} catch (exc) {
 					callEvents('onerror', exc);
 					delete self.socket;
 					log(exc);
 				}
-			}, reconnectTimeout || 1000);
+			}, reconnectDelay());
 		}
 
 		function createSocket (ev) {
-			var ws = new WebSocket(URL);
+			// JSON is the default and doesn't need negotiation
+			var url = sessionURL();
+			var ws = codec.name ? new WebSocket(url, [codec.name]) : new WebSocket(url);
+			// Binary codecs and the JSON messages with attachments are the binary frames
+			ws.binaryType = 'arraybuffer';
 
 			var rejectQueue = function () {
 				self.connectionNumber++; // rejects incoming calls
@@ -102,14 +153,23 @@
 			ws.onclose = function (err) {
 				log('WSRPC: ONCLOSE CALLED (STATE: ' + self.public.state() + ')');
 				trace(err);
-				
-				for (var serial in self.store) {
-					if (self.store[serial].hasOwnProperty('reject') && self.store[serial].promise.isPending()) {
-						self.store[serial].reject('Connection closed');
+
+				clearTimeout(self.ackTimer);
+				self.ackTimer = null;
+
+				// Calls of the session are answered after the resume
+				if (self.sessionToken === null) {
+					for (var serial in self.store) {
+						if (self.store[serial].hasOwnProperty('reject') && self.store[serial].promise.isPending()) {
+							self.store[serial].reject('Connection closed');
+						}
 					}
+
+					self.streams = {};
+					self.credits = {};
+					rejectQueue();
 				}
 
-				rejectQueue();
 				callEvents('onclose', ev);
 				callEvents('onchange', ev);
 				reconnect(callEvents);
@@ -118,8 +178,10 @@
 			ws.onerror = function (err) {
 				log('WSRPC: ONERROR CALLED (STATE: ' + self.public.state() + ')');
 				trace(err);
-				
-				rejectQueue();
+
+				if (self.sessionToken === null) {
+					rejectQueue();
+				}
 				callEvents('onerror', err);
 				callEvents('onchange', err);
 
@@ -157,69 +219,117 @@
 				log('WSRPC: ONOPEN CALLED (STATE: ' + self.public.state() + ')');
 				trace(ev);
 
-				while (0 < self.callQueue.length) {
-					self.socket.send(JSON.stringify(self.callQueue.shift(), 0, 1));
+				self.reconnectAttempts = 0;
+
+				// Calls sent before this connection are lost unless the session is resumed
+				self.resumeSerial = self.serial;
+				self.resent = {};
+				for (var i = 0; i < self.callQueue.length; i++) {
+					self.resent[self.callQueue[i].serial] = true;
 				}
 
+				sendBatch(self.callQueue.splice(0, self.callQueue.length));
+
 				callEvents('onconnect', ev);
 				callEvents('onchange', ev);
 			};
 
+			function handleMessage(data) {
+				try {
+					log(data.data);
+					if (data.hasOwnProperty('type') && data.type === 'call') {
+						if (!self.routes.hasOwnProperty(data.call)) {
+							throw Error('Route not found');
+						}
+
+						var connectionNumber = self.connectionNumber;
+						Q(self.routes[data.call](data.arguments, data.trace)).then(function(promisedResult) {
+							// serial 0 is the broadcast which doesn't wait for the reply
+							if (connectionNumber == self.connectionNumber && data.serial !== 0) {
+								self.socket.send(codec.encode({
+									serial: data.serial,
+									type: 'callback',
+									data: promisedResult
+								}));
+							}
+						}).done();
+					} else if (data.hasOwnProperty('type') && data.type === 'drain') {
+						// The server closes the connection when the calls in flight are finished
+						log('Server is draining, reconnect in ' + data.data.reconnect + 's');
+						self.reconnectHint = data.data.reconnect * 1000;
+					} else if (data.hasOwnProperty('type') && data.type === 'error') {
+						if (!self.store.hasOwnProperty(data.serial)) {
+							return log('Unknown callback');
+						}
+						var deferred = self.store[data.serial];
+						if (typeof deferred === 'undefined') {
+							return log('Confirmation without handler');
+						}
+						delete self.store[data.serial];
+						delete self.streams[data.serial];
+						log('REJECTING: ' + data.data);
+						deferred.reject(data.data);
+					} else if (data.hasOwnProperty('type') && data.type === 'chunk') {
+						var stream = self.streams[data.serial];
+						if (typeof stream === 'undefined') {
+							if (!self.store.hasOwnProperty(data.serial)) {
+								return log('Chunk without handler');
+							}
+							// call() of the streaming route resolves with the all chunks
+							stream = self.streams[data.serial] = new Collector(data.serial);
+						}
+						stream.push(data.data);
+					} else {
+						var deferred = self.store[data.serial];
+						if (typeof deferred === 'undefined') {
+							return log('Confirmation without handler');
+						}
+						var stream = self.streams[data.serial];
+						delete self.store[data.serial];
+						delete self.streams[data.serial];
+						if (data.type === 'end') {
+							return deferred.resolve(stream ? stream.result() : []);
+						} else if (data.type === 'callback') {
+							return deferred.resolve(data.data);
+						} else {
+							return deferred.reject(data.data);
+						}
+					}
+				} catch (exception) {
+					var err = {
+						data: exception.message,
+						type: 'error',
+						serial: data?data.serial:null
+					};
+
+					self.socket.send(codec.encode(err));
+					log(exception.stack);
+				}
+			}
+
 			ws.onmessage = function (message) {
 				log('WSRPC: ONMESSAGE CALLED (' + self.public.state() + ')');
 				trace(message);
-				var data = null;
 				if (message.type == 'message') {
-					try {
-						data = JSON.parse(message.data);
-						log(data.data);
-						if (data.hasOwnProperty('type') && data.type === 'call') {
-							if (!self.routes.hasOwnProperty(data.call)) {
-								throw Error('Route not found');
-							}
+					var data = codec.decode(message.data);
 
-							var connectionNumber = self.connectionNumber;
-							Q(self.routes[data.call](data.arguments)).then(function(promisedResult) {
-								if (connectionNumber == self.connectionNumber) {
-									self.socket.send(JSON.stringify({
-										serial: data.serial,
-										type: 'callback',
-										data: promisedResult
-									}));
-								}
-							}).done();
-						} else if (data.hasOwnProperty('type') && data.type === 'error') {
-							if (!self.store.hasOwnProperty(data.serial)) {
-								return log('Unknown callback');
-							}
-							var deferred = self.store[data.serial];
-							if (typeof deferred === 'undefined') {
-								return log('Confirmation without handler');
-							}
-							delete self.store[data.serial];
-							log('REJECTING: ' + data.data);
-							deferred.reject(data.data);
-						} else {
-							var deferred = self.store[data.serial];
-							if (typeof deferred === 'undefined') {
-								return log('Confirmation without handler');
-							}
-							delete self.store[data.serial];
-							if (data.type === 'callback') {
-								return deferred.resolve(data.data);
-							} else {
-								return deferred.reject(data.data);
-							}
+					// The session message isn't counted, it's the first message of every connection
+					if (!(data instanceof Array) && data.type === 'session') {
+						return handleSession(data.data);
+					}
+
+					if (self.sessionToken !== null) {
+						self.received++;
+						scheduleAck();
+					}
+
+					// The batch of the messages
+					if (data instanceof Array) {
+						for (var i = 0; i < data.length; i++) {
+							handleMessage(data[i]);
 						}
-					} catch (exception) {
-						var err = {
-							data: exception.message,
-							type: 'error',
-							serial: data?data.serial:null
-						};
-
-						self.socket.send(JSON.stringify(err));
-						log(exception.stack);
+					} else {
+						handleMessage(data);
 					}
 				}
 			};
@@ -227,9 +337,225 @@
 			return ws;
 		}
 
-		var makeCall = function (func, args, params) {
+		function sendBatch(batch) {
+			if (batch.length === 1) {
+				self.socket.send(codec.encode(batch[0]));
+			} else if (batch.length > 1) {
+				self.socket.send(codec.encode(batch));
+			}
+		}
+
+		function sessionURL() {
+			if (self.sessionToken === null) {
+				return URL;
+			}
+
+			return URL + (URL.indexOf('?') === -1 ? '?' : '&') +
+				'session=' + encodeURIComponent(self.sessionToken) + '&received=' + self.received;
+		}
+
+		function handleSession(session) {
+			if (self.sessionToken !== null && !session.resumed) {
+				log('Session is not resumed, the calls in flight are rejected');
+				self.connectionNumber++; // rejects incoming calls
+
+				for (var serial in self.store) {
+					if (parseInt(serial, 10) <= self.resumeSerial && !self.resent.hasOwnProperty(serial)) {
+						var deferred = self.store[serial];
+						delete self.store[serial];
+						delete self.streams[serial];
+						delete self.credits[serial];
+
+						if (deferred.promise.isPending()) {
+							deferred.reject('Connection closed');
+						}
+					}
+				}
+			}
+
+			if (!session.resumed) {
+				self.received = 0;
+				self.acknowledged = 0;
+			}
+
+			self.sessionToken = session.token;
+		}
+
+		function sendAck() {
+			clearTimeout(self.ackTimer);
+			self.ackTimer = null;
+
+			if (self.received > self.acknowledged && self.public.state() === 'OPEN') {
+				self.socket.send(codec.encode({serial: 0, type: 'ack', data: self.received}));
+				self.acknowledged = self.received;
+			}
+		}
+
+		function scheduleAck() {
+			// The server keeps the frames for the replay until they're acknowledged
+			if (self.received - self.acknowledged >= (options.ackEvery || 32)) {
+				sendAck();
+			} else if (self.ackTimer === null) {
+				self.ackTimer = setTimeout(sendAck, 1000);
+			}
+		}
+
+		function flushBatch() {
+			self.batchScheduled = false;
+
+			if (self.public.state() === 'OPEN') {
+				sendBatch(self.batchQueue.splice(0, self.batchQueue.length));
+			} else {
+				// will be sent on connect
+				Array.prototype.push.apply(self.callQueue, self.batchQueue.splice(0, self.batchQueue.length));
+			}
+		}
+
+		function flushCredits() {
+			self.creditScheduled = false;
+
+			var credits = [];
+			for (var serial in self.credits) {
+				if (self.store.hasOwnProperty(serial)) {
+					credits.push({serial: parseInt(serial, 10), type: 'credit', data: self.credits[serial]});
+				}
+			}
+			self.credits = {};
+
+			if (self.public.state() === 'OPEN') {
+				sendBatch(credits);
+			}
+		}
+
+		function grantCredit(serial, credit) {
+			// Credits granted within one tick are sent in one frame
+			self.credits[serial] = (self.credits[serial] || 0) + credit;
+			if (!self.creditScheduled) {
+				self.creditScheduled = true;
+				Q.nextTick(flushCredits);
+			}
+		}
+
+		function Collector(serial) {
+			var chunks = [];
+
+			this.push = function (value) {
+				chunks.push(value);
+				grantCredit(serial, 1);
+			};
+
+			this.result = function () {
+				return chunks;
+			};
+		}
+
+		function Stream(promise) {
+			var stream = this;
+			var buffer = [];
+			var waiters = [];
+			var finished = false;
+			var error;
+
+			function settle() {
+				while (waiters.length && (buffer.length || finished)) {
+					var waiter = waiters.shift();
+					if (buffer.length) {
+						waiter.resolve({value: buffer.shift(), done: false});
+						grantCredit(stream.serial, 1);
+					} else if (typeof error !== 'undefined') {
+						waiter.reject(error);
+					} else {
+						waiter.resolve({value: undefined, done: true});
+					}
+				}
+			}
+
+			promise.then(function (value) {
+				// The route which is not a generator yields the only result
+				if (typeof value !== 'undefined') {
+					buffer.push(value);
+				}
+				finished = true;
+				settle();
+			}, function (reason) {
+				if (!finished) {
+					error = reason;
+					finished = true;
+				}
+				settle();
+			}).done();
+
+			stream.push = function (value) {
+				if (finished) {
+					return;
+				}
+				buffer.push(value);
+				settle();
+			};
+
+			stream.result = function () {};
+
+			stream.next = function () {
+				var waiter = Q.defer();
+				waiters.push(waiter);
+				settle();
+				return waiter.promise;
+			};
+
+			stream['return'] = function () {
+				var serial = stream.serial;
+				buffer.length = 0;
+				finished = true;
+				settle();
+				// The server stops the stream
+				cancelCall(serial, 'Stream is closed');
+				return Q({value: undefined, done: true});
+			};
+
+			if (typeof Symbol !== 'undefined' && Symbol.asyncIterator) {
+				stream[Symbol.asyncIterator] = function () {
+					return stream;
+				};
+			}
+		}
+
+		function removeQueued(queue, serial) {
+			for (var i = 0; i < queue.length; i++) {
+				if (queue[i].serial === serial) {
+					queue.splice(i, 1);
+					return true;
+				}
+			}
+			return false;
+		}
+
+		function cancelCall(serial, reason) {
+			var deferred = self.store[serial];
+			if (typeof deferred === 'undefined') {
+				return;
+			}
+
+			delete self.store[serial];
+			delete self.streams[serial];
+			delete self.credits[serial];
+
+			// The call which hasn't been sent yet is just dropped
+			var queued = removeQueued(self.batchQueue, serial) || removeQueued(self.callQueue, serial);
+			if (!queued && self.public.state() === 'OPEN') {
+				self.socket.send(codec.encode({serial: serial, type: 'cancel'}));
+			}
+
+			deferred.reject(typeof reason === 'undefined' ? 'Call is cancelled' : reason);
+		}
+
+		var makeCall = function (func, args, params, stream) {
 			self.serial += 2;
 			var deferred = Q.defer();
+
+			if (stream) {
+				stream.serial = self.serial;
+				self.streams[self.serial] = stream;
+			}
 			
 			var callObj = {
 				serial: self.serial,
@@ -238,11 +564,26 @@
 				arguments: args
 			};
 
+			// The server traces the call under this id and passes it to its calls of the client routes
+			if (params && params.trace) {
+				callObj.trace = params.trace;
+			}
+
 			var state = self.public.state();
 
 			if (state === 'OPEN') {
 				self.store[self.serial] = deferred;
-				self.socket.send(JSON.stringify(callObj));
+
+				if (global.WSRPC.BATCH) {
+					// Calls made within one tick are sent in one frame
+					self.batchQueue.push(callObj);
+					if (!self.batchScheduled) {
+						self.batchScheduled = true;
+						Q.nextTick(flushBatch);
+					}
+				} else {
+					self.socket.send(codec.encode(callObj));
+				}
 			} else if (state === 'CONNECTING') {
 				log('SOCKET IS: ' + state);
 				self.store[self.serial] = deferred;
@@ -250,6 +591,7 @@
 			} else {
 				log('SOCKET IS: ' + state);
 				if (params && params.noWait) {
+					delete self.streams[self.serial];
 					deferred.reject('Socket is: ' + state);
 				} else {
 					self.store[self.serial] = deferred;
@@ -257,6 +599,18 @@
 				}
 			}
 
+			// AbortSignal or any object with "aborted" and addEventListener('abort', ...)
+			var signal = params && params.signal;
+			if (signal && self.store[callObj.serial] === deferred) {
+				if (signal.aborted) {
+					cancelCall(callObj.serial, signal.reason);
+				} else {
+					signal.addEventListener('abort', function () {
+						cancelCall(callObj.serial, signal.reason);
+					});
+				}
+			}
+
 			return deferred.promise;
 		};
 
@@ -266,6 +620,13 @@
 			call: function (func, args, params) {
 				return makeCall(func, args, params);
 			},
+			stream: function (func, args, params) {
+				// Async iterator over the chunks, credits are granted as chunks are consumed
+				var deferred = Q.defer();
+				var stream = new Stream(deferred.promise);
+				makeCall(func, args, params, stream).then(deferred.resolve, deferred.reject);
+				return stream;
+			},
 			init: function () {
 				log('Websocket initializing..')
 			},
@@ -324,4 +685,118 @@
 	global.WSRPC = WSRPCConstructor;
 	global.WSRPC.DEBUG = false;
 	global.WSRPC.TRACE = false;
+	global.WSRPC.BATCH = true;
+
+	// Binary attachments of the JSON messages: ArrayBuffers and typed arrays are
+	// replaced by {"$binary": index} and sent after the JSON header in the same binary frame
+	// [header length][JSON header][attachment length][attachment]...
+	var BINARY_MARKER = '$binary';
+
+	function isBinary(value) {
+		return value instanceof ArrayBuffer || (ArrayBuffer.isView && ArrayBuffer.isView(value));
+	}
+
+	function toBytes(value) {
+		if (value instanceof ArrayBuffer) {
+			return new Uint8Array(value);
+		}
+		return new Uint8Array(value.buffer, value.byteOffset, value.byteLength);
+	}
+
+	function encodeUTF8(text) {
+		if (typeof TextEncoder !== 'undefined') {
+			return new TextEncoder().encode(text);
+		}
+
+		var raw = unescape(encodeURIComponent(text));
+		var bytes = new Uint8Array(raw.length);
+		for (var i = 0; i < raw.length; i++) {
+			bytes[i] = raw.charCodeAt(i);
+		}
+		return bytes;
+	}
+
+	function decodeUTF8(bytes) {
+		if (typeof TextDecoder !== 'undefined') {
+			return new TextDecoder('utf-8').decode(bytes);
+		}
+
+		var raw = '';
+		for (var i = 0; i < bytes.length; i++) {
+			raw += String.fromCharCode(bytes[i]);
+		}
+		return decodeURIComponent(escape(raw));
+	}
+
+	function packAttachments(obj) {
+		var attachments = [];
+		var header = JSON.stringify(obj, function (key, value) {
+			if (isBinary(value)) {
+				var marker = {};
+				marker[BINARY_MARKER] = attachments.push(toBytes(value)) - 1;
+				return marker;
+			}
+			return value;
+		});
+
+		if (!attachments.length) {
+			return header;
+		}
+
+		var parts = [encodeUTF8(header)].concat(attachments);
+		var size = 0;
+		parts.forEach(function (part) { size += 4 + part.byteLength; });
+
+		var frame = new Uint8Array(size);
+		var view = new DataView(frame.buffer);
+		var offset = 0;
+
+		parts.forEach(function (part) {
+			view.setUint32(offset, part.byteLength);
+			frame.set(part, offset + 4);
+			offset += 4 + part.byteLength;
+		});
+
+		return frame.buffer;
+	}
+
+	function unpackAttachments(data) {
+		var view = new DataView(data);
+		var size = view.getUint32(0);
+		var offset = 4 + size;
+		var header = decodeUTF8(new Uint8Array(data, 4, size));
+
+		var attachments = [];
+		while (offset < data.byteLength) {
+			size = view.getUint32(offset);
+			offset += 4;
+			attachments.push(data.slice(offset, offset + size));
+			offset += size;
+		}
+
+		return JSON.parse(header, function (key, value) {
+			if (value !== null && typeof value === 'object' && BINARY_MARKER in value) {
+				return attachments[value[BINARY_MARKER]];
+			}
+			return value;
+		});
+	}
+
+	// Codecs are selected through the WebSocket subprotocol named as codec.name
+	global.WSRPC.CODECS = {
+		json: {
+			name: null,
+			binary: false,
+			encode: packAttachments,
+			decode: function (data) {
+				return typeof data === 'string' ? JSON.parse(data) : unpackAttachments(data);
+			}
+		}
+	};
+
+	global.WSRPC.addCodec = function (name, codec) {
+		// codec: {binary: Boolean, encode: function (obj), decode: function (data)}
+		codec.name = name;
+		global.WSRPC.CODECS[name] = codec;
+	};
 })(this);
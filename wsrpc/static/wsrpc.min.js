@@ -1,9 +1,69 @@
-(function(g){g.WSRPC=function(n,p){function q(c){setTimeout(function(){try{a.socket=l(),a.serial=1}catch(b){c("onerror",b),delete a.socket,d(b)}},p||1E3)}function l(c){function b(c,h){for(;0<a.oneTimeEventStore[c].length;){var b=a.oneTimeEventStore[c].shift();b.hasOwnProperty("resolve")&&b.promise.isPending()&&b.resolve()}for(var e in a.eventStore[c]){b=a.eventStore[c][e];try{b(h)}catch(f){f.hasOwnProperty("stack")?d(f.stack):d("Event function "+b+" raised unknown error: "+f)}}}var e=new WebSocket(n),
-f=function(){for(a.connectionNumber++;0<a.callQueue.length;){var c=a.callQueue.shift(),b=a.store[c.serial];delete a.store[c.serial];b&&b.promise.isPending()&&b.reject("WebSocket error occurred")}};e.onclose=function(r){d("WSRPC: ONCLOSE CALLED (STATE: "+a["public"].state()+")");k(r);for(var h in a.store)a.store[h].hasOwnProperty("reject")&&a.store[h].promise.isPending()&&a.store[h].reject("Connection closed");f();b("onclose",c);b("onchange",c);q(b)};e.onerror=function(c){d("WSRPC: ONERROR CALLED (STATE: "+
-a["public"].state()+")");k(c);f();b("onerror",c);b("onchange",c);d(["WebSocket has been closed by error: ",c])};e.onopen=function(c){d("WSRPC: ONOPEN CALLED (STATE: "+a["public"].state()+")");for(k(c);0<a.callQueue.length;)a.socket.send(JSON.stringify(a.callQueue.shift(),0,1));b("onconnect",c);b("onchange",c)};e.onmessage=function(c){d("WSRPC: ONMESSAGE CALLED ("+a["public"].state()+")");k(c);var b=null;if("message"==c.type)try{if(b=JSON.parse(c.data),d(b.data),b.hasOwnProperty("type")&&"call"===
-b.type){if(!a.routes.hasOwnProperty(b.call))throw Error("Route not found");var f=a.connectionNumber;Q(a.routes[b.call](b.arguments)).then(function(c){f==a.connectionNumber&&a.socket.send(JSON.stringify({serial:b.serial,type:"callback",data:c}))}).done()}else if(b.hasOwnProperty("type")&&"error"===b.type){if(!a.store.hasOwnProperty(b.serial))return d("Unknown callback");var e=a.store[b.serial];if("undefined"===typeof e)return d("Confirmation without handler");delete a.store[b.serial];d("REJECTING: "+
-b.data);e.reject(b.data)}else{e=a.store[b.serial];if("undefined"===typeof e)return d("Confirmation without handler");delete a.store[b.serial];return"callback"===b.type?e.resolve(b.data):e.reject(b.data)}}catch(g){a.socket.send(JSON.stringify({data:g.message,type:"error",serial:b?b.serial:null})),d(g.stack)}};return e}var a=this;a.serial=1;a.eventId=0;a.socketStarted=!1;a.eventStore={onconnect:{},onerror:{},onclose:{},onchange:{}};a.connectionNumber=0;a.oneTimeEventStore={onconnect:[],onerror:[],onclose:[],
-onchange:[]};a.callQueue=[];var d=function(a){g.WSRPC.DEBUG&&("group"in console&&"groupEnd"in console?(console.group("WSRPC.DEBUG"),console.debug(a),console.groupEnd()):console.debug(a))},k=function(a){g.WSRPC.TRACE&&("group"in console&&"groupEnd"in console&&"dir"in console?(console.group("WSRPC.TRACE"),"data"in a?console.dir(JSON.parse(a.data)):console.dir(a),console.groupEnd()):"data"in a?console.log("OBJECT DUMP: "+a.data):console.log("OBJECT DUMP: "+a))},m={0:"CONNECTING",1:"OPEN",2:"CLOSING",
-3:"CLOSED"};a.routes={};a.store={};a["public"]={call:function(c,b,e){a.serial+=2;var f=Q.defer();c={serial:a.serial,call:c,arguments:b};b=a["public"].state();"OPEN"===b?(a.store[a.serial]=f,a.socket.send(JSON.stringify(c))):"CONNECTING"===b?(d("SOCKET IS: "+b),a.store[a.serial]=f,a.callQueue.push(c)):(d("SOCKET IS: "+b),e&&e.noWait?f.reject("Socket is: "+b):(a.store[a.serial]=f,a.callQueue.push(c)));return f.promise},init:function(){d("Websocket initializing..")},addRoute:function(c,b){a.routes[c]=
-b},addEventListener:function(c,b){return a.eventStore[c][a.eventId++]=b},onEvent:function(c){var b=Q.defer();a.oneTimeEventStore[c].push(b);return b.promise},removeEventListener:function(c,b){return b<a.eventStore[c].length?(a.eventStore[c].splice(b,1),!0):!1},deleteRoute:function(c){return delete a.routes[c]},destroy:function(){function c(){}a.socket.onclose=c;a.socket.onerror=c;return a.socket.close()},state:function(){return a.socketStarted&&a.socket?m[a.socket.readyState]:m[3]},connect:function(){a.socketStarted=
-!0;a.socket=l()}};a["public"].addRoute("log",function(a){console.info("Websocket sent: "+a)});a["public"].addRoute("ping",function(a){return a});return a["public"]};g.WSRPC.DEBUG=!1;g.WSRPC.TRACE=!1})(this);
\ No newline at end of file
+(function(global){function WSRPCConstructor(URL,reconnectTimeout,options){var self=this;options=options||{};var codec=global.WSRPC.CODECS[options.codec||'json'];if(typeof codec==='undefined'){throw Error('Unknown codec: '+options.codec);}
+self.serial=1;self.eventId=0;self.socketStarted=false;self.eventStore={onconnect:{},onerror:{},onclose:{},onchange:{}};self.connectionNumber=0;self.oneTimeEventStore={onconnect:[],onerror:[],onclose:[],onchange:[]};self.callQueue=[];self.batchQueue=[];self.batchScheduled=false;self.streams={};self.credits={};self.creditScheduled=false;self.reconnectAttempts=0;self.reconnectHint=null;self.sessionToken=null;self.received=0;self.acknowledged=0;self.ackTimer=null;self.resumeSerial=0;self.resent={};var log=function(msg){if(global.WSRPC.DEBUG){if('group'in console&&'groupEnd'in console){console.group('WSRPC.DEBUG');console.debug(msg);console.groupEnd();}else{console.debug(msg);}}};var trace=function(msg){if(global.WSRPC.TRACE){if('group'in console&&'groupEnd'in console&&'dir'in console){console.group('WSRPC.TRACE');if('data'in msg){console.dir(codec.decode(msg.data));}else{console.dir(msg)}
+console.groupEnd();}else{if('data'in msg){console.log('OBJECT DUMP: '+msg.data);}else{console.log('OBJECT DUMP: '+msg);}}}};var readyState={0:'CONNECTING',1:'OPEN',2:'CLOSING',3:'CLOSED'};function reconnectDelay(){if(self.reconnectHint!==null){var hint=self.reconnectHint;self.reconnectHint=null;return hint;}
+var timeout=reconnectTimeout||1000;if(options.backoff===false){return timeout;}
+var delay=Math.min(options.maxReconnectTimeout||30000,timeout*Math.pow(2,self.reconnectAttempts));self.reconnectAttempts++;return delay/2+Math.random()*delay/2;}
+function reconnect(callEvents){setTimeout(function(){try{self.socket=createSocket();if(self.sessionToken===null){self.serial=1;}}catch(exc){callEvents('onerror',exc);delete self.socket;log(exc);}},reconnectDelay());}
+function createSocket(ev){var url=sessionURL();var ws=codec.name?new WebSocket(url,[codec.name]):new WebSocket(url);ws.binaryType='arraybuffer';var rejectQueue=function(){self.connectionNumber++;while(0<self.callQueue.length){var callObj=self.callQueue.shift();var deferred=self.store[callObj.serial];delete self.store[callObj.serial];if(deferred&&deferred.promise.isPending()){deferred.reject('WebSocket error occurred');}}
+for(var key in self.store){var deferred=self.store[key];if(deferred&&deferred.promise.isPending()){deferred.reject('WebSocket error occurred');}}};ws.onclose=function(err){log('WSRPC: ONCLOSE CALLED (STATE: '+self.public.state()+')');trace(err);clearTimeout(self.ackTimer);self.ackTimer=null;if(self.sessionToken===null){for(var serial in self.store){if(self.store[serial].hasOwnProperty('reject')&&self.store[serial].promise.isPending()){self.store[serial].reject('Connection closed');}}
+self.streams={};self.credits={};rejectQueue();}
+callEvents('onclose',ev);callEvents('onchange',ev);reconnect(callEvents);};ws.onerror=function(err){log('WSRPC: ONERROR CALLED (STATE: '+self.public.state()+')');trace(err);if(self.sessionToken===null){rejectQueue();}
+callEvents('onerror',err);callEvents('onchange',err);log(['WebSocket has been closed by error: ',err]);};function tryCallEvent(func,event){try{return func(event);}catch(e){if(e.hasOwnProperty('stack')){log(e.stack);}else{log('Event function '+func+' raised unknown error: '+e);}}}
+function callEvents(evName,event){while(0<self.oneTimeEventStore[evName].length){var def=self.oneTimeEventStore[evName].shift();if(def.hasOwnProperty('resolve')&&def.promise.isPending()){def.resolve();}}
+for(var i in self.eventStore[evName]){var cur=self.eventStore[evName][i];tryCallEvent(cur,event);}}
+ws.onopen=function(ev){log('WSRPC: ONOPEN CALLED (STATE: '+self.public.state()+')');trace(ev);self.reconnectAttempts=0;self.resumeSerial=self.serial;self.resent={};for(var i=0;i<self.callQueue.length;i++){self.resent[self.callQueue[i].serial]=true;}
+sendBatch(self.callQueue.splice(0,self.callQueue.length));callEvents('onconnect',ev);callEvents('onchange',ev);};function handleMessage(data){try{log(data.data);if(data.hasOwnProperty('type')&&data.type==='call'){if(!self.routes.hasOwnProperty(data.call)){throw Error('Route not found');}
+var connectionNumber=self.connectionNumber;Q(self.routes[data.call](data.arguments,data.trace)).then(function(promisedResult){if(connectionNumber==self.connectionNumber&&data.serial!==0){self.socket.send(codec.encode({serial:data.serial,type:'callback',data:promisedResult}));}}).done();}else if(data.hasOwnProperty('type')&&data.type==='drain'){log('Server is draining, reconnect in '+data.data.reconnect+'s');self.reconnectHint=data.data.reconnect*1000;}else if(data.hasOwnProperty('type')&&data.type==='error'){if(!self.store.hasOwnProperty(data.serial)){return log('Unknown callback');}
+var deferred=self.store[data.serial];if(typeof deferred==='undefined'){return log('Confirmation without handler');}
+delete self.store[data.serial];delete self.streams[data.serial];log('REJECTING: '+data.data);deferred.reject(data.data);}else if(data.hasOwnProperty('type')&&data.type==='chunk'){var stream=self.streams[data.serial];if(typeof stream==='undefined'){if(!self.store.hasOwnProperty(data.serial)){return log('Chunk without handler');}
+stream=self.streams[data.serial]=new Collector(data.serial);}
+stream.push(data.data);}else{var deferred=self.store[data.serial];if(typeof deferred==='undefined'){return log('Confirmation without handler');}
+var stream=self.streams[data.serial];delete self.store[data.serial];delete self.streams[data.serial];if(data.type==='end'){return deferred.resolve(stream?stream.result():[]);}else if(data.type==='callback'){return deferred.resolve(data.data);}else{return deferred.reject(data.data);}}}catch(exception){var err={data:exception.message,type:'error',serial:data?data.serial:null};self.socket.send(codec.encode(err));log(exception.stack);}}
+ws.onmessage=function(message){log('WSRPC: ONMESSAGE CALLED ('+self.public.state()+')');trace(message);if(message.type=='message'){var data=codec.decode(message.data);if(!(data instanceof Array)&&data.type==='session'){return handleSession(data.data);}
+if(self.sessionToken!==null){self.received++;scheduleAck();}
+if(data instanceof Array){for(var i=0;i<data.length;i++){handleMessage(data[i]);}}else{handleMessage(data);}}};return ws;}
+function sendBatch(batch){if(batch.length===1){self.socket.send(codec.encode(batch[0]));}else if(batch.length>1){self.socket.send(codec.encode(batch));}}
+function sessionURL(){if(self.sessionToken===null){return URL;}
+return URL+(URL.indexOf('?')===-1?'?':'&')+'session='+encodeURIComponent(self.sessionToken)+'&received='+self.received;}
+function handleSession(session){if(self.sessionToken!==null&&!session.resumed){log('Session is not resumed, the calls in flight are rejected');self.connectionNumber++;for(var serial in self.store){if(parseInt(serial,10)<=self.resumeSerial&&!self.resent.hasOwnProperty(serial)){var deferred=self.store[serial];delete self.store[serial];delete self.streams[serial];delete self.credits[serial];if(deferred.promise.isPending()){deferred.reject('Connection closed');}}}}
+if(!session.resumed){self.received=0;self.acknowledged=0;}
+self.sessionToken=session.token;}
+function sendAck(){clearTimeout(self.ackTimer);self.ackTimer=null;if(self.received>self.acknowledged&&self.public.state()==='OPEN'){self.socket.send(codec.encode({serial:0,type:'ack',data:self.received}));self.acknowledged=self.received;}}
+function scheduleAck(){if(self.received-self.acknowledged>=(options.ackEvery||32)){sendAck();}else if(self.ackTimer===null){self.ackTimer=setTimeout(sendAck,1000);}}
+function flushBatch(){self.batchScheduled=false;if(self.public.state()==='OPEN'){sendBatch(self.batchQueue.splice(0,self.batchQueue.length));}else{Array.prototype.push.apply(self.callQueue,self.batchQueue.splice(0,self.batchQueue.length));}}
+function flushCredits(){self.creditScheduled=false;var credits=[];for(var serial in self.credits){if(self.store.hasOwnProperty(serial)){credits.push({serial:parseInt(serial,10),type:'credit',data:self.credits[serial]});}}
+self.credits={};if(self.public.state()==='OPEN'){sendBatch(credits);}}
+function grantCredit(serial,credit){self.credits[serial]=(self.credits[serial]||0)+credit;if(!self.creditScheduled){self.creditScheduled=true;Q.nextTick(flushCredits);}}
+function Collector(serial){var chunks=[];this.push=function(value){chunks.push(value);grantCredit(serial,1);};this.result=function(){return chunks;};}
+function Stream(promise){var stream=this;var buffer=[];var waiters=[];var finished=false;var error;function settle(){while(waiters.length&&(buffer.length||finished)){var waiter=waiters.shift();if(buffer.length){waiter.resolve({value:buffer.shift(),done:false});grantCredit(stream.serial,1);}else if(typeof error!=='undefined'){waiter.reject(error);}else{waiter.resolve({value:undefined,done:true});}}}
+promise.then(function(value){if(typeof value!=='undefined'){buffer.push(value);}
+finished=true;settle();},function(reason){if(!finished){error=reason;finished=true;}
+settle();}).done();stream.push=function(value){if(finished){return;}
+buffer.push(value);settle();};stream.result=function(){};stream.next=function(){var waiter=Q.defer();waiters.push(waiter);settle();return waiter.promise;};stream['return']=function(){var serial=stream.serial;buffer.length=0;finished=true;settle();cancelCall(serial,'Stream is closed');return Q({value:undefined,done:true});};if(typeof Symbol!=='undefined'&&Symbol.asyncIterator){stream[Symbol.asyncIterator]=function(){return stream;};}}
+function removeQueued(queue,serial){for(var i=0;i<queue.length;i++){if(queue[i].serial===serial){queue.splice(i,1);return true;}}
+return false;}
+function cancelCall(serial,reason){var deferred=self.store[serial];if(typeof deferred==='undefined'){return;}
+delete self.store[serial];delete self.streams[serial];delete self.credits[serial];var queued=removeQueued(self.batchQueue,serial)||removeQueued(self.callQueue,serial);if(!queued&&self.public.state()==='OPEN'){self.socket.send(codec.encode({serial:serial,type:'cancel'}));}
+deferred.reject(typeof reason==='undefined'?'Call is cancelled':reason);}
+var makeCall=function(func,args,params,stream){self.serial+=2;var deferred=Q.defer();if(stream){stream.serial=self.serial;self.streams[self.serial]=stream;}
+var callObj={serial:self.serial,call:func,arguments:args};if(params&&params.trace){callObj.trace=params.trace;}
+var state=self.public.state();if(state==='OPEN'){self.store[self.serial]=deferred;if(global.WSRPC.BATCH){self.batchQueue.push(callObj);if(!self.batchScheduled){self.batchScheduled=true;Q.nextTick(flushBatch);}}else{self.socket.send(codec.encode(callObj));}}else if(state==='CONNECTING'){log('SOCKET IS: '+state);self.store[self.serial]=deferred;self.callQueue.push(callObj);}else{log('SOCKET IS: '+state);if(params&&params.noWait){delete self.streams[self.serial];deferred.reject('Socket is: '+state);}else{self.store[self.serial]=deferred;self.callQueue.push(callObj);}}
+var signal=params&&params.signal;if(signal&&self.store[callObj.serial]===deferred){if(signal.aborted){cancelCall(callObj.serial,signal.reason);}else{signal.addEventListener('abort',function(){cancelCall(callObj.serial,signal.reason);});}}
+return deferred.promise;};self.routes={};self.store={};self.public={call:function(func,args,params){return makeCall(func,args,params);},stream:function(func,args,params){var deferred=Q.defer();var stream=new Stream(deferred.promise);makeCall(func,args,params,stream).then(deferred.resolve,deferred.reject);return stream;},init:function(){log('Websocket initializing..')},addRoute:function(route,callback){self.routes[route]=callback;},addEventListener:function(event,func){return self.eventStore[event][self.eventId++]=func;},onEvent:function(event){var deferred=Q.defer();self.oneTimeEventStore[event].push(deferred);return deferred.promise;},removeEventListener:function(event,index){if(index<self.eventStore[event].length){self.eventStore[event].splice(index,1);return true;}else{return false;}},deleteRoute:function(route){return delete self.routes[route];},destroy:function(){function placebo(){}
+self.socket.onclose=placebo;self.socket.onerror=placebo;return self.socket.close();},state:function(){if(self.socketStarted&&self.socket){return readyState[self.socket.readyState];}else{return readyState[3];}},connect:function(){self.socketStarted=true;self.socket=createSocket();}};self.public.addRoute('log',function(argsObj){console.info('Websocket sent: '+argsObj);});self.public.addRoute('ping',function(data){return data;});return self.public;}
+global.WSRPC=WSRPCConstructor;global.WSRPC.DEBUG=false;global.WSRPC.TRACE=false;global.WSRPC.BATCH=true;var BINARY_MARKER='$binary';function isBinary(value){return value instanceof ArrayBuffer||(ArrayBuffer.isView&&ArrayBuffer.isView(value));}
+function toBytes(value){if(value instanceof ArrayBuffer){return new Uint8Array(value);}
+return new Uint8Array(value.buffer,value.byteOffset,value.byteLength);}
+function encodeUTF8(text){if(typeof TextEncoder!=='undefined'){return new TextEncoder().encode(text);}
+var raw=unescape(encodeURIComponent(text));var bytes=new Uint8Array(raw.length);for(var i=0;i<raw.length;i++){bytes[i]=raw.charCodeAt(i);}
+return bytes;}
+function decodeUTF8(bytes){if(typeof TextDecoder!=='undefined'){return new TextDecoder('utf-8').decode(bytes);}
+var raw='';for(var i=0;i<bytes.length;i++){raw+=String.fromCharCode(bytes[i]);}
+return decodeURIComponent(escape(raw));}
+function packAttachments(obj){var attachments=[];var header=JSON.stringify(obj,function(key,value){if(isBinary(value)){var marker={};marker[BINARY_MARKER]=attachments.push(toBytes(value))-1;return marker;}
+return value;});if(!attachments.length){return header;}
+var parts=[encodeUTF8(header)].concat(attachments);var size=0;parts.forEach(function(part){size+=4+part.byteLength;});var frame=new Uint8Array(size);var view=new DataView(frame.buffer);var offset=0;parts.forEach(function(part){view.setUint32(offset,part.byteLength);frame.set(part,offset+4);offset+=4+part.byteLength;});return frame.buffer;}
+function unpackAttachments(data){var view=new DataView(data);var size=view.getUint32(0);var offset=4+size;var header=decodeUTF8(new Uint8Array(data,4,size));var attachments=[];while(offset<data.byteLength){size=view.getUint32(offset);offset+=4;attachments.push(data.slice(offset,offset+size));offset+=size;}
+return JSON.parse(header,function(key,value){if(value!==null&&typeof value==='object'&&BINARY_MARKER in value){return attachments[value[BINARY_MARKER]];}
+return value;});}
+global.WSRPC.CODECS={json:{name:null,binary:false,encode:packAttachments,decode:function(data){return typeof data==='string'?JSON.parse(data):unpackAttachments(data);}}};global.WSRPC.addCodec=function(name,codec){codec.name=name;global.WSRPC.CODECS[name]=codec;};})(this);
\ No newline at end of file
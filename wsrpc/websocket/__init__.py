@@ -1 +1,2 @@
-from wsrpc.websocket.handler import WebSocketRoute, WebSocket, WebSocketThreaded
+from wsrpc.websocket.handler import WebSocketRoute, WebSocket, WebSocketThreaded, WebSocketHybrid
+from wsrpc.websocket.shards import ShardedHTTPServer
@@ -0,0 +1,41 @@
+# encoding: utf-8
+from .metrics import clock
+
+
+class Overloaded(Exception):
+    """ The call is rejected by the admission control, the client
+    should retry it in ``retry_after`` seconds """
+
+    def __init__(self, message, retry_after):
+        super(Overloaded, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket(object):
+    """ Admits ``rate`` calls per second on average and ``burst`` calls at once """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst=None, now=None):
+        if rate <= 0:
+            raise ValueError('Rate must be positive')
+
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.updated = clock() if now is None else now
+
+    def take(self, now=None):
+        """ Returns 0 when the call is admitted, otherwise seconds till the next token """
+
+        if now is None:
+            now = clock()
+
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
@@ -0,0 +1,113 @@
+# encoding: utf-8
+""" Binary attachments of the JSON messages.
+
+The message containing binary values is sent as the binary frame::
+
+    [header length][JSON header][attachment length][attachment]...
+
+Lengths are 32-bit big-endian integers, the header must be shorter
+than 16MB so the frame starts with the zero byte. Binary values are replaced by
+``{"$binary": index}`` in the header and the attachments follow it
+as is, so neither side encodes them in base64.
+"""
+import json
+import struct
+import sys
+
+
+MARKER = '$binary'
+
+_LENGTH = struct.Struct('>I')
+
+# The first byte of the length must be zero
+_MAX_HEADER = 1 << 24
+
+if sys.version_info < (3,):
+    # str is the text for JSON on Python 2
+    BINARY_TYPES = (bytearray, memoryview)
+
+    def _raw(value):
+        return value.tobytes() if isinstance(value, memoryview) else bytes(value)
+else:
+    BINARY_TYPES = (bytes, bytearray, memoryview)
+
+    def _raw(value):
+        return value
+
+
+def is_frame(data):
+    """ The packed message which must be sent as the binary frame,
+    the text of JSON never starts with the zero byte """
+    return isinstance(data, bytes) and data[:1] == b'\x00'
+
+
+def _size(value):
+    return value.nbytes if isinstance(value, memoryview) else len(value)
+
+
+def _encode(obj):
+    attachments = []
+
+    def default(value):
+        if isinstance(value, BINARY_TYPES):
+            attachments.append(value)
+            return {MARKER: len(attachments) - 1}
+
+        raise TypeError('{0!r} is not JSON serializable'.format(value))
+
+    return json.dumps(obj, ensure_ascii=False, default=default), attachments
+
+
+def _frame(header, attachments):
+    if not isinstance(header, bytes):
+        header = header.encode('utf-8')
+
+    if len(header) >= _MAX_HEADER:
+        raise ValueError('The header of attachments must be shorter than 16MB')
+
+    parts = [_LENGTH.pack(len(header)), header]
+
+    for attachment in attachments:
+        parts.append(_LENGTH.pack(_size(attachment)))
+        parts.append(_raw(attachment))
+
+    # The only copy of the attachments
+    return b''.join(parts)
+
+
+def pack(obj):
+    return _frame(*_encode(obj))
+
+
+def dumps(obj):
+    """ The text of JSON, or the packed message when the object has binary values.
+    Serializes the object once in both cases. """
+
+    text, attachments = _encode(obj)
+    if not attachments:
+        return text
+
+    return _frame(text, attachments)
+
+
+def unpack(data):
+    """ Attachments are returned as memoryview slices of the data without copying """
+
+    view = memoryview(data)
+    size, = _LENGTH.unpack_from(data, 0)
+    offset = _LENGTH.size + size
+    header = view[_LENGTH.size:offset].tobytes().decode('utf-8')
+
+    attachments = []
+    while offset < len(view):
+        size, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        attachments.append(view[offset:offset + size])
+        offset += size
+
+    def object_hook(obj):
+        if len(obj) == 1 and MARKER in obj:
+            return attachments[obj[MARKER]]
+        return obj
+
+    return json.loads(header, object_hook=object_hook)
@@ -0,0 +1,196 @@
+# encoding: utf-8
+import json
+import logging
+import socket
+import struct
+
+import tornado.gen
+import tornado.ioloop
+import tornado.iostream
+import tornado.netutil
+import tornado.tcpserver
+
+
+log = logging.getLogger("wsrpc.bus")
+
+# Messages between the broker and the workers are prefixed by their length
+_LENGTH = struct.Struct('>I')
+
+
+def pack(frame, key=None, target=None, channel=None):
+    """ Builds the bus message: the JSON header line followed by the serialized frame.
+
+    ``target`` is the client id and ``channel`` is the channel the frame
+    is published to. The frame is delivered to every client when both of them are ``None``.
+    ``key`` is the name of the called function.
+    """
+    if not isinstance(frame, bytes):
+        frame = frame.encode('utf-8')
+
+    return json.dumps([target, key, channel]).encode('utf-8') + b'\n' + frame
+
+
+def unpack(data):
+    header, frame = data.split(b'\n', 1)
+    target, key, channel = json.loads(header.decode('utf-8'))
+    return target, key, channel, frame
+
+
+@tornado.gen.coroutine
+def read_message(stream):
+    header = yield stream.read_bytes(_LENGTH.size)
+    length, = _LENGTH.unpack(header)
+    data = yield stream.read_bytes(length)
+    raise tornado.gen.Return(data)
+
+
+def write_message(stream, data):
+    stream.write(_LENGTH.pack(len(data)) + data)
+
+
+class Bus(object):
+    """ Pub/sub transport of the broadcasts between the processes.
+
+    Every published message is delivered to all the subscribers of every
+    process (including the publisher's one) at most once.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        del self._subscribers[:]
+
+    def _deliver(self, data):
+        for callback in list(self._subscribers):
+            try:
+                callback(data)
+            except Exception:
+                log.exception("Bus subscriber %r failed", callback)
+
+
+class LocalBus(Bus):
+    """ Delivers the messages within the current process """
+
+    def publish(self, data):
+        self._deliver(data)
+
+
+class UnixBroker(tornado.tcpserver.TCPServer):
+    """ Relays every message of the one worker to the other workers connected to the Unix socket """
+
+    def __init__(self, path, **kwargs):
+        super(UnixBroker, self).__init__(**kwargs)
+        self.path = path
+        self._streams = set()
+
+    def listen(self, mode=0o600):
+        self.add_socket(tornado.netutil.bind_unix_socket(self.path, mode=mode))
+
+    @tornado.gen.coroutine
+    def handle_stream(self, stream, address):
+        self._streams.add(stream)
+
+        try:
+            while True:
+                data = yield read_message(stream)
+
+                for other in list(self._streams):
+                    if other is not stream and not other.closed():
+                        write_message(other, data)
+        except tornado.iostream.StreamClosedError:
+            pass
+        finally:
+            self._streams.discard(stream)
+
+    def stop(self):
+        super(UnixBroker, self).stop()
+
+        for stream in list(self._streams):
+            stream.close()
+
+
+class UnixBus(Bus):
+    """ Connects the worker to the :class:`UnixBroker`.
+
+    Published messages are delivered to the local subscribers at once and
+    relayed to the other workers by the broker. Messages published while
+    the broker is unavailable reach the local subscribers only.
+    """
+
+    RECONNECT_DELAY = 1
+
+    def __init__(self, path, io_loop=None):
+        super(UnixBus, self).__init__()
+        self.path = path
+        self.io_loop = io_loop or tornado.ioloop.IOLoop.current()
+        self._stream = None
+        self._closed = False
+
+    @property
+    def connected(self):
+        return self._stream is not None and not self._stream.closed()
+
+    @tornado.gen.coroutine
+    def connect(self):
+        stream = tornado.iostream.IOStream(
+            socket.socket(socket.AF_UNIX, socket.SOCK_STREAM),
+            io_loop=self.io_loop
+        )
+
+        try:
+            yield stream.connect(self.path)
+        except (tornado.iostream.StreamClosedError, socket.error) as e:
+            log.warning("Bus broker %s is unavailable: %r", self.path, e)
+            self._reconnect()
+            return
+
+        if self._closed:
+            stream.close()
+            return
+
+        self._stream = stream
+        self.io_loop.add_future(self._read(stream), lambda f: f.result())
+
+    def _reconnect(self):
+        if not self._closed:
+            self.io_loop.call_later(self.RECONNECT_DELAY, self.connect)
+
+    @tornado.gen.coroutine
+    def _read(self, stream):
+        try:
+            while True:
+                data = yield read_message(stream)
+                self._deliver(data)
+        except tornado.iostream.StreamClosedError:
+            if self._stream is stream:
+                self._stream = None
+
+            log.warning("Bus broker %s disconnected", self.path)
+            self._reconnect()
+
+    def publish(self, data):
+        self._deliver(data)
+
+        if self.connected:
+            write_message(self._stream, data)
+        else:
+            log.warning("Bus broker %s isn't connected, the message is delivered locally", self.path)
+
+    def close(self):
+        super(UnixBus, self).close()
+        self._closed = True
+
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
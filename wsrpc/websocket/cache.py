@@ -0,0 +1,139 @@
+# encoding: utf-8
+import threading
+import weakref
+from collections import OrderedDict
+
+import tornado.gen
+import tornado.ioloop
+
+from .metrics import clock
+from .tools import iteritems
+
+
+def freeze(value):
+    """ Hashable form of the call arguments """
+    if isinstance(value, dict):
+        return frozenset((key, freeze(item)) for key, item in iteritems(value))
+
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+
+    return value
+
+
+class ResultCache(object):
+    """ LRU cache of the call results which expire after ``ttl`` seconds.
+
+    Concurrent calls with the same arguments share the one execution,
+    errors are passed to all of them and aren't cached. Results are shared
+    by the IOLoop shards, the executions are shared by the calls of the one
+    IOLoop, since futures of one IOLoop can't be waited for by another.
+    """
+
+    def __init__(self, ttl, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        # Pending executions of every IOLoop
+        self._pending = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def key(args, kwargs):
+        return freeze(args), freeze(kwargs)
+
+    def get(self, key):
+        """ Returns the tuple of the flag the result is cached and the result """
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._results.pop(key, None)
+        if entry is None:
+            return False, None
+
+        expires, result = entry
+        if expires < clock():
+            return False, None
+
+        # The most recently used are at the end
+        self._results[key] = entry
+        return True, result
+
+    def set(self, key, result):
+        with self._lock:
+            self._results.pop(key, None)
+            self._results[key] = (clock() + self.ttl, result)
+
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def _pending_calls(self):
+        ioloop = tornado.ioloop.IOLoop.current()
+        pending = self._pending.get(ioloop)
+        if pending is None:
+            pending = self._pending.setdefault(ioloop, {})
+        return pending
+
+    @tornado.gen.coroutine
+    def call(self, key, func):
+        """ Returns the tuple of the result and the flag it hasn't been executed for this call.
+        ``func`` returns the future of the result. """
+
+        pending = self._pending_calls()
+
+        with self._lock:
+            hit, result = self._get(key)
+            future = None if hit else pending.get(key)
+
+            if hit or future is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if hit:
+            raise tornado.gen.Return((result, True))
+
+        if future is not None:
+            result = yield future
+            raise tornado.gen.Return((result, True))
+
+        future = pending[key] = func()
+
+        try:
+            result = yield future
+        finally:
+            # The result of the invalidated call isn't cached
+            current = pending.get(key) is future
+            if current:
+                del pending[key]
+
+        if current:
+            self.set(key, result)
+
+        raise tornado.gen.Return((result, False))
+
+    def invalidate(self, *args, **kwargs):
+        """ Drops the result of the call with the arguments """
+        key = self.key(args, kwargs)
+
+        with self._lock:
+            self._results.pop(key, None)
+
+        for pending in list(self._pending.values()):
+            pending.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+        for pending in list(self._pending.values()):
+            pending.clear()
+
+    def __len__(self):
+        return len(self._results)
+
+    def __repr__(self):
+        return "<ResultCache: {0} results, {1} hits, {2} misses>".format(len(self), self.hits, self.misses)
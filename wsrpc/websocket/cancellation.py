@@ -0,0 +1,105 @@
+# encoding: utf-8
+import threading
+from functools import partial
+
+import tornado.gen
+import tornado.ioloop
+
+
+_local = threading.local()
+
+
+class CancelledError(Exception):
+    pass
+
+
+def current():
+    """ Cancellation of the call being executed by the current thread.
+
+    Threaded routes might check it while working. Coroutines should keep it
+    before the first ``yield``, since other calls are run on the IOLoop meanwhile.
+    Returns None outside of the calls.
+    """
+    return getattr(_local, 'token', None)
+
+
+class Cancellation(object):
+    """ Cancellation token of the one call.
+
+    The call is cancelled by the client or when the connection is closed.
+    The server stops waiting for the result at once, the task which is queued
+    in the pool is dropped and the running route might check ``cancelled``.
+    """
+
+    __slots__ = ('cancelled', 'future', 'waiter')
+
+    def __init__(self):
+        self.cancelled = False
+        self.future = None
+        self.waiter = None
+
+    def check(self):
+        if self.cancelled:
+            raise CancelledError('The call is cancelled')
+
+    def run(self, func):
+        previous = getattr(_local, 'token', None)
+        _local.token = self
+
+        try:
+            return func()
+        finally:
+            _local.token = previous
+
+    def wait(self, future):
+        """ Returns the future which gets the result of the future (or the awaitable)
+        or fails with :class:`CancelledError` when the call is cancelled """
+
+        future = tornado.gen.convert_yielded(future)
+        waiter = tornado.gen.Future()
+
+        if self.cancelled:
+            waiter.set_exception(CancelledError('The call is cancelled'))
+            return waiter
+
+        self.future = future
+        self.waiter = waiter
+        tornado.ioloop.IOLoop.current().add_future(future, partial(self._copy, waiter))
+        return waiter
+
+    def _copy(self, waiter, future):
+        if self.waiter is waiter:
+            self.future = self.waiter = None
+
+        if future.cancelled():
+            return
+
+        # The exception is retrieved even when nobody waits for it
+        exception = future.exception()
+
+        if waiter.done():
+            return
+
+        if exception is not None:
+            exc_info = getattr(future, 'exc_info', None)
+            if exc_info is not None and exc_info() is not None:
+                waiter.set_exc_info(exc_info())
+            else:
+                waiter.set_exception(exception)
+        else:
+            waiter.set_result(future.result())
+
+    def cancel(self):
+        if self.cancelled:
+            return
+
+        self.cancelled = True
+        future, waiter = self.future, self.waiter
+        self.future = self.waiter = None
+
+        # Drops the task which hasn't been started by the pool yet
+        if future is not None and hasattr(future, 'cancel'):
+            future.cancel()
+
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(CancelledError('The call is cancelled'))
@@ -0,0 +1,69 @@
+# encoding: utf-8
+import threading
+
+
+class ChannelForbidden(Exception):
+    pass
+
+
+class TooManySubscriptions(Exception):
+    pass
+
+
+class Channels(object):
+    """ Index of the connections subscribed to the channels.
+
+    The channel ending with ``*`` is the prefix subscription, so ``news.*``
+    receives messages published to ``news.sport`` and ``news.weather``
+    and ``*`` receives all of them. Connections of all the shards share it.
+    """
+
+    WILDCARD = '*'
+
+    def __init__(self):
+        self._exact = {}
+        self._prefixes = {}
+        self._lock = threading.Lock()
+
+    def _index(self, channel):
+        if channel.endswith(self.WILDCARD):
+            return self._prefixes, channel[:-1]
+        return self._exact, channel
+
+    def add(self, channel, connection):
+        index, key = self._index(channel)
+
+        with self._lock:
+            index.setdefault(key, set()).add(connection)
+
+    def remove(self, channel, connection):
+        index, key = self._index(channel)
+
+        with self._lock:
+            connections = index.get(key)
+            if connections is None:
+                return
+
+            connections.discard(connection)
+            if not connections:
+                del index[key]
+
+    def subscribers(self, channel):
+        """ Connections subscribed to the channel. Costs O(subscribers + len(channel)) """
+        with self._lock:
+            result = set(self._exact.get(channel, ()))
+
+            if self._prefixes:
+                for length in range(len(channel) + 1):
+                    connections = self._prefixes.get(channel[:length])
+                    if connections:
+                        result.update(connections)
+
+        return result
+
+    def __len__(self):
+        return len(self._exact) + len(self._prefixes)
+
+    def __contains__(self, channel):
+        index, key = self._index(channel)
+        return key in index
@@ -0,0 +1,73 @@
+# encoding: utf-8
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from . import attachments
+
+
+class Codec(object):
+    """ Serializer of the wsrpc messages.
+
+    ``name`` is the WebSocket subprotocol which selects the codec
+    and ``binary`` means the frames must be sent as binary ones.
+    """
+
+    name = None
+    binary = False
+
+    def dumps(self, obj):
+        raise NotImplementedError
+
+    def loads(self, data):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return "<Codec: {0}>".format(self.name)
+
+
+class JSONCodec(Codec):
+    """ Text frames of JSON. Messages with binary values are sent
+    as binary frames with attachments (see attachments.py). """
+
+    name = 'json'
+
+    def dumps(self, obj):
+        return attachments.dumps(obj)
+
+    def loads(self, data):
+        # Text frames are decoded to unicode by tornado, the header of
+        # attachments is shorter than 16MB so the frame starts with zero
+        if attachments.is_frame(data):
+            return attachments.unpack(data)
+
+        return json.loads(data)
+
+
+class MessagePackCodec(Codec):
+    name = 'msgpack'
+    binary = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError('You should install "msgpack" for using MessagePack codec')
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+JSON = JSONCodec()
+
+CODECS = {JSON.name: JSON}
+
+if msgpack is not None:
+    CODECS[MessagePackCodec.name] = MessagePackCodec()
@@ -0,0 +1,54 @@
+# encoding: utf-8
+import zlib
+
+
+DEFAULT_LEVEL = 6
+DEFAULT_MEM_LEVEL = 8
+
+
+class Compressor(object):
+    """ permessage-deflate compressor with the configurable compression and memory levels.
+
+    It replaces the compressor tornado creates after the negotiation, so the
+    level and the memory level are applied by the older tornado versions too.
+    Without the context takeover every message is compressed from scratch.
+    """
+
+    __slots__ = ('level', 'mem_level', 'max_wbits', '_compressor')
+
+    def __init__(self, persistent, max_wbits=zlib.MAX_WBITS, level=DEFAULT_LEVEL, mem_level=DEFAULT_MEM_LEVEL):
+        self.level = level
+        self.mem_level = mem_level
+        self.max_wbits = max_wbits
+        self._compressor = self._create() if persistent else None
+
+    @property
+    def persistent(self):
+        return self._compressor is not None
+
+    def _create(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, -self.max_wbits, self.mem_level)
+
+    def compress(self, data):
+        compressor = self._compressor or self._create()
+        data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        # The trailing empty block is implied by the protocol (RFC 7692, 7.2.1)
+        if not data.endswith(b'\x00\x00\xff\xff'):
+            raise zlib.error('The flushed data must end with the empty block')
+
+        return data[:-4]
+
+
+def no_client_context_takeover(header):
+    """ Adds ``client_no_context_takeover`` to the permessage-deflate offers of the
+    ``Sec-WebSocket-Extensions`` header. The server might always require it
+    (RFC 7692, 7.1.1.2), so it doesn't keep the window of the client's messages. """
+
+    offers = []
+    for offer in header.split(','):
+        params = [param.strip() for param in offer.split(';')]
+        if params[0] == 'permessage-deflate' and 'client_no_context_takeover' not in params:
+            offer = '; '.join(params + ['client_no_context_takeover'])
+        offers.append(offer.strip())
+
+    return ', '.join(offers)
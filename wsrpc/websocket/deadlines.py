@@ -0,0 +1,80 @@
+# encoding: utf-8
+import math
+import threading
+import weakref
+
+
+class Deadlines(object):
+    """ Shared scheduler of the deadlines of the one IOLoop.
+
+    Deadlines are rounded up to the ``TICK`` and grouped in buckets, so the
+    single timer serves all calls of all connections instead of the timer per
+    call. Entries aren't removed when the call is answered, the callback
+    checks the call is still pending when its bucket is due.
+    """
+
+    TICK = 0.1
+
+    # Schedulers of the IOLoops, the shards get them concurrently
+    _instances = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, ioloop):
+        with cls._lock:
+            scheduler = cls._instances.get(ioloop)
+            if scheduler is None:
+                scheduler = cls._instances[ioloop] = cls(ioloop)
+        return scheduler
+
+    def __init__(self, ioloop):
+        self.ioloop = ioloop
+        self.buckets = {}
+        self.cursor = None
+        self.count = 0
+        self._timeout = None
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, when):
+        return int(math.ceil(when / self.TICK))
+
+    def add(self, deadline, callback):
+        """ Calls the callback after the deadline (in the IOLoop time) """
+
+        if self.cursor is None:
+            self.cursor = self._index(self.ioloop.time()) - 1
+
+        # The past deadlines are due on the next tick
+        index = max(self._index(deadline), self.cursor + 1)
+
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = []
+
+        bucket.append(callback)
+        self.count += 1
+
+        if self._timeout is None:
+            self._timeout = self.ioloop.call_later(self.TICK, self._on_tick)
+
+    def _on_tick(self):
+        self._timeout = None
+        now = int(self.ioloop.time() / self.TICK)
+
+        try:
+            while self.cursor < now:
+                self.cursor += 1
+                bucket = self.buckets.pop(self.cursor, None)
+                if not bucket:
+                    continue
+
+                self.count -= len(bucket)
+                for callback in bucket:
+                    self.ioloop.add_callback(callback)
+        finally:
+            if self.count:
+                self._timeout = self.ioloop.call_later(self.TICK, self._on_tick)
+            else:
+                self.cursor = None
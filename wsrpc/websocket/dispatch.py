@@ -0,0 +1,188 @@
+# encoding: utf-8
+import inspect
+import weakref
+from functools import partial
+
+import tornado.gen
+
+from .route import WebSocketRoute, decorators
+from .tools import iteritems, itervalues
+
+try:
+    from types import MappingProxyType as frozen
+except ImportError:
+    # Python 2
+    frozen = dict
+
+
+def is_coroutine_function(func):
+    func = getattr(func, '__func__', func)
+
+    checker = getattr(tornado.gen, 'is_coroutine_function', None)
+    if checker is not None and checker(func):
+        return True
+
+    if getattr(inspect, 'iscoroutinefunction', None) and inspect.iscoroutinefunction(func):
+        return True
+
+    # tornado.gen.coroutine wraps a generator function
+    wrapped = getattr(func, '__wrapped__', None)
+    return wrapped is not None and inspect.isgeneratorfunction(wrapped)
+
+
+def is_async_function(func):
+    """ Coroutine or async generator function, it doesn't block the IOLoop """
+
+    if is_coroutine_function(func):
+        return True
+
+    checker = getattr(inspect, 'isasyncgenfunction', None)
+    return checker is not None and checker(getattr(func, '__func__', func))
+
+
+def overrides_resolve(cls):
+    """ The route checks the access in its own _resolve, so its methods go through the slow path """
+    func = getattr(cls._resolve, '__func__', cls._resolve)
+    return func is not getattr(WebSocketRoute._resolve, '__func__', WebSocketRoute._resolve)
+
+
+def is_route_factory(callee):
+    if isinstance(callee, type):
+        return issubclass(callee, WebSocketRoute)
+
+    return isinstance(getattr(callee, '__self__', None), WebSocketRoute)
+
+
+class Callee(object):
+    """ Precompiled dispatch entry for the one ``"Route.method"`` or function name """
+
+    __slots__ = ('name', 'route', 'factory', 'method', 'func', 'is_route', 'is_async', 'executor', 'compress',
+                 'rate_limit')
+
+    def __init__(self, name, func, route=None, factory=None, method=None):
+        self.name = name
+        self.func = func
+        self.route = route
+        self.factory = factory
+        self.method = method
+        self.is_route = route is not None
+        self.is_async = is_async_function(func)
+        self.executor = getattr(func, '__executor__', getattr(factory, '_EXECUTOR', None))
+        self.compress = getattr(func, '__compress__', True)
+        self.rate_limit = getattr(func, '__rate_limit__', None)
+
+    def bind(self, socket, args, kwargs):
+        in_process = self.executor is not None and self.executor in socket._EXECUTORS.processes
+
+        if self.is_route:
+            if in_process:
+                raise TypeError('Route methods might not be executed in the process pool')
+
+            return partial(getattr(socket._get_route(self.route, self.factory), self.method), *args, **kwargs)
+
+        if in_process:
+            # Neither the socket nor the route might be passed to another process
+            return partial(self.func, *args, **kwargs)
+
+        return partial(self.func, socket, *args, **kwargs)
+
+    def __repr__(self):
+        return "<Callee: {0} ({1}{2})>".format(
+            self.name,
+            'route' if self.is_route else 'function',
+            ', async' if self.is_async else ''
+        )
+
+
+class DispatchTable(object):
+    __slots__ = ('calls', 'routes', 'rate_limited')
+
+    def __init__(self, routes):
+        calls = {}
+        factories = {}
+
+        for name, callee in iteritems(routes):
+            if is_route_factory(callee):
+                factories[name] = callee
+
+                if isinstance(callee, type) and not overrides_resolve(callee):
+                    calls.update(self._compile_route(name, callee))
+
+            elif callable(callee):
+                calls[name] = Callee(name, callee)
+
+        self.calls = frozen(calls)
+        self.routes = frozen(factories)
+        # Calls aren't looked up by the admission control unless some of them are limited
+        # or might be resolved by the routes themselves
+        self.rate_limited = any(callee.rate_limit is not None for callee in itervalues(calls))
+
+    @staticmethod
+    def _compile_route(name, cls):
+        for method in dir(cls):
+            if method.startswith('_') or hasattr(WebSocketRoute, method):
+                continue
+
+            func = getattr(cls, method)
+            if not callable(func) or getattr(func, '__func__', func) in decorators._NOPROXY:
+                continue
+
+            callee = Callee("{0}.{1}".format(name, method), func, route=name, factory=cls, method=method)
+            yield callee.name, callee
+
+            if method == 'init':
+                yield name, Callee(name, func, route=name, factory=cls, method=method)
+
+    def get(self, name):
+        return self.calls.get(name)
+
+    def __contains__(self, name):
+        return name in self.calls
+
+    def __len__(self):
+        return len(self.calls)
+
+
+class RouteTable(dict):
+    """ The ``ROUTES`` mapping which compiles itself into a :class:`DispatchTable` on demand """
+
+    __slots__ = ('_table', '_bound')
+
+    def __init__(self, *args, **kwargs):
+        super(RouteTable, self).__init__(*args, **kwargs)
+        self._table = None
+        self._bound = weakref.WeakKeyDictionary()
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = DispatchTable(self)
+        return self._table
+
+    def bound(self, handler):
+        """ Callees with their executors resolved for the handler class, ``{name: (callee, executor)}``.
+        The same dict is emptied when the routes change, so the handlers might keep it. """
+        calls = self._bound.get(handler)
+        if calls is None:
+            calls = self._bound[handler] = {}
+        return calls
+
+    def _invalidate(method):
+        def wrap(self, *args, **kwargs):
+            self._table = None
+            for calls in list(self._bound.values()):
+                calls.clear()
+            return method(self, *args, **kwargs)
+
+        wrap.__name__ = method.__name__
+        return wrap
+
+    __setitem__ = _invalidate(dict.__setitem__)
+    __delitem__ = _invalidate(dict.__delitem__)
+    clear = _invalidate(dict.clear)
+    pop = _invalidate(dict.pop)
+    popitem = _invalidate(dict.popitem)
+    setdefault = _invalidate(dict.setdefault)
+    update = _invalidate(dict.update)
+
+    del _invalidate
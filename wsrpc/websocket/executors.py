@@ -0,0 +1,77 @@
+# encoding: utf-8
+import inspect
+from multiprocessing import cpu_count
+
+import tornado.concurrent
+import tornado.gen
+
+from .common import log_thread_exceptions
+
+
+# Run the route on the IOLoop regardless of the handler
+INLINE = 'inline'
+
+# Native coroutines exist on Python 3.5+ only
+isawaitable = getattr(inspect, 'isawaitable', lambda obj: False)
+
+
+class Executors(object):
+    """ Named pools which routes might be bound to by
+    ``@decorators.executor(name)`` or the ``_EXECUTOR`` route attribute. """
+
+    def __init__(self):
+        self.pools = {}
+        # Names of the process pools, it's checked for every call
+        self.processes = frozenset()
+
+    def add(self, name, workers=cpu_count(), process=False):
+        if name == INLINE:
+            raise ValueError('Name "{0}" is reserved'.format(INLINE))
+
+        futures = tornado.concurrent.futures
+        pool_class = futures.ProcessPoolExecutor if process else futures.ThreadPoolExecutor
+
+        previous = self.pools.get(name)
+        self.pools[name] = pool_class(workers)
+        self.processes = self.processes - {name} if not process else self.processes | {name}
+
+        if previous is not None:
+            previous.shutdown(wait=False)
+
+        return self.pools[name]
+
+    def is_process(self, name):
+        return name in self.processes
+
+    def submit(self, name, func):
+        pool = self.pools.get(name)
+
+        if pool is None:
+            raise LookupError('Executor "{0}" is not initialized'.format(name))
+
+        if isinstance(pool, tornado.concurrent.futures.ProcessPoolExecutor):
+            # The function should be picklable, so it's submitted as is
+            return pool.submit(func)
+
+        return pool.submit(log_thread_exceptions(func))
+
+    def shutdown(self, wait=True):
+        pools, self.pools = self.pools, {}
+        self.processes = frozenset()
+        for pool in pools.values():
+            pool.shutdown(wait=wait)
+
+
+def queue_depth(pool):
+    # Tasks waiting for a worker, thread pools only
+    queue = getattr(pool, '_work_queue', None)
+    return queue.qsize() if queue is not None else 0
+
+
+@tornado.gen.coroutine
+def run_inline(func):
+    result = func()
+    if isinstance(result, tornado.gen.Future) or isawaitable(result):
+        result = yield tornado.gen.convert_yielded(result)
+
+    raise tornado.gen.Return(result)
@@ -1,29 +1,34 @@
 # encoding: utf-8
+import base64
 import logging
-import zlib
+import os
+import random
 import time
 import traceback
-import uuid
 import struct
 import tornado.websocket
 import tornado.ioloop
 import tornado.escape
 import tornado.gen
-import types
 import tornado.concurrent
-from collections import defaultdict
-from tornado.locks import Semaphore
 from multiprocessing import cpu_count
 from functools import partial
 from .route import WebSocketRoute
 from .common import log_thread_exceptions
-
-try:
-    import ujson as json
-except ImportError:
-    import json
-
-from .tools import iteritems, Lazy
+from .dispatch import RouteTable, is_async_function
+from .inflight import InFlight
+from .admission import Overloaded, TokenBucket
+from .keepalive import Keepalive
+from .deadlines import Deadlines
+from .cancellation import Cancellation, CancelledError
+from .executors import Executors, INLINE, run_inline, queue_depth
+from .metrics import Metrics, CallTimer, clock
+from .bus import pack, unpack
+from .channels import Channels, ChannelForbidden, TooManySubscriptions
+from .shards import Clients, by_ioloop
+from . import attachments, codecs, compression, outbound, sessions, streaming, tracing
+
+from .tools import iteritems, itervalues, Lazy
 
 try:
     unicode()
@@ -39,6 +44,27 @@ def ping(obj, *args, **kwargs):
     return 'pong'
 
 
+def subscribe(obj, channel):
+    if channel.endswith(Channels.WILDCARD) and not obj._WILDCARD_SUBSCRIPTIONS:
+        raise ChannelForbidden(channel)
+
+    if not obj.authorize_channel(channel):
+        raise ChannelForbidden(channel)
+
+    subscriptions = obj._subscriptions or ()
+    limit = obj._MAX_SUBSCRIPTIONS
+    if limit is not None and channel not in subscriptions and len(subscriptions) >= limit:
+        raise TooManySubscriptions('Too many subscriptions (limit is {0})'.format(limit))
+
+    obj.subscribe(channel)
+    return True
+
+
+def unsubscribe(obj, channel):
+    obj.unsubscribe(channel)
+    return True
+
+
 class ClientException(Exception):
     pass
 
@@ -51,22 +77,177 @@ class PingTimeoutError(Exception):
     pass
 
 
+class CallTimeout(Exception):
+    pass
+
+
+class TooManyPendingCalls(Exception):
+    pass
+
+
 class WebSocketBase(tornado.websocket.WebSocketHandler):
     # Overlap this class property after import
-    ROUTES = {
-        'ping': ping
-    }
-
-    _CLIENTS = {}
+    ROUTES = RouteTable({
+        'ping': ping,
+        'subscribe': subscribe,
+        'unsubscribe': unsubscribe,
+    })
+
+    # Codecs which might be negotiated through the Sec-WebSocket-Protocol header.
+    # JSON is used when the client doesn't request any of them.
+    CODECS = dict(codecs.CODECS)
+    codec = codecs.JSON
+
+    # Named pools shared by all handlers, see add_executor
+    _EXECUTORS = Executors()
+
+    # Counters shared by all handlers, see metrics.py
+    metrics = Metrics()
+
+    _CLIENTS = Clients()
+    # Connections subscribed to the channels, see publish
+    _CHANNELS = Channels()
+    # Clients might subscribe to the prefix channels (ending with "*") only when it's allowed,
+    # and to MAX_SUBSCRIPTIONS channels per connection (None is unlimited). Routes subscribing
+    # the connection through the socket aren't limited.
+    _WILDCARD_SUBSCRIPTIONS = False
+    _MAX_SUBSCRIPTIONS = 64
     _KEEPALIVE_PING_TIMEOUT = 30
     _CLIENT_TIMEOUT = 10
 
+    # Default timeout (seconds) of the calls of the client's functions, see call_with_timeout.
+    # None means waiting for the reply until the connection is closed.
+    _CALL_TIMEOUT = None
+    # Limit of the client's calls waiting for the reply, the excess calls fail with TooManyPendingCalls
+    _MAX_PENDING_CALLS = 1024
+
+    # Results of a batch completed within this delay (seconds) are sent in one frame,
+    # so the slow call doesn't hold the replies of the rest. None means wait for the whole batch.
+    _BATCH_MAX_DELAY = 0.005
+
+    # Limit of the calls executed concurrently for the one connection (None is unlimited).
+    # The excess calls are queued or rejected with TooManyCalls error.
+    _MAX_CONCURRENT_CALLS = None
+    _REJECT_EXCESS_CALLS = False
+
+    # Admission control: calls over the limits fail at once with Overloaded error.
+    # RATE_LIMIT calls per second (RATE_BURST at once) for the one connection,
+    # MAX_IN_FLIGHT calls executed or queued by all connections of the process.
+    # RETRY_AFTER (seconds) is the hint to the client rejected by MAX_IN_FLIGHT.
+    _RATE_LIMIT = None
+    _RATE_BURST = None
+    _MAX_IN_FLIGHT = None
+    _OVERLOAD_RETRY_AFTER = 1.0
+
+    # Outbound data is queued when more than HIGH_WATERMARK bytes aren't flushed to the socket
+    # and written again when it's flushed down to LOW_WATERMARK. The POLICY (see outbound.py)
+    # decides what to do when QUEUE_LIMIT frames are queued.
+    _OUTBOUND_HIGH_WATERMARK = 4 * 1024 * 1024
+    _OUTBOUND_LOW_WATERMARK = 1024 * 1024
+    _OUTBOUND_QUEUE_LIMIT = 1024
+    _OUTBOUND_POLICY = outbound.WAIT
+
+    # permessage-deflate is negotiated when the LEVEL (zlib 1-9) is set. Frames shorter than
+    # MIN_SIZE and results of the uncompressed routes (see decorators.uncompressed) are sent as is.
+    # Without the context takeover each message is compressed separately, it costs ratio
+    # but the connection doesn't keep the zlib window (SERVER for sent, CLIENT for received messages).
+    _COMPRESSION_LEVEL = None
+    _COMPRESSION_MEM_LEVEL = compression.DEFAULT_MEM_LEVEL
+    _COMPRESSION_MIN_SIZE = 256
+    _COMPRESSION_SERVER_CONTEXT_TAKEOVER = True
+    _COMPRESSION_CLIENT_CONTEXT_TAKEOVER = True
+
+    # Chunks of a streamed result sent before the client grants more credits
+    _STREAM_CREDIT = 16
+
+    # Pub/sub bus which delivers broadcasts to the other processes, see use_bus
+    BUS = None
+
+    # Connections and calls are rejected while the handler is drained, see drain
+    _DRAINING = False
+    _DRAIN_POLL_INTERVAL = 0.1
+
+    # Sessions are kept for the client to resume them within the TTL (seconds) after
+    # the disconnect, None disables them. Unacknowledged frames are replayed on resume.
+    _SESSION_TTL = None
+    _SESSION_REPLAY_LIMIT = 256
+    _SESSIONS = sessions.Sessions()
+
+    # Sampled tracing of the calls, see use_tracer
+    TRACER = None
+
+    # Per-connection state which most of the idle connections never use.
+    # It's created on demand, so the instance dict stays small (see benchmarks/memory.py).
+    __handlers = None
+    store = None
+    outbound = None
+    serial = 0
+    rtt = None
+    _inflight = None
+    _bucket = None
+    _route_buckets = None
+    _reconnect_delay = None
+    _session = None
+    _streams = None
+    _subscriptions = None
+    _uncompressed_frames = False
+    _calls = None
+    _ping_sent = None
+    _last_activity = 0
+
+    # The serial of broadcast calls. Client's replies on it are ignored.
+    _BROADCAST_SERIAL = 0
+    # Clients written per IOLoop iteration by broadcast
+    _BROADCAST_CHUNK_SIZE = 1000
+
     @classmethod
-    def configure(cls, keepalive_timeout=_KEEPALIVE_PING_TIMEOUT, client_timeout=_CLIENT_TIMEOUT):
+    def configure(cls, keepalive_timeout=_KEEPALIVE_PING_TIMEOUT, client_timeout=_CLIENT_TIMEOUT,
+                  call_timeout=_CALL_TIMEOUT, max_pending_calls=_MAX_PENDING_CALLS,
+                  batch_max_delay=_BATCH_MAX_DELAY, max_concurrent_calls=_MAX_CONCURRENT_CALLS,
+                  reject_excess_calls=_REJECT_EXCESS_CALLS, rate_limit=_RATE_LIMIT, rate_burst=_RATE_BURST,
+                  max_in_flight=_MAX_IN_FLIGHT, overload_retry_after=_OVERLOAD_RETRY_AFTER,
+                  outbound_high_watermark=_OUTBOUND_HIGH_WATERMARK,
+                  outbound_low_watermark=_OUTBOUND_LOW_WATERMARK, outbound_queue_limit=_OUTBOUND_QUEUE_LIMIT,
+                  outbound_policy=_OUTBOUND_POLICY, stream_credit=_STREAM_CREDIT,
+                  compression_level=_COMPRESSION_LEVEL, compression_mem_level=_COMPRESSION_MEM_LEVEL,
+                  compression_min_size=_COMPRESSION_MIN_SIZE,
+                  compression_server_context_takeover=_COMPRESSION_SERVER_CONTEXT_TAKEOVER,
+                  compression_client_context_takeover=_COMPRESSION_CLIENT_CONTEXT_TAKEOVER,
+                  session_ttl=_SESSION_TTL, session_replay_limit=_SESSION_REPLAY_LIMIT,
+                  wildcard_subscriptions=_WILDCARD_SUBSCRIPTIONS, max_subscriptions=_MAX_SUBSCRIPTIONS):
+        if outbound_policy not in outbound.POLICIES:
+            raise ValueError('Unknown outbound policy {0!r}'.format(outbound_policy))
+
         cls._KEEPALIVE_PING_TIMEOUT = keepalive_timeout
         cls._CLIENT_TIMEOUT = client_timeout
+        cls._CALL_TIMEOUT = call_timeout
+        cls._MAX_PENDING_CALLS = max_pending_calls
+        cls._BATCH_MAX_DELAY = batch_max_delay
+        cls._MAX_CONCURRENT_CALLS = max_concurrent_calls
+        cls._REJECT_EXCESS_CALLS = reject_excess_calls
+        cls._RATE_LIMIT = rate_limit
+        cls._RATE_BURST = rate_burst
+        cls._MAX_IN_FLIGHT = max_in_flight
+        cls._OVERLOAD_RETRY_AFTER = overload_retry_after
+        cls._OUTBOUND_HIGH_WATERMARK = outbound_high_watermark
+        cls._OUTBOUND_LOW_WATERMARK = outbound_low_watermark
+        cls._OUTBOUND_QUEUE_LIMIT = outbound_queue_limit
+        cls._OUTBOUND_POLICY = outbound_policy
+        cls._STREAM_CREDIT = stream_credit
+        cls._COMPRESSION_LEVEL = compression_level
+        cls._COMPRESSION_MEM_LEVEL = compression_mem_level
+        cls._COMPRESSION_MIN_SIZE = compression_min_size
+        cls._COMPRESSION_SERVER_CONTEXT_TAKEOVER = compression_server_context_takeover
+        cls._COMPRESSION_CLIENT_CONTEXT_TAKEOVER = compression_client_context_takeover
+        cls._SESSION_TTL = session_ttl
+        cls._SESSION_REPLAY_LIMIT = session_replay_limit
+        cls._WILDCARD_SUBSCRIPTIONS = wildcard_subscriptions
+        cls._MAX_SUBSCRIPTIONS = max_subscriptions
 
     def _execute(self, transforms, *args, **kwargs):
+        if self._DRAINING:
+            return self._reject_handshake(transforms)
+
         if self.authorize():
             return super(WebSocketBase, self)._execute(transforms, *args, **kwargs)
         else:
@@ -78,9 +259,135 @@ class WebSocketBase(tornado.websocket.WebSocketHandler):
             def resolve():
                 f.set_result(self.send_error(403))
 
-            tornado.ioloop.IOLoop.instance().add_callback(resolve)
+            tornado.ioloop.IOLoop.current().add_callback(resolve)
             return f
 
+    def _reject_handshake(self, transforms):
+        self._transforms = transforms or []
+        f = tornado.gen.Future()
+
+        def resolve():
+            # Browsers don't expose the status, wsrpc.js retries by its backoff
+            self.set_status(503)
+            self.set_header('Retry-After', '1')
+            f.set_result(self.finish())
+
+        tornado.ioloop.IOLoop.current().add_callback(resolve)
+        return f
+
+    @classmethod
+    @tornado.gen.coroutine
+    def drain(cls, timeout=30, reconnect_min=1, reconnect_max=30):
+        """ Gracefully closes the connections of the handler (and its subclasses), e.g. before the restart.
+
+        New connections and calls are rejected. Clients are asked to reconnect after the random
+        delay between ``reconnect_min`` and ``reconnect_max`` seconds, so they don't reconnect at once.
+        Every connection is closed as soon as its calls are finished and replies are sent,
+        the rest of them are closed in ``timeout`` seconds.
+        """
+
+        cls._DRAINING = True
+        clients = [client for client in cls._CLIENTS.snapshot() if isinstance(client, cls)]
+        log.info("Draining %d connections", len(clients))
+
+        for client in clients:
+            client._reconnect_delay = random.uniform(reconnect_min, reconnect_max)
+            client._in_ioloop(
+                client._send, serial=cls._BROADCAST_SERIAL, type='drain', data={'reconnect': client._reconnect_delay}
+            )
+
+        ioloop = tornado.ioloop.IOLoop.current()
+        deadline = ioloop.time() + timeout
+
+        while clients:
+            for client in clients:
+                if not client.busy:
+                    client._in_ioloop(client.close, 1001, 'Server is going away')
+
+            clients = [client for client in clients if client.ws_connection is not None]
+            if not clients or ioloop.time() >= deadline:
+                break
+
+            yield tornado.gen.sleep(cls._DRAIN_POLL_INTERVAL)
+
+        if clients:
+            log.warning("Closing %d connections with calls in flight by the drain timeout", len(clients))
+
+        for client in clients:
+            client._in_ioloop(client.close, 1001, 'Server is going away')
+
+    @property
+    def busy(self):
+        """ The connection has calls in flight or unsent frames """
+        return bool(self._inflight) or bool(self.send_queue_depth)
+
+    @classmethod
+    def dispatch_table(cls):
+        routes = cls.ROUTES
+
+        if not isinstance(routes, RouteTable):
+            # ROUTES has been overlapped by the plain dict
+            for klass in cls.__mro__:
+                if 'ROUTES' in klass.__dict__:
+                    routes = klass.ROUTES = RouteTable(klass.ROUTES)
+                    break
+
+        return routes.table
+
+    @classmethod
+    def register_codec(cls, codec):
+        if 'CODECS' not in cls.__dict__:
+            cls.CODECS = dict(cls.CODECS)
+
+        cls.CODECS[codec.name] = codec
+
+    def get_compression_options(self):
+        if self._COMPRESSION_LEVEL is None:
+            return
+
+        if not self._COMPRESSION_CLIENT_CONTEXT_TAKEOVER:
+            header = self.request.headers.get('Sec-WebSocket-Extensions')
+            if header:
+                self.request.headers['Sec-WebSocket-Extensions'] = compression.no_client_context_takeover(header)
+
+        # tornado<4.5 ignores the levels, they are applied by the Compressor, see _setup_compression
+        return {'compression_level': self._COMPRESSION_LEVEL, 'mem_level': self._COMPRESSION_MEM_LEVEL}
+
+    def _setup_compression(self):
+        # The compressor and the frames are accessed through the internals of tornado<4.5,
+        # other versions compress every frame with their own compressor
+        connection = self.ws_connection
+        compressor = getattr(connection, '_compressor', None)
+        if compressor is None:
+            return
+
+        if not hasattr(connection, '_write_frame') or not hasattr(connection, '_message_bytes_out'):
+            log.warning("Uncompressed frames aren't supported by tornado %s", tornado.version)
+        else:
+            self._uncompressed_frames = True
+
+        if not hasattr(compressor, '_compressor') or not hasattr(compressor, '_max_wbits'):
+            log.warning("Compression levels aren't applied by tornado %s", tornado.version)
+            return
+
+        connection._compressor = compression.Compressor(
+            persistent=self._COMPRESSION_SERVER_CONTEXT_TAKEOVER and compressor._compressor is not None,
+            max_wbits=compressor._max_wbits,
+            level=self._COMPRESSION_LEVEL,
+            mem_level=self._COMPRESSION_MEM_LEVEL,
+        )
+
+    @property
+    def compressed(self):
+        return getattr(self.ws_connection, '_compressor', None) is not None
+
+    def select_subprotocol(self, subprotocols):
+        for name in subprotocols:
+            codec = self.CODECS.get(name)
+            if codec is not None:
+                self.codec = codec
+                return name
+
     @staticmethod
     def authorize():
         return True
@@ -89,96 +396,211 @@ class WebSocketBase(tornado.websocket.WebSocketHandler):
     def allow_draft76():
         return True
 
-    @staticmethod
-    def deflate(data, compresslevel=9):
-        compress = zlib.compressobj(
-                compresslevel,        # level: 0-9
-                zlib.DEFLATED,        # method: must be DEFLATED
-                -zlib.MAX_WBITS,      # window size in bits:
-                                      #   -15..-8: negate, suppress header
-                                      #   8..15: normal
-                                      #   16..30: subtract 16, gzip header
-                zlib.DEF_MEM_LEVEL,   # mem level: 1..8/9
-                0                     # strategy:
-                                      #   0 = Z_DEFAULT_STRATEGY
-                                      #   1 = Z_FILTERED
-                                      #   2 = Z_HUFFMAN_ONLY
-                                      #   3 = Z_RLE
-                                      #   4 = Z_FIXED
-        )
-        deflated = compress.compress(data)
-        deflated += compress.flush()
-        return deflated
-
-    @staticmethod
-    def inflate(data):
-        decompress = zlib.decompressobj(
-                -zlib.MAX_WBITS  # see above
-        )
-        inflated = decompress.decompress(data)
-        inflated += decompress.flush()
-        return inflated
-
     def __init__(self, *args, **kwargs):
         super(WebSocketBase, self).__init__(*args, **kwargs)
-        self.__handlers = {}
-        self.store = {}
-        self.serial = 0
-        self.locks = defaultdict(Semaphore)
-        self.extensions = self.request.headers.get('Sec-Websocket-Extensions', '')
-        self._deflate = True if 'deflate' in self.extensions else False
-        self._ping = {}
-        self.ioloop = tornado.ioloop.IOLoop.instance()
+        # The IOLoop of the connection's shard, see shards.ShardedHTTPServer
+        self.ioloop = tornado.ioloop.IOLoop.current()
+
+    @property
+    def extensions(self):
+        return self.request.headers.get('Sec-Websocket-Extensions', '')
 
     @classmethod
+    @tornado.gen.coroutine
     def broadcast(cls, func, callback=WebSocketRoute.placebo, **kwargs):
+        if callback != WebSocketRoute.placebo:
+            # The caller wants the replies, so every local client gets its own call
+            for client in cls._CLIENTS.snapshot():
+                client.ioloop.add_callback(client.call, func, callback, **kwargs)
+
+            return
+
+        message = dict(serial=cls._BROADCAST_SERIAL, type='call', call=func, arguments=kwargs)
+
+        if cls.BUS is not None:
+            # Every process (this one too) writes the frame to its clients
+            cls.BUS.publish(pack(codecs.JSON.dumps(message), key=func))
+            return
+
+        yield cls._fan_out(cls._CLIENTS.snapshot(), func, message=message)
+
+    @classmethod
+    @tornado.gen.coroutine
+    def send_to(cls, client_id, func, **kwargs):
+        """ Calls the client's function without waiting for the reply.
+        The client might be connected to another process when the bus is used. """
+        message = dict(serial=cls._BROADCAST_SERIAL, type='call', call=func, arguments=kwargs)
+        client = cls._CLIENTS.get(client_id)
+
+        if client is not None:
+            yield cls._fan_out([client], func, message=message)
+        elif cls.BUS is not None:
+            cls.BUS.publish(pack(codecs.JSON.dumps(message), key=func, target=client_id))
+
+    @classmethod
+    @tornado.gen.coroutine
+    def publish(cls, channel, func, **kwargs):
+        """ Calls the function of the clients subscribed to the channel without waiting for the replies """
+        message = dict(serial=cls._BROADCAST_SERIAL, type='call', call=func, arguments=kwargs)
+
+        if cls.BUS is not None:
+            cls.BUS.publish(pack(codecs.JSON.dumps(message), key=func, channel=channel))
+            return
+
+        yield cls._fan_out(list(cls._CHANNELS.subscribers(channel)), func, message=message)
+
+    def subscribe(self, channel):
+        if self._subscriptions is None:
+            self._subscriptions = set()
+
+        self._subscriptions.add(channel)
+        self._CHANNELS.add(channel, self)
+
+    def unsubscribe(self, channel):
+        if self._subscriptions and channel in self._subscriptions:
+            self._subscriptions.discard(channel)
+            self._CHANNELS.remove(channel, self)
+
+    def authorize_channel(self, channel):
+        """ Checks the client might subscribe to the channel, overlap it for the access control.
+        The prefix channels are checked only when ``wildcard_subscriptions`` are allowed. """
+        return True
+
+    @classmethod
+    @tornado.gen.coroutine
+    def _fan_out(cls, clients, key, message=None, frame=None):
+        # Connections are written by the IOLoops of their shards, the other shards concurrently
         ioloop = tornado.ioloop.IOLoop.current()
+        local = []
+
+        for shard, group in iteritems(by_ioloop(clients)):
+            if shard is ioloop:
+                local = group
+            else:
+                shard.add_callback(cls._write_all, group, key, message, frame)
+
+        yield cls._write_all(local, key, message, frame)
+
+    @classmethod
+    @tornado.gen.coroutine
+    def _write_all(cls, clients, key, message=None, frame=None):
+        # Fire-and-forget: the message is serialized once per codec and the same
+        # frame is written to every client, yielding to the IOLoop between chunks.
+        # The frame is the message already serialized by the JSON codec.
+        frames = {}
+        if frame is not None:
+            frames[codecs.JSON] = frame
+
+        chunk_size = cls._BROADCAST_CHUNK_SIZE
+
+        for offset in range(0, len(clients), chunk_size):
+            if offset:
+                yield tornado.gen.moment
+
+            for client in clients[offset:offset + chunk_size]:
+                data = frames.get(client.codec)
+                if data is None:
+                    if message is None:
+                        message = codecs.JSON.loads(frame)
+                    data = frames[client.codec] = client.codec.dumps(message)
+
+                client._write(data, cls._BROADCAST_SERIAL, key=key)
+
+    @classmethod
+    def use_tracer(cls, tracer):
+        """ Enables tracing by :class:`wsrpc.websocket.tracing.Tracer`, None disables it """
+        cls.TRACER = tracer
+
+    @classmethod
+    def use_bus(cls, bus):
+        """ Sends broadcasts and send_to() through the bus (see bus.py), None disables it """
+        if cls.BUS is not None:
+            cls.BUS.unsubscribe(cls._on_bus_message)
+
+        cls.BUS = bus
+
+        if bus is not None:
+            bus.subscribe(cls._on_bus_message)
+
+    @staticmethod
+    def _bus_frame(frame):
+        if attachments.is_frame(frame):
+            # JSON with binary attachments
+            return frame
+
+        return frame.decode('utf-8')
+
+    @classmethod
+    def _on_bus_message(cls, data):
+        target, key, channel, frame = unpack(data)
 
-        for client_id, client in iteritems(cls._CLIENTS):
-            ioloop.add_callback(client.call, func, callback, **kwargs)
+        if channel is not None:
+            clients = list(cls._CHANNELS.subscribers(channel))
+        elif target is None:
+            clients = cls._CLIENTS.snapshot()
+        else:
+            client = cls._CLIENTS.get(target)
+            if client is None:
+                return
+            clients = [client]
+
+        tornado.ioloop.IOLoop.current().add_future(
+            cls._fan_out(clients, key, frame=cls._bus_frame(frame)),
+            lambda f: f.result()
+        )
 
     def _set_id(self):
-        self.id = str(uuid.uuid4())
+        # 96 random bits in 16 characters instead of the 36 characters of uuid4
+        self.id = str(base64.urlsafe_b64encode(os.urandom(12)).decode('ascii'))
 
     def _log_client_list(self):
-        log.debug('CLIENTS: %s', Lazy(lambda: ''.join(['\n\t%r' % i for i in self._CLIENTS.values()])))
+        log.debug('CLIENTS: %s', Lazy(lambda: ''.join(['\n\t%r' % i for i in self._CLIENTS.snapshot()])))
 
     def on_pong(self, data):
-        future = self._ping.pop(data)
-        future.set_result({'seq': struct.unpack('>q', data)[0]})
+        if self._ping_sent is not None:
+            self._on_pong(self.ioloop.time() - self._ping_sent)
 
-    @tornado.gen.coroutine
-    def _send_ping(self):
-        if self.ws_connection:
-
-            if isinstance(self.ws_connection, tornado.websocket.WebSocketProtocol13):
-                future = tornado.gen.Future()
-                seq = struct.pack(">q", int(time.time() * 1000))
-                self._ping[seq] = future
-                self.ping(seq)
-            else:
-                future = self.call('ping', seq=time.time())
+    def _on_pong(self, rtt):
+        self._ping_sent = None
+        self._last_activity = self.ioloop.time()
+        self.rtt = rtt
+        self.metrics.counters.ping_rtt.observe(rtt)
 
-            self.ioloop.call_later(
-                self._KEEPALIVE_PING_TIMEOUT,
-                lambda: self.close() if future.running() else None
-            )
+        log.debug("%r Pong recieved: %.4f", self, rtt)
+        if rtt > self._CLIENT_TIMEOUT:
+            self.close()
 
-            resp = yield future
-            ts = resp.get('seq', 0)
-            delta = (time.time() - (ts/1000.))
-            log.debug("%r Pong recieved: %.4f" % (self, delta))
-            if delta > self._CLIENT_TIMEOUT:
-                self.close()
+    def _send_ping(self, now):
+        if not self.ws_connection:
+            return
 
-            self.ioloop.call_later(self._KEEPALIVE_PING_TIMEOUT, self._send_ping)
+        self._ping_sent = now
+
+        if isinstance(self.ws_connection, tornado.websocket.WebSocketProtocol13):
+            self.ping(struct.pack(">q", int(time.time() * 1000)))
+        else:
+            self.call('ping', seq=time.time(), callback=lambda f: self._on_pong(self.ioloop.time() - now))
+
+    def _keepalive_timeout(self):
+        log.info("%r ping timeout", self)
+
+        if self._session is not None:
+            # The client might resume the session, so only the connection is closed
+            super(WebSocketBase, self).close()
+            self.ioloop.add_callback(lambda: self.on_close() if self.ws_connection else None)
+            return
+
+        self.close()
 
     def _to_json(self, **kwargs):
-        return json.dumps(kwargs, ensure_ascii=False)
+        return self._dumps(kwargs)
+
+    def _dumps(self, obj):
+        return self.codec.dumps(obj)
 
     def _data_load(self, data_string):
         try:
-            return json.loads(data_string)
+            return self.codec.loads(data_string)
         except Exception as e:
             global_log.debug(Lazy(lambda: traceback.format_exc()))
             global_log.error('Parsing message error: %s', Lazy(lambda: repr(e)))
@@ -188,92 +610,560 @@ class WebSocketBase(tornado.websocket.WebSocketHandler):
         raise NotImplementedError('Callback function not implemented')
 
     def open(self):
-        self.ioloop.call_later(self._KEEPALIVE_PING_TIMEOUT, self._send_ping)
+        self._setup_compression()
+        self._last_activity = self.ioloop.time()
+        self._keepalive = Keepalive.get(self.ioloop, self._KEEPALIVE_PING_TIMEOUT)
+        self._keepalive.add(self)
         self.ioloop.add_callback(lambda: log.info('Client connected: %s', self))
         self._set_id()
+
+        if self._SESSION_TTL is not None:
+            self._open_session()
+
         self._CLIENTS[self.id] = self
         self._log_client_list()
 
-    def resolver(self, func_name):
-        class_name, method = func_name.split('.') if '.' in func_name else (func_name, 'init')
-        callee = self.ROUTES.get(class_name, self._unresolvable)
-        if callee == self._unresolvable or (hasattr(callee, '__self__') and isinstance(callee.__self__, WebSocketRoute)) or \
-                (not isinstance(callee, types.FunctionType) and issubclass(callee, WebSocketRoute)):
-            if self.__handlers.get(class_name, None) is None:
-                self.__handlers[class_name] = callee(self)
-
-            return self.__handlers[class_name]._resolve(method)
-
-        callee = self.ROUTES.get(func_name, self._unresolvable)
-        if hasattr(callee, '__call__'):
-            return callee
+    def _open_session(self):
+        token = self.get_query_argument('session', None)
+
+        try:
+            received = int(self.get_query_argument('received', 0))
+        except ValueError:
+            received = -1
+
+        session, previous, frames = self._SESSIONS.resume(token, self, received)
+        if session is not None and frames is None:
+            log.info("Session %s of %r might not be resumed, %d frames are missed", token, self, received)
+
+        if frames is None:
+            session = self._session = sessions.Session(self, self._SESSION_REPLAY_LIMIT)
+            self._SESSIONS[session.token] = session
         else:
-            raise NotImplementedError('Method call of {0} is not implemented'.format(repr(callee)))
+            self._resume_session(session, previous)
+            log.info("Session %s is resumed by %r, %d frames are replayed", token, self, len(frames))
+
+        # The session frame isn't numbered, it's the first frame of every connection
+        self._write_socket(
+            self._to_json(serial=self._BROADCAST_SERIAL, type='session',
+                          data={'token': session.token, 'resumed': frames is not None}),
+            self.codec.binary
+        )
+
+        for data, binary, compress in frames or ():
+            self._write_socket(data, binary, compress)
+
+    def _resume_session(self, session, previous):
+        self._session = session
+
+        if previous.ws_connection is not None:
+            # The client has reconnected before the server noticed the disconnect
+            previous._in_ioloop(super(WebSocketBase, previous).close, 1000, 'Session is resumed')
+
+        self.id = previous.id
+        self.serial = previous.serial
+        self.store, previous.store = previous.store, None
+        self.__handlers, previous.__handlers = previous.__handlers, None
+
+        for route in itervalues(self.__handlers or {}):
+            route.socket = self
+
+        subscriptions, previous._subscriptions = previous._subscriptions, None
+        for channel in subscriptions or ():
+            self._CHANNELS.remove(channel, previous)
+            self.subscribe(channel)
+
+    def _detach_session(self, session):
+        ioloop = tornado.ioloop.IOLoop.current()
+        expires = ioloop.time() + self._SESSION_TTL
+
+        if not self._SESSIONS.detach(session, self, expires):
+            # Another connection has resumed the session
+            return
+
+        Deadlines.get(ioloop).add(expires, partial(self._expire_session, session, expires))
+        log.info("Session %s of %r is kept for %s seconds", session.token, self, self._SESSION_TTL)
+
+    def _expire_session(self, session, expires):
+        if not self._SESSIONS.expire(session, self, expires):
+            return
+
+        log.info("Session %s of %r is expired", session.token, self)
+        self._end_session()
+
+    def _end_session(self):
+        session, self._session = self._session, None
+        self._SESSIONS.pop(session.token, None)
+
+        if not session.attached:
+            # Routes and calls have been kept by on_close
+            self._subscriptions = None
+            self._release()
+
+    def _get_route(self, name, factory):
+        if self.__handlers is None:
+            self.__handlers = {}
+
+        route = self.__handlers.get(name)
+        if route is None:
+            route = self.__handlers[name] = factory(self)
+
+        return route
+
+    def _resolve(self, func_name, args, kwargs):
+        """ Returns the function with bound arguments and the name of its executor """
+
+        try:
+            callee, executor = self._callees[func_name]
+        except (AttributeError, KeyError):
+            callee, executor = self._compile_call(func_name)
+
+        if callee is not None:
+            return callee.bind(self, args, kwargs), executor
+
+        func, factory = self._resolve_method(func_name)
+        executor = getattr(func, '__executor__', getattr(factory, '_EXECUTOR', None))
+        return partial(func, *args, **kwargs), executor or self._route_executor(is_async_function(func))
+
+    def _compile_call(self, func_name):
+        """ Caches the callee of the dispatch table with its executor for the handler class,
+        names which are resolved by the slow path aren't cached """
+        table = self.dispatch_table()
+        routes = type(self).ROUTES
+        self._callees = calls = routes.bound(type(self))
+
+        callee = table.get(func_name)
+        if callee is None:
+            return None, None
+
+        executor = callee.executor or self._route_executor(callee.is_async)
+        if routes.table is table:
+            # ROUTES haven't been changed by another shard meanwhile
+            calls[func_name] = callee, executor
+        return callee, executor
+
+    def _resolve_method(self, func_name):
+        """ Slow path: instance attributes of the route, routes created by the factory
+        and routes which check the access in their own _resolve """
+
+        class_name, method = func_name.split('.', 1) if '.' in func_name else (func_name, 'init')
+        factory = self.dispatch_table().routes.get(class_name)
+        if factory is None:
+            raise NotImplementedError('Method call of {0} is not implemented'.format(repr(func_name)))
+
+        return self._get_route(class_name, factory)._resolve(method), factory
+
+    def _decorated(self, func_name, attr, default):
+        """ The option set by the decorator of the method which isn't in the dispatch table """
+        try:
+            func, _ = self._resolve_method(func_name)
+        except Exception:
+            # The call fails when it's executed
+            return default
+
+        return getattr(func, attr, default)
+
+    def _route_executor(self, is_async):
+        """ Executor of the route which isn't bound to any, None is the handler's default """
+        return None
+
+    def resolver(self, func_name):
+        return self._resolve(func_name, (), {})[0]
 
     def on_close(self):
-            if self.id in self._CLIENTS:
-                self._CLIENTS.pop(self.id)
-            for name, obj in iteritems(self.__handlers):
-                self.ioloop.add_callback(obj._onclose)
+            # The resumed session's connection has the same id
+            self._CLIENTS.discard(self.id, self)
+            if getattr(self, '_keepalive', None) is not None:
+                self._keepalive.remove(self)
+            for channel in self._subscriptions or ():
+                self._CHANNELS.remove(channel, self)
+
+            session = self._session
+            if session is None:
+                self._subscriptions = None
+                self._release()
+            else:
+                # Calls in flight are finished, their replies are kept for the replay
+                self._detach_session(session)
 
             log.info('Client "{0}" disconnected'.format(self.id))
 
+    def _release(self):
+        ioloop = tornado.ioloop.IOLoop.current()
+
+        for token in list(itervalues(self._calls or {})):
+            token.cancel()
+        for name, obj in iteritems(self.__handlers or {}):
+            ioloop.add_callback(obj._onclose)
+
     @tornado.gen.coroutine
     def on_message(self, message):
         log.debug('Client %s send message: "%s"', self.id, message)
+        self._last_activity = self.ioloop.time()
+        counters = self.metrics.counters
+        counters.messages_in += 1
+        counters.bytes_in += len(message)
 
         # deserialize message
-        data = self._data_load(message)
+        if self.TRACER is None:
+            decoded = None
+            data = self._data_load(message)
+        else:
+            start = clock()
+            data = self._data_load(message)
+            decoded = (start, clock())
+
+        if isinstance(data, list):
+            yield self._on_batch(data, decoded)
+            return
+
+        response = yield self._handle_message(data, decoded)
+        if response is not None:
+            self._send(**response)
+
+    @tornado.gen.coroutine
+    def _on_batch(self, batch, decoded=None):
+        log.debug("Client %s send batch of %d messages", self.id, len(batch))
+
+        responses = []
+        timer = [None]
+
+        def flush():
+            if timer[0] is not None:
+                self.ioloop.remove_timeout(timer[0])
+                timer[0] = None
+
+            if responses:
+                self._send_batch(responses[:])
+                del responses[:]
+
+        waiter = tornado.gen.WaitIterator(*[self._handle_message(data, decoded) for data in batch])
+
+        while not waiter.done():
+            try:
+                response = yield waiter.next()
+            except Exception as e:
+                log.exception(e)
+                continue
+
+            if response is None:
+                continue
+
+            responses.append(response)
+
+            if self._BATCH_MAX_DELAY is not None and timer[0] is None:
+                timer[0] = self.ioloop.call_later(self._BATCH_MAX_DELAY, flush)
+
+        flush()
+
+    @tornado.gen.coroutine
+    def _handle_message(self, data, decoded=None):
         serial = data.get('serial', -1)
         msg_type = data.get('type', 'call')
+        trace = None
+        token = None
 
         assert serial >= 0
 
-        log.debug("Acquiring lock for %s serial %s", self, serial)
-        with (yield self.locks[serial].acquire()):
+        if msg_type == 'ack':
+            if self._session is not None:
+                self._session.ack(int(data.get('data', 0)))
+            return
+
+        if serial == self._BROADCAST_SERIAL and msg_type != 'call':
+            return
+
+        try:
+            if msg_type == 'call':
+                if self._inflight is None:
+                    self._inflight = InFlight(self._MAX_CONCURRENT_CALLS, self._REJECT_EXCESS_CALLS)
+
+                if serial in self._inflight:
+                    log.warning("Call with serial %s is already in flight for %s", serial, self)
+                    return
+
+                self._admit(data.get('call'))
+
+                if self.TRACER is not None:
+                    trace = self.TRACER.start(data.get('trace'), data.get('call'), serial, getattr(self, 'id', None))
+                    if trace is not None and decoded is not None:
+                        trace.span('decode', *decoded)
+
+                received = clock()
+                waiter = self._inflight.acquire(serial)
+
+                if self._calls is None:
+                    self._calls = {}
+
+                token = self._calls[serial] = Cancellation()
+                # Calls queued by max_concurrent_calls count for max_in_flight as well
+                counters = self.metrics.counters
+                counters.in_flight += 1
+
+                try:
+                    if waiter is not None:
+                        log.debug("Call with serial %s for %s is queued", serial, self)
+                        try:
+                            yield token.wait(waiter)
+                        except Exception:
+                            self._inflight.discard(serial, waiter)
+                            raise
+
+                        if trace is not None:
+                            trace.span('wait', received)
+
+                    try:
+                        args, kwargs = self._prepare_args(data.get('arguments', None))
+                        callback = data.get('call', None)
+                        if callback is None:
+                            raise ValueError('Require argument "call" does\'t exist.')
+
+                        result = yield self._execute_call(serial, callback, args, kwargs, received, token, trace)
+                    finally:
+                        self._inflight.release(serial)
+                finally:
+                    counters.in_flight -= 1
+                    self._calls.pop(serial, None)
+
+                if result is streaming.END:
+                    response = dict(serial=serial, type='end')
+                else:
+                    response = dict(data=result, serial=serial, type='callback')
+
+                    if self.compressed and not self._compress_result(callback):
+                        response['compress'] = False
+
+                if trace is not None:
+                    # The trace is finished when the response is written, see _send
+                    response['context'] = trace
+
+                raise tornado.gen.Return(response)
+
+            elif msg_type == 'cancel':
+                token = self._calls.get(serial) if self._calls else None
+                if token is not None:
+                    log.debug("Call with serial %s for %s is cancelled", serial, self)
+                    self.metrics.counters.cancelled += 1
+                    token.cancel()
+
+            elif msg_type == 'credit':
+                credit = self._streams.get(serial) if self._streams else None
+                if credit is not None:
+                    credit.grant(int(data.get('data', 1)))
+
+            elif msg_type == 'callback':
+                future = self.store.pop(serial, None) if self.store else None
+                if future is None:
+                    # Expired or unknown call
+                    log.warning("Reply with unknown serial %s from %s", serial, self)
+                else:
+                    future.set_result(data.get('data', None))
+
+            elif msg_type == 'error':
+                self._reject(data.get('serial', -1), data.get('data', None))
+                log.error('Client return error: \n\t{0}'.format(data.get('data', None)))
+
+        except tornado.gen.Return:
+            raise
+
+        except Overloaded as e:
+            # The rejection must be cheap, so it's not logged as the error
+            log.debug("Call with serial %s for %s is rejected: %s", serial, self, e)
+            raise tornado.gen.Return(dict(data=self._format_error(e), serial=serial, type='error'))
+
+        except CancelledError as e:
+            if token is None or token.cancelled:
+                # Nobody waits for the reply
+                if trace is not None:
+                    trace.finish(error='CancelledError')
+                return
+
+            # The call is cancelled by something else than its client, it's replied by the error
+            log.exception(e)
+            response = dict(data=self._format_error(e), serial=serial, type='error')
+
+            if trace is not None:
+                trace.error = type(e).__name__
+                response['context'] = trace
+
+            raise tornado.gen.Return(response)
+
+        except Exception as e:
+            log.exception(e)
+            response = dict(data=self._format_error(e), serial=serial, type='error')
+
+            if trace is not None:
+                trace.error = type(e).__name__
+                response['context'] = trace
+
+            raise tornado.gen.Return(response)
+
+    @tornado.gen.coroutine
+    def _execute_call(self, serial, name, args, kwargs, received, token, trace=None):
+        counters = self.metrics.counters
+
+        if trace is not None:
+            dispatched = clock()
+
+        try:
+            func, executor = self._resolve(name, args, kwargs)
+        except Exception:
+            counters.unresolved += 1
+            raise
+
+        stats = counters.route(name)
+        cache = getattr(func.func, '__cache__', None)
+        # The execution of the cached call is shared by the calls with the same arguments,
+        # so it has its own token which none of them cancels
+        run = partial((token if cache is None else Cancellation()).run, func)
+
+        if executor is not None and executor in self._EXECUTORS.processes:
+            # Neither the timer nor the cancellation can be passed to another process
+            timer = CallTimer(func, received)
+            timer.started = clock()
+            func = timer.func
+        elif trace is None:
+            timer = CallTimer(run, received)
+            func = timer
+        else:
+            timer = CallTimer(partial(trace.run, run), received)
+            func = timer
+
+        if trace is not None:
+            submitted = clock()
+            trace.span('dispatch', dispatched, submitted)
+
+        try:
+            if cache is None:
+                result = yield token.wait(self._submit(func, executor))
+            else:
+                result, hit = yield token.wait(
+                    cache.call(cache.key(args, kwargs), partial(self._submit, func, executor))
+                )
+                if hit:
+                    stats.cache_hits += 1
+                else:
+                    stats.cache_misses += 1
+
+            if tornado.concurrent.is_future(result):
+                # The blocking route has returned the future, e.g. of the pool or the IOLoop
+                result = yield token.wait(result)
+
+            if streaming.is_stream(result):
+                yield self._stream(serial, result, executor, token)
+                result = streaming.END
+        except Exception:
+            timer.observe(stats, error=True)
+            raise
+        finally:
+            if trace is not None:
+                # The cached result has no execution of this call
+                started = timer.started or submitted
+                trace.span('queue', submitted, started)
+                trace.span('execute', started)
+
+        timer.observe(stats)
+        raise tornado.gen.Return(result)
+
+    @tornado.gen.coroutine
+    def _stream(self, serial, stream, executor, token):
+        """ Sends chunks of the generator (or async generator) as long as the client grants credits """
+
+        if self._streams is None:
+            self._streams = {}
+
+        credit = self._streams[serial] = streaming.Credit(self._STREAM_CREDIT)
+        is_async = streaming.is_async_stream(stream)
+
+        try:
+            while True:
+                if is_async:
+                    try:
+                        chunk = yield token.wait(stream.__anext__())
+                    except streaming.StopAsyncIteration:
+                        break
+                else:
+                    next_chunk = partial(token.run, partial(streaming.next_chunk, stream))
+                    chunk = yield token.wait(self._submit(next_chunk, executor))
+                    if chunk is streaming.END:
+                        break
+
+                # The only chunk is held while the client has no credits
+                yield token.wait(credit.acquire())
+                self._send(serial=serial, type='chunk', data=chunk)
+        except Exception:
             try:
-                if msg_type == 'call':
-                    args, kwargs = self._prepare_args(data.get('arguments', None))
-                    callback = data.get('call', None)
-                    if callback is None:
-                        raise ValueError('Require argument "call" does\'t exist.')
-
-                    callee = self.resolver(callback)
-                    calee_is_route = hasattr(callee, '__self__') and isinstance(callee.__self__, WebSocketRoute)
-                    if not calee_is_route:
-                        a = [self,]
-                        a.extend(args)
-                        args = a
-
-                    result = yield self._executor(partial(callee, *args, **kwargs))
-                    self._send(data=result, serial=serial, type='callback')
-
-                elif msg_type == 'callback':
-                    cb = self.store.pop(serial, None)
-                    cb.set_result(data.get('data', None))
-
-                elif msg_type == 'error':
-                    self._reject(data.get('serial', -1), data.get('data', None))
-                    log.error('Client return error: \n\t{0}'.format(data.get('data', None)))
+                if is_async:
+                    yield stream.aclose()
+                else:
+                    stream.close()
+            except (ValueError, RuntimeError):
+                # The cancelled call is still pulling the chunk, it's closed by the garbage collector
+                pass
+            raise
+        finally:
+            self._streams.pop(serial, None)
+
+    def _admit(self, name):
+        """ Raises Overloaded when the call exceeds the limits """
+
+        metrics = self.metrics
+        shed = metrics.counters.shed
+
+        if self._DRAINING:
+            shed['drain'] += 1
+            raise Overloaded('Server is draining', self._reconnect_delay or self._OVERLOAD_RETRY_AFTER)
+
+        if self._MAX_IN_FLIGHT is not None and metrics.in_flight >= self._MAX_IN_FLIGHT:
+            shed['concurrency'] += 1
+            raise Overloaded('Server is overloaded', self._OVERLOAD_RETRY_AFTER)
+
+        if self._RATE_LIMIT is not None:
+            if self._bucket is None:
+                self._bucket = TokenBucket(self._RATE_LIMIT, self._RATE_BURST)
+
+            retry_after = self._bucket.take()
+            if retry_after:
+                shed['connection'] += 1
+                raise Overloaded('Rate limit of the connection is exceeded', retry_after)
+
+        table = self.dispatch_table()
+        if not table.rate_limited and not table.routes:
+            return
+
+        callee = table.get(name)
+        if callee is not None:
+            rate_limit = callee.rate_limit
+        elif table.routes:
+            rate_limit = self._decorated(name, '__rate_limit__', None)
+        else:
+            return
 
-            except Exception as e:
-                log.exception(e)
-                self._send(data=self._format_error(e), serial=serial, type='error')
+        if rate_limit is None:
+            return
+
+        if self._route_buckets is None:
+            self._route_buckets = {}
 
-            finally:
-                def clean_lock():
-                    log.debug("Release and delete lock for %s serial %s", self, serial)
-                    if serial in self.locks:
-                        self.locks.pop(serial)
+        bucket = self._route_buckets.get(name)
+        if bucket is None:
+            bucket = self._route_buckets[name] = TokenBucket(*rate_limit)
 
-                self.ioloop.call_later(self._CLIENT_TIMEOUT, clean_lock)
+        retry_after = bucket.take()
+        if retry_after:
+            shed['route'] += 1
+            raise Overloaded('Rate limit of {0} is exceeded'.format(name), retry_after)
 
     @staticmethod
     def _format_error(e):
-        return {'type': unicode(type(e).__name__), 'message': unicode(e)}
+        error = {'type': unicode(type(e).__name__), 'message': unicode(e)}
+
+        if isinstance(e, Overloaded):
+            error['retry_after'] = e.retry_after
+
+        return error
 
     def _reject(self, serial, error):
-        future = self.store.get(serial)
+        future = self.store.pop(serial, None) if self.store else None
         if future:
             future.set_exception(ClientException(error))
 
@@ -293,45 +1183,231 @@ class WebSocketBase(tornado.websocket.WebSocketHandler):
 
         return arguments, kwargs
 
+    @classmethod
+    def add_executor(cls, name, workers=cpu_count(), process=False):
+        """ Creates the named thread (or process) pool for the routes
+        decorated by ``@decorators.executor(name)``. Process pools
+        accept only module-level functions, which are called without the socket. """
+        return cls._EXECUTORS.add(name, workers, process=process)
+
+    def _submit(self, func, executor=None):
+        if executor is None:
+            return self._executor(func)
+        elif executor == INLINE:
+            return run_inline(func)
+
+        return self._EXECUTORS.submit(executor, func)
+
     def _executor(self, func):
         raise NotImplementedError(":-(")
 
-    def _send(self, **kwargs):
+    def _compress_result(self, name):
+        callee = self.dispatch_table().get(name)
+        if callee is None:
+            return self._decorated(name, '__compress__', True)
+
+        return callee.compress
+
+    def _send(self, compress=True, context=None, **kwargs):
+        if context is None:
+            return self._write(self._encode(kwargs), kwargs.get('serial'), compress=compress)
+
+        start = clock()
+        data = self._encode(kwargs)
+        encoded = clock()
+        self._write(data, kwargs.get('serial'), compress=compress)
+        self._finish_traces((context,), start, encoded)
+
+    def _send_batch(self, messages):
+        if len(messages) == 1:
+            return self._send(**messages[0])
+
+        # The batch is sent as is when all of its results are uncompressed
+        compress = [message.pop('compress', True) for message in messages]
+        traces = [trace for trace in (message.pop('context', None) for message in messages) if trace is not None]
+
+        start = clock() if traces else None
+        try:
+            data = self._dumps(messages)
+        except Exception:
+            # The result which can't be encoded mustn't drop the rest of the batch
+            messages = list(map(self._encodable, messages))
+            data = self._dumps(messages)
+        encoded = clock() if traces else None
+
+        self._write(
+            data,
+            Lazy(lambda: ', '.join(str(m.get('serial')) for m in messages)),
+            compress=any(compress)
+        )
+
+        if traces:
+            self._finish_traces(traces, start, encoded)
+
+    def _encode(self, message):
+        try:
+            return self._dumps(message)
+        except Exception:
+            return self._dumps(self._encodable(message))
+
+    def _encodable(self, message):
+        """ The reply with the result which can't be encoded is replaced by the error """
+        try:
+            self._dumps(message)
+            return message
+        except Exception as e:
+            if message.get('type') != 'callback':
+                raise
+
+            log.exception(e)
+            return dict(data=self._format_error(e), serial=message.get('serial'), type='error')
+
+    @staticmethod
+    def _finish_traces(traces, start, encoded):
+        written = clock()
+
+        for trace in traces:
+            trace.span('encode', start, encoded)
+            trace.span('write', encoded, written)
+            trace.finish()
+
+    def _write(self, data, serial, key=None, compress=True):
+        log.debug(
+            "Sending message to %s serial %s: %s",
+            Lazy(lambda: str(self.id)),
+            Lazy(lambda: str(serial)),
+            Lazy(lambda: str(data))
+          )
+        counters = self.metrics.counters
+        counters.messages_out += 1
+        counters.bytes_out += len(data)
+        binary = self.codec.binary or attachments.is_frame(data)
+
+        if self.outbound is None:
+            self.outbound = outbound.Outbound(
+                self._write_frame, self.close,
+                self._OUTBOUND_HIGH_WATERMARK, self._OUTBOUND_LOW_WATERMARK,
+                self._OUTBOUND_QUEUE_LIMIT, self._OUTBOUND_POLICY
+            )
+
+        self.outbound.send(data, binary, key, compress)
+
+    def _write_frame(self, data, binary, compress=True):
+        if self._session is not None:
+            # Frames are kept for the replay until the client acknowledges them
+            return self._session.write(data, binary, compress)
+
+        return self._write_socket(data, binary, compress)
+
+    def _write_socket(self, data, binary, compress=True):
         try:
-            data = self._to_json(**kwargs)
-            log.debug(
-                "Sending message to %s serial %s: %s",
-                Lazy(lambda: str(self.id)),
-                Lazy(lambda: str(kwargs.get('serial'))),
-                Lazy(lambda: str(data))
-              )
-            self.write_message(data, binary=False)
+            if self._uncompressed_frames and (not compress or len(data) < self._COMPRESSION_MIN_SIZE):
+                return self._write_uncompressed(data, binary)
+
+            return self.write_message(data, binary=binary)
         except tornado.websocket.WebSocketClosedError:
-            self.close()
+            # The session's frame is replayed when the client resumes it
+            if self._session is None:
+                self.close()
+
+    def _write_uncompressed(self, data, binary):
+        # Frames without the RSV1 bit aren't decompressed by the client (RFC 7692, 6)
+        data = tornado.escape.utf8(data)
+        connection = self.ws_connection
+        connection._message_bytes_out += len(data)
+        return connection._write_frame(True, 0x2 if binary else 0x1, data)
 
     def call(self, func, callback=None, **kwargs):
+        return self.call_with_timeout(self._CALL_TIMEOUT, func, callback, **kwargs)
+
+    def call_with_timeout(self, timeout, func, callback=None, **kwargs):
+        """ Calls the client's function. The future fails with CallTimeout
+        when the client doesn't reply within the timeout (seconds). """
+
         future = tornado.gen.Future()
         if callback is not None and not isinstance(callback, tornado.gen.Future):
             future.add_done_callback(callback)
 
+        if self.store is None:
+            self.store = {}
+
+        if len(self.store) >= self._MAX_PENDING_CALLS:
+            future.set_exception(TooManyPendingCalls(
+                '{0} calls are waiting for the reply of {1!r}'.format(len(self.store), self)
+            ))
+            return future if callback is None else None
+
         self.serial += 2
         self.store[self.serial] = future
-        self._send(serial=self.serial, type='call', call=func, arguments=kwargs)
+        self.metrics.counters.client_calls += 1
+
+        # The call made by the route carries the trace id of the route's call
+        trace = tracing.current()
+        envelope = {} if trace is None else {'trace': trace.id}
+
+        if timeout is not None:
+            ioloop = tornado.ioloop.IOLoop.current()
+            Deadlines.get(ioloop).add(
+                ioloop.time() + timeout,
+                partial(self._expire_call, self.serial, future, timeout)
+            )
+
+        send = partial(self._send, serial=self.serial, type='call', call=func, arguments=kwargs, **envelope)
+        # Nothing is queued before the first frame
+        waits = self.outbound is not None and self.outbound.policy == outbound.WAIT
+        drained = self.outbound.drained() if waits else None
+
+        if drained is None:
+            send()
+        else:
+            drained.add_done_callback(lambda f: send() if f.exception() is None else None)
 
         if callback is None:
             return future
 
+    def _expire_call(self, serial, future, timeout):
+        if not self.store or self.store.get(serial) is not future:
+            return
+
+        del self.store[serial]
+        future.set_exception(CallTimeout('No reply for serial {0} in {1} seconds'.format(serial, timeout)))
+
+    def _in_ioloop(self, func, *args, **kwargs):
+        """ Calls the function in the IOLoop of the connection, it might be another shard's one """
+
+        if self.ioloop is tornado.ioloop.IOLoop.current():
+            return func(*args, **kwargs)
+
+        self.ioloop.add_callback(partial(func, *args, **kwargs))
+
+    @property
+    def send_queue_depth(self):
+        return self.outbound.depth if self.outbound is not None else 0
+
     def __repr__(self):
         if hasattr(self, 'id'):
             return "<RPCWebSocket: ID[{0}]>".format(self.id)
         else:
             return "<RPCWebsocket: {0} (waiting)>".format(self.__hash__())
 
-    def close(self):
-        super(WebSocketBase, self).close()
-        for future in self.store.values():
+    def close(self, code=None, reason=None):
+        if self._session is not None and self._session.socket is self:
+            # The session isn't resumed after the server has closed the connection
+            self._end_session()
+
+        super(WebSocketBase, self).close(code, reason)
+        store, self.store = self.store, None
+        for future in itervalues(store or {}):
             self.ioloop.add_callback(partial(future.set_exception, ConnectionClosed))
 
+        if self._inflight is not None:
+            self._inflight.cancel(ConnectionClosed())
+
+        for credit in list(itervalues(self._streams or {})):
+            credit.cancel(ConnectionClosed())
+        if self.outbound is not None:
+            self.outbound.clear(ConnectionClosed())
+
         self.ioloop.add_callback(lambda: self.on_close() if self.ws_connection else None)
 
     @classmethod
@@ -340,13 +1416,8 @@ class WebSocketBase(tornado.websocket.WebSocketHandler):
 
 
 class WebSocket(WebSocketBase):
-    @tornado.gen.coroutine
     def _executor(self, func):
-        result = func()
-        if isinstance(result, tornado.gen.Future):
-            result = yield result
-
-        raise tornado.gen.Return(result)
+        return run_inline(func)
 
 
 class WebSocketThreaded(WebSocketBase):
@@ -361,3 +1432,28 @@ class WebSocketThreaded(WebSocketBase):
             self.init_pool()
 
         return self._thread_pool.submit(log_thread_exceptions(func))
+
+
+class WebSocketHybrid(WebSocketThreaded):
+    """ Runs coroutines, async generators and ``nonblocking`` routes on the IOLoop
+    and the other routes in the thread pool, unless the route is bound to another executor """
+
+    def _route_executor(self, is_async):
+        return INLINE if is_async else None
+
+
+def executor_queue_depth():
+    pools = list(itervalues(WebSocketBase._EXECUTORS.pools))
+    for handler in (WebSocketThreaded, WebSocketHybrid):
+        if handler._thread_pool is not None and handler._thread_pool not in pools:
+            pools.append(handler._thread_pool)
+
+    return sum(queue_depth(pool) for pool in pools)
+
+
+WebSocketBase.metrics.gauge('clients', lambda: len(WebSocketBase._CLIENTS))
+WebSocketBase.metrics.gauge('executor_queue_depth', executor_queue_depth)
+WebSocketBase.metrics.gauge(
+    'pending_client_calls',
+    lambda: sum(len(client.store or ()) for client in WebSocketBase._CLIENTS.snapshot())
+)
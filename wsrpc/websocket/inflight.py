@@ -0,0 +1,81 @@
+# encoding: utf-8
+from collections import deque
+
+import tornado.gen
+
+
+class TooManyCalls(Exception):
+    pass
+
+
+class InFlight(object):
+    """ Registry of the calls being executed for the one connection.
+
+    Keeps serials of the running and queued calls so a repeated serial
+    might be detected without any lock or timer. When ``limit`` is set
+    the excess calls are queued or rejected with :class:`TooManyCalls`.
+    """
+
+    __slots__ = ('serials', 'running', 'limit', 'reject', 'waiters')
+
+    def __init__(self, limit=None, reject=False):
+        self.serials = set()
+        self.running = 0
+        self.limit = limit
+        self.reject = reject
+        self.waiters = None
+
+    def __contains__(self, serial):
+        return serial in self.serials
+
+    def __len__(self):
+        return len(self.serials)
+
+    def acquire(self, serial):
+        """ Returns None when the call might be started right now,
+        otherwise the future which is resolved when a slot is free. """
+
+        if self.limit is None or self.running < self.limit:
+            self.serials.add(serial)
+            self.running += 1
+            return
+
+        if self.reject:
+            raise TooManyCalls('Too many concurrent calls (limit is {0})'.format(self.limit))
+
+        self.serials.add(serial)
+
+        if self.waiters is None:
+            self.waiters = deque()
+
+        future = tornado.gen.Future()
+        self.waiters.append(future)
+        return future
+
+    def release(self, serial):
+        self.serials.discard(serial)
+
+        # Hand the slot over to the first queued call
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self.running -= 1
+
+    def discard(self, serial, waiter):
+        # For the queued call which is cancelled before it's started
+        self.serials.discard(serial)
+
+        if not waiter.done():
+            self.waiters.remove(waiter)
+        elif waiter.exception() is None:
+            # The slot has been handed over to the call already
+            self.release(serial)
+
+    def cancel(self, exception):
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_exception(exception)
@@ -0,0 +1,114 @@
+# encoding: utf-8
+import logging
+import threading
+import weakref
+
+from .tools import itervalues
+
+
+log = logging.getLogger("wsrpc.keepalive")
+
+
+class Keepalive(object):
+    """ Shared keepalive scheduler of the one IOLoop.
+
+    Connections are spread over the slots of a hashed timing wheel, so
+    the pings are sent evenly across the ``interval`` instead of by the
+    timer per connection. The wheel visits every connection once per
+    ``interval``: it pings the ones which had no inbound traffic since
+    the previous visit and closes the ones which didn't answer the
+    previous ping.
+
+    Connections must provide ``_last_activity``, ``_ping_sent``,
+    ``_send_ping(now)`` and ``_keepalive_timeout()``.
+    """
+
+    TICK = 1.0
+
+    # Schedulers of the IOLoops, the shards get them concurrently
+    _instances = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, ioloop, interval):
+        with cls._lock:
+            schedulers = cls._instances.setdefault(ioloop, {})
+            scheduler = schedulers.get(interval)
+
+            if scheduler is None:
+                scheduler = schedulers[interval] = cls(ioloop, interval)
+
+        return scheduler
+
+    @classmethod
+    def all(cls):
+        with cls._lock:
+            schedulers = [scheduler for group in itervalues(cls._instances) for scheduler in itervalues(group)]
+
+        return iter(schedulers)
+
+    def __init__(self, ioloop, interval):
+        self.ioloop = ioloop
+        self.interval = interval
+        self.tick = min(self.TICK, float(interval))
+        self.slots = [set() for _ in range(max(1, int(round(interval / self.tick))))]
+        self.cursor = 0
+        self.count = 0
+        self._timeout = None
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, conn):
+        return self.slots[hash(conn) % len(self.slots)]
+
+    def add(self, conn):
+        slot = self._slot(conn)
+        if conn in slot:
+            return
+
+        slot.add(conn)
+        self.count += 1
+
+        if self._timeout is None:
+            self._timeout = self.ioloop.call_later(self.tick, self._on_tick)
+
+    def remove(self, conn):
+        slot = self._slot(conn)
+        if conn not in slot:
+            return
+
+        slot.discard(conn)
+        self.count -= 1
+
+        if not self.count and self._timeout is not None:
+            self.ioloop.remove_timeout(self._timeout)
+            self._timeout = None
+
+    def _on_tick(self):
+        self._timeout = None
+
+        try:
+            self.process(self.slots[self.cursor])
+        finally:
+            self.cursor = (self.cursor + 1) % len(self.slots)
+
+            if self.count:
+                self._timeout = self.ioloop.call_later(self.tick, self._on_tick)
+
+    def process(self, slot):
+        now = self.ioloop.time()
+        expired = []
+
+        for conn in list(slot):
+            if conn._ping_sent is not None:
+                expired.append(conn)
+            elif now - conn._last_activity >= self.interval:
+                conn._send_ping(now)
+
+        if expired:
+            log.info("Closing %d connections by the ping timeout", len(expired))
+
+        for conn in expired:
+            self.remove(conn)
+            conn._keepalive_timeout()
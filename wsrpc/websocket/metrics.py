@@ -0,0 +1,308 @@
+# encoding: utf-8
+import threading
+import time
+from bisect import bisect_left
+
+import tornado.web
+
+from .tools import iteritems
+
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# Calls rejected by the admission control, see WebSocketBase._admit
+SHED_REASONS = ('concurrency', 'connection', 'route', 'drain')
+
+
+class Histogram(object):
+    # Seconds
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+        return self
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+    def snapshot(self):
+        return {
+            'buckets': [(bound, count) for bound, count in self.cumulative()],
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+
+class RouteMetrics(object):
+    __slots__ = ('calls', 'errors', 'cache_hits', 'cache_misses', 'queue', 'execution')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.queue = Histogram()
+        self.execution = Histogram()
+
+    def observe(self, queued, elapsed, error=False):
+        self.calls += 1
+        if error:
+            self.errors += 1
+
+        self.queue.observe(queued)
+        self.execution.observe(elapsed)
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.queue.merge(other.queue)
+        self.execution.merge(other.execution)
+        return self
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'queue': self.queue.snapshot(),
+            'execution': self.execution.snapshot(),
+        }
+
+
+class CallTimer(object):
+    """ Wraps the call for measuring the time it waits in the executor queue """
+
+    __slots__ = ('func', 'received', 'started')
+
+    def __init__(self, func, received):
+        self.func = func
+        self.received = received
+        self.started = None
+
+    def __call__(self):
+        self.started = clock()
+        return self.func()
+
+    def observe(self, stats, error=False):
+        now = clock()
+        started = self.started or now
+        stats.observe(started - self.received, now - started, error)
+
+
+class Counters(object):
+    """ Counters of the one thread. Every IOLoop shard increments its own
+    ones, so the plain increments don't race, see :class:`Metrics` """
+
+    __slots__ = ('routes', 'unresolved', 'in_flight', 'cancelled', 'shed', 'client_calls',
+                 'messages_in', 'messages_out', 'bytes_in', 'bytes_out', 'ping_rtt')
+
+    def __init__(self):
+        self.routes = {}
+        self.unresolved = 0
+        self.in_flight = 0
+        self.cancelled = 0
+        self.shed = dict.fromkeys(SHED_REASONS, 0)
+        self.client_calls = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.ping_rtt = Histogram()
+
+    def route(self, name):
+        stats = self.routes.get(name)
+        if stats is None:
+            stats = self.routes[name] = RouteMetrics()
+        return stats
+
+
+def total(name):
+    # The counter summed over the threads
+    return property(lambda self: sum(getattr(counters, name) for counters in self._threads))
+
+
+class Metrics(object):
+    """ Counters of the handlers. Only plain attribute increments of the
+    thread's own :attr:`counters` are done on the hot path, they are summed
+    and gauges are evaluated when the snapshot is taken. """
+
+    unresolved = total('unresolved')
+    in_flight = total('in_flight')
+    cancelled = total('cancelled')
+    client_calls = total('client_calls')
+    messages_in = total('messages_in')
+    messages_out = total('messages_out')
+    bytes_in = total('bytes_in')
+    bytes_out = total('bytes_out')
+
+    def __init__(self):
+        self.gauges = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._local = threading.local()
+            self._threads = []
+
+    @property
+    def counters(self):
+        """ Counters of the current thread """
+        local = self._local
+        counters = getattr(local, 'counters', None)
+
+        if counters is None:
+            counters = local.counters = Counters()
+            with self._lock:
+                self._threads.append(counters)
+
+        return counters
+
+    @property
+    def shed(self):
+        shed = dict.fromkeys(SHED_REASONS, 0)
+        for counters in self._threads:
+            for reason, count in list(iteritems(counters.shed)):
+                shed[reason] += count
+        return shed
+
+    @property
+    def routes(self):
+        routes = {}
+        for counters in self._threads:
+            for name, stats in list(iteritems(counters.routes)):
+                routes.setdefault(name, RouteMetrics()).merge(stats)
+        return routes
+
+    @property
+    def ping_rtt(self):
+        hist = Histogram()
+        for counters in self._threads:
+            hist.merge(counters.ping_rtt)
+        return hist
+
+    def route(self, name):
+        """ Stats of the route summed over the threads """
+        stats = RouteMetrics()
+        for counters in self._threads:
+            if name in counters.routes:
+                stats.merge(counters.routes[name])
+        return stats
+
+    def gauge(self, name, func):
+        self.gauges[name] = func
+
+    def snapshot(self):
+        return {
+            'routes': dict((name, stats.snapshot()) for name, stats in iteritems(self.routes)),
+            'unresolved': self.unresolved,
+            'in_flight': self.in_flight,
+            'cancelled': self.cancelled,
+            'shed': self.shed,
+            'client_calls': self.client_calls,
+            'messages_in': self.messages_in,
+            'messages_out': self.messages_out,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ping_rtt': self.ping_rtt.snapshot(),
+            'gauges': dict((name, func()) for name, func in iteritems(self.gauges)),
+        }
+
+    def prometheus(self, prefix='wsrpc'):
+        lines = []
+
+        def metric(name, kind, value=None, labels=None):
+            name = '_'.join((prefix, name))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+            if value is not None:
+                lines.append('{0}{1} {2}'.format(name, format_labels(labels), value))
+            return name
+
+        def histogram(name, hist, labels=None):
+            for bound, count in hist.cumulative():
+                lines.append('{0}_bucket{1} {2}'.format(name, format_labels(labels, le=bound), count))
+            lines.append('{0}_sum{1} {2}'.format(name, format_labels(labels), hist.sum))
+            lines.append('{0}_count{1} {2}'.format(name, format_labels(labels), hist.count))
+
+        routes = sorted(iteritems(self.routes))
+
+        for title, attr in (('calls_total', 'calls'), ('errors_total', 'errors'),
+                            ('cache_hits_total', 'cache_hits'), ('cache_misses_total', 'cache_misses')):
+            name = metric(title, 'counter')
+            for route, stats in routes:
+                lines.append('{0}{1} {2}'.format(name, format_labels({'route': route}), getattr(stats, attr)))
+
+        for title, attr in (('call_queue_seconds', 'queue'), ('call_execution_seconds', 'execution')):
+            name = metric(title, 'histogram')
+            for route, stats in routes:
+                histogram(name, getattr(stats, attr), {'route': route})
+
+        metric('unresolved_calls_total', 'counter', self.unresolved)
+        metric('cancelled_calls_total', 'counter', self.cancelled)
+
+        name = metric('shed_calls_total', 'counter')
+        for reason, count in sorted(iteritems(self.shed)):
+            lines.append('{0}{1} {2}'.format(name, format_labels({'reason': reason}), count))
+
+        metric('client_calls_total', 'counter', self.client_calls)
+        metric('messages_in_total', 'counter', self.messages_in)
+        metric('messages_out_total', 'counter', self.messages_out)
+        metric('bytes_in_total', 'counter', self.bytes_in)
+        metric('bytes_out_total', 'counter', self.bytes_out)
+        metric('in_flight_calls', 'gauge', self.in_flight)
+
+        for gauge, func in sorted(iteritems(self.gauges)):
+            metric(gauge, 'gauge', func())
+
+        histogram(metric('ping_rtt_seconds', 'histogram'), self.ping_rtt)
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels=None, **extra):
+    labels = dict(labels or {}, **extra)
+    if not labels:
+        return ''
+
+    return '{' + ','.join(
+        '{0}="{1}"'.format(key, format_label_value(value)) for key, value in sorted(iteritems(labels))
+    ) + '}'
+
+
+def format_label_value(value):
+    if isinstance(value, float):
+        return '+Inf' if value == float('inf') else repr(value)
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """ Serves the metrics in Prometheus text format, see ``wsrpc.wsrpc_metrics`` """
+
+    def initialize(self, metrics):
+        self.metrics = metrics
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(self.metrics.prometheus())
@@ -0,0 +1,168 @@
+# encoding: utf-8
+import logging
+from collections import deque
+from functools import partial
+
+import tornado.gen
+
+
+log = logging.getLogger("wsrpc.outbound")
+
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+WAIT = 'wait'
+
+POLICIES = frozenset((DROP_OLDEST, COALESCE, DISCONNECT, WAIT))
+
+
+class Outbound(object):
+    """ Bounded send queue of the one connection.
+
+    Frames are written while less than ``high`` bytes wait in the stream
+    buffer, then they are queued until the written data is flushed down
+    to ``low`` bytes. When ``limit`` frames are queued the ``policy`` decides:
+
+    * ``drop_oldest`` - the oldest queued frame is dropped;
+    * ``coalesce`` - a frame replaces the queued one with the same key
+      (e.g. broadcasts of the same function), otherwise the oldest is dropped;
+    * ``disconnect`` - the connection is closed;
+    * ``wait`` - server-side ``call()`` waits for ``drained()``. Replies and
+      broadcasts can't wait, the connection is closed when ``limit`` of them are queued.
+    """
+
+    __slots__ = ('write', 'close', 'high', 'low', 'limit', 'policy',
+                 'pending', 'queue', 'keys', 'waiters', 'last', 'dropped')
+
+    def __init__(self, write, close, high, low, limit, policy=WAIT):
+        if policy not in POLICIES:
+            raise ValueError('Unknown policy {0!r}'.format(policy))
+
+        self.write = write
+        self.close = close
+        self.high = high
+        self.low = low
+        self.limit = limit
+        self.policy = policy
+
+        self.pending = 0
+        # Created when the first frame is queued, most of the connections never queue
+        self.queue = None
+        self.keys = None
+        self.waiters = None
+        self.last = None
+        self.dropped = 0
+
+    @property
+    def depth(self):
+        return len(self.queue) if self.queue else 0
+
+    @property
+    def paused(self):
+        return bool(self.queue) or self.pending >= self.high
+
+    def send(self, data, binary, key=None, compress=True):
+        if not self.paused:
+            return self._write(data, binary, compress)
+
+        if self.policy == COALESCE and key is not None:
+            if self.keys is None:
+                self.keys = {}
+
+            item = self.keys.get(key)
+            if item is not None:
+                item[:] = [data, binary, key, compress]
+                return
+
+        if self.queue is None:
+            self.queue = deque()
+
+        if len(self.queue) >= self.limit:
+            if self.policy in (DISCONNECT, WAIT):
+                log.warning("Outbound queue limit reached, closing the connection")
+                self.clear()
+                return self.close()
+
+            self._drop()
+
+        item = [data, binary, key, compress]
+        self.queue.append(item)
+
+        if key is not None and self.keys is not None:
+            self.keys[key] = item
+
+    def drained(self):
+        """ Returns None when nothing is queued, otherwise the future resolved after draining """
+
+        if not self.paused:
+            return
+
+        if self.waiters is None:
+            self.waiters = []
+
+        future = tornado.gen.Future()
+        self.waiters.append(future)
+        return future
+
+    def clear(self, exception=None):
+        self.queue = None
+        self.keys = None
+
+        waiters, self.waiters = self.waiters, None
+        for future in waiters or ():
+            if exception is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exception)
+
+    def _drop(self):
+        data, binary, key, compress = self.queue.popleft()
+        self.dropped += 1
+
+        if key is not None and self.keys is not None:
+            self.keys.pop(key, None)
+
+    def _write(self, data, binary, compress=True):
+        future = self.write(data, binary, compress)
+        if future is None:
+            return
+
+        if future.done():
+            # Flushed to the socket at once, so the buffer is empty. The callback
+            # would resume the queue recursively from _resume, the caller's loop goes on.
+            self.last = None
+            self.pending = 0
+            return
+
+        size = len(data)
+        self.pending += size
+        self.last = future
+        future.add_done_callback(partial(self._on_flushed, size))
+
+    def _on_flushed(self, size, future):
+        # Older tornado resolves only the latest write future when the buffer is empty
+        if future is self.last:
+            self.last = None
+            self.pending = 0
+        else:
+            self.pending = max(0, self.pending - size)
+
+        if self.pending <= self.low:
+            self._resume()
+
+    def _resume(self):
+        while self.queue and self.pending < self.high:
+            data, binary, key, compress = self.queue.popleft()
+
+            if key is not None and self.keys is not None:
+                self.keys.pop(key, None)
+
+            self._write(data, binary, compress)
+
+        if self.queue is not None and not self.queue:
+            # Release the drained queue of the burst
+            self.queue = None
+
+        if not self.paused and self.waiters:
+            self.clear()
@@ -1,6 +1,9 @@
 # encoding: utf-8
+import inspect
 import logging
 
+from .cache import ResultCache
+
 
 log = logging.getLogger("wsrpc")
 
@@ -13,10 +16,63 @@ class decorators(object):
         decorators._NOPROXY.add(func)
         return func
 
+    @staticmethod
+    def executor(name):
+        """ Run the route method or function in the named executor
+        (see ``WebSocketBase.add_executor``) or ``"inline"`` on the IOLoop. """
+
+        def decorator(func):
+            func.__executor__ = name
+            return func
+        return decorator
+
+    @staticmethod
+    def nonblocking(func):
+        """ Run the route method or function on the IOLoop in any handler,
+        the same as ``executor("inline")``. It must not block. """
+        func.__executor__ = 'inline'
+        return func
+
+    @staticmethod
+    def rate_limit(rate, burst=None):
+        """ Limit calls of the route method or function by every connection to ``rate``
+        per second on average and ``burst`` at once. The excess calls fail with
+        ``admission.Overloaded``. """
+
+        def decorator(func):
+            func.__rate_limit__ = (rate, burst)
+            return func
+        return decorator
+
+    @staticmethod
+    def uncompressed(func):
+        """ Results of the route method or function aren't compressed by permessage-deflate
+        (e.g. they are compressed already) """
+        func.__compress__ = False
+        return func
+
+    @staticmethod
+    def cached(ttl, max_size=1024):
+        """ Share results of the route method or function between all connections
+        for ``ttl`` seconds. The route must not depend on the connection.
+        The cache is available as ``func.__cache__`` (see ``cache.ResultCache``). """
+
+        def decorator(func):
+            is_async_generator = getattr(inspect, 'isasyncgenfunction', lambda f: False)
+            if inspect.isgeneratorfunction(func) or is_async_generator(func):
+                raise TypeError('Streaming routes might not be cached')
+
+            func.__cache__ = ResultCache(ttl, max_size)
+            return func
+        return decorator
+
 
 class WebSocketRoute(object):
     _NOPROXY = []
 
+    # The executor for all methods of the route, see decorators.executor
+    _EXECUTOR = None
+
     @classmethod
     def noproxy(cls, func):
         def wrap(*args, **kwargs):
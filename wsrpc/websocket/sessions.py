@@ -0,0 +1,135 @@
+# encoding: utf-8
+""" Resumable sessions.
+
+The session outlives the connection: routes of the client, its pending calls
+and subscriptions are kept for the grace period after the disconnect, so the
+client which reconnects with the session token gets them back. Frames written
+to the client are counted and kept in the replay buffer until the client
+acknowledges them, the frames it missed are written again on resume.
+"""
+import base64
+import collections
+import os
+import threading
+
+
+def new_token():
+    return str(base64.urlsafe_b64encode(os.urandom(18)).decode('ascii'))
+
+
+class Session(object):
+    """ State of the client kept between its connections.
+
+    ``socket`` is the handler of the last connection, ``sent`` is the number
+    of frames written to the client in all of its connections. Up to ``limit``
+    frames which the client hasn't acknowledged are kept in the buffer.
+    """
+
+    __slots__ = ('token', 'socket', 'attached', 'frames', 'sent', 'expires')
+
+    def __init__(self, socket, limit, token=None):
+        self.token = token or new_token()
+        self.socket = socket
+        self.attached = True
+        self.frames = collections.deque(maxlen=limit)
+        self.sent = 0
+        self.expires = None
+
+    def write(self, data, binary, compress=True):
+        """ Numbers the frame and writes it to the attached connection """
+
+        self.sent += 1
+        self.frames.append((data, binary, compress))
+
+        if self.attached:
+            # The session might be resumed by the connection of another shard
+            return self.socket._in_ioloop(self.socket._write_socket, data, binary, compress)
+
+    def ack(self, received):
+        """ The client has received ``received`` frames, they aren't replayed anymore """
+
+        unacknowledged = max(self.sent - received, 0)
+        while len(self.frames) > unacknowledged:
+            self.frames.popleft()
+
+    def missed(self, received):
+        """ Frames the client hasn't received or None when some of them
+        are dropped from the buffer and the session might not be resumed """
+
+        count = self.sent - received
+        if count < 0 or count > len(self.frames):
+            return None
+
+        return list(self.frames)[len(self.frames) - count:]
+
+    def attach(self, socket):
+        self.socket = socket
+        self.attached = True
+        self.expires = None
+
+    def detach(self, expires):
+        self.attached = False
+        self.expires = expires
+
+    def __repr__(self):
+        return "<Session {0}: {1} frames of {2} buffered{3}>".format(
+            self.token, len(self.frames), self.sent, '' if self.attached else ' (detached)'
+        )
+
+
+class Sessions(dict):
+    """ Sessions of all the shards by token.
+
+    The connection of one shard resumes the session which is detached
+    (or expired) by the IOLoop of another, so the changes are locked.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Sessions, self).__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def __setitem__(self, token, session):
+        with self._lock:
+            dict.__setitem__(self, token, session)
+
+    def pop(self, token, *default):
+        with self._lock:
+            return dict.pop(self, token, *default)
+
+    def resume(self, token, socket, received):
+        """ Attaches the session to the socket. Returns the session, its previous
+        connection and the frames the client has missed, the frames are None
+        when the session might not be resumed """
+
+        with self._lock:
+            session = dict.get(self, token) if token else None
+            if session is None or type(session.socket) is not type(socket):
+                return None, None, None
+
+            frames = session.missed(received)
+            if frames is None:
+                return session, None, None
+
+            previous = session.socket
+            session.attach(socket)
+            return session, previous, frames
+
+    def detach(self, session, socket, expires):
+        """ Detaches the session from the closed connection unless another one has resumed it """
+
+        with self._lock:
+            if session.socket is not socket or not session.attached:
+                return False
+
+            session.detach(expires)
+            return True
+
+    def expire(self, session, socket, expires):
+        """ Drops the session unless it has been resumed or detached again since """
+
+        with self._lock:
+            if session.attached or session.expires != expires or session.socket is not socket:
+                return False
+
+            dict.pop(self, session.token, None)
+            return True
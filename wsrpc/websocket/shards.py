@@ -0,0 +1,140 @@
+# encoding: utf-8
+""" Connections spread across the IOLoop threads of the one process.
+
+:class:`ShardedHTTPServer` accepts the connections in the current IOLoop
+and hands them over to the shards in turn. Every shard is a thread with its
+own IOLoop and HTTPServer, so the connection is served by the IOLoop of its
+shard only. Routes releasing the GIL (I/O, C extensions) run concurrently.
+"""
+import itertools
+import logging
+import threading
+from multiprocessing import cpu_count
+
+import tornado.httpserver
+import tornado.ioloop
+
+from .tools import itervalues
+
+
+log = logging.getLogger("wsrpc.shards")
+
+
+class Clients(dict):
+    """ Connections of all the shards by id.
+
+    Shards modify it concurrently, so iterate over the :meth:`snapshot`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Clients, self).__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def __setitem__(self, client_id, client):
+        with self._lock:
+            dict.__setitem__(self, client_id, client)
+
+    def __delitem__(self, client_id):
+        with self._lock:
+            dict.__delitem__(self, client_id)
+
+    def pop(self, client_id, *default):
+        with self._lock:
+            return dict.pop(self, client_id, *default)
+
+    def discard(self, client_id, client):
+        """ Removes the client unless its id has been taken by another one (the resumed session) """
+        with self._lock:
+            if dict.get(self, client_id) is client:
+                dict.__delitem__(self, client_id)
+
+    def snapshot(self):
+        with self._lock:
+            return list(itervalues(self))
+
+
+def by_ioloop(clients):
+    """ Groups the connections by the IOLoop they're served by """
+
+    groups = {}
+    for client in clients:
+        group = groups.get(client.ioloop)
+        if group is None:
+            group = groups[client.ioloop] = []
+        group.append(client)
+
+    return groups
+
+
+class Shard(object):
+    """ The IOLoop thread serving the connections handed over by :class:`ShardedHTTPServer` """
+
+    def __init__(self, index, request_callback, **kwargs):
+        self.index = index
+        self.accepted = 0
+        self.ioloop = None
+        self.server = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(request_callback, kwargs), name='wsrpc-shard-{0}'.format(index)
+        )
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        self._started.wait()
+
+    def _run(self, request_callback, kwargs):
+        self.ioloop = tornado.ioloop.IOLoop()
+        self.ioloop.make_current()
+        self.server = tornado.httpserver.HTTPServer(request_callback, **kwargs)
+        self._started.set()
+
+        try:
+            self.ioloop.start()
+        finally:
+            self.ioloop.close(all_fds=True)
+
+    def handle_connection(self, connection, address):
+        self.accepted += 1
+        self.ioloop.add_callback(self.server._handle_connection, connection, address)
+
+    def stop(self):
+        self.ioloop.add_callback(self.ioloop.stop)
+        self._thread.join()
+
+    def __repr__(self):
+        return "<Shard {0}: {1} connections accepted>".format(self.index, self.accepted)
+
+
+class ShardedHTTPServer(tornado.httpserver.HTTPServer):
+    """ HTTPServer which serves the accepted connections in ``shards`` IOLoop threads.
+
+    Accepts the same arguments as HTTPServer except ``io_loop``::
+
+        server = ShardedHTTPServer(application, shards=4)
+        server.listen(8888)
+        tornado.ioloop.IOLoop.current().start()
+
+    Connections are accepted in the current IOLoop. ``stop()`` stops
+    listening and the shards, the connections are closed with them.
+    """
+
+    def initialize(self, request_callback, shards=None, **kwargs):
+        super(ShardedHTTPServer, self).initialize(request_callback, **kwargs)
+
+        self.shards = [Shard(index, request_callback, **kwargs) for index in range(shards or cpu_count())]
+        for shard in self.shards:
+            shard.start()
+
+        self._next_shard = itertools.cycle(self.shards)
+        log.info("Connections are served by %d shards", len(self.shards))
+
+    def _handle_connection(self, connection, address):
+        next(self._next_shard).handle_connection(connection, address)
+
+    def stop(self):
+        super(ShardedHTTPServer, self).stop()
+
+        for shard in self.shards:
+            shard.stop()
@@ -0,0 +1,65 @@
+# encoding: utf-8
+import types
+
+import tornado.gen
+
+try:
+    import builtins
+except ImportError:
+    # Python 2
+    import __builtin__ as builtins
+
+
+StopAsyncIteration = getattr(builtins, 'StopAsyncIteration', None)
+
+
+# Returned by next_chunk when the generator is exhausted
+END = object()
+
+
+def is_stream(obj):
+    return isinstance(obj, types.GeneratorType) or hasattr(obj, '__anext__')
+
+
+def is_async_stream(obj):
+    return hasattr(obj, '__anext__')
+
+
+def next_chunk(generator):
+    try:
+        return next(generator)
+    except StopIteration:
+        return END
+
+
+class Credit(object):
+    """ Chunks the server might send before the client asks for more """
+
+    __slots__ = ('value', 'waiter')
+
+    def __init__(self, value):
+        self.value = value
+        self.waiter = None
+
+    @tornado.gen.coroutine
+    def acquire(self):
+        while self.value <= 0:
+            if self.waiter is None:
+                self.waiter = tornado.gen.Future()
+            yield self.waiter
+
+        self.value -= 1
+
+    def grant(self, value):
+        self.value += value
+        self._wake()
+
+    def cancel(self, exception):
+        waiter, self.waiter = self.waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(exception)
+
+    def _wake(self):
+        waiter, self.waiter = self.waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
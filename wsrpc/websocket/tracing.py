@@ -0,0 +1,154 @@
+# encoding: utf-8
+""" Sampled tracing of the calls.
+
+Sampled calls record the spans of their stages (``decode``, ``wait``,
+``dispatch``, ``queue``, ``execute``, ``encode`` and ``write``) and are exported
+to the sink when the reply is written. The client might pass the trace id
+in the ``trace`` field of the call, it's exposed to the route by
+:func:`current` and carried into the server-to-client calls made by the route.
+"""
+import collections
+import json
+import logging
+import random
+import threading
+
+from .metrics import clock
+
+
+log = logging.getLogger("wsrpc.tracing")
+
+_local = threading.local()
+
+
+def current():
+    """ Trace of the call being executed by the current thread.
+
+    Coroutines should keep it before the first ``yield``, like the
+    :func:`wsrpc.websocket.cancellation.current`. Returns None outside of
+    the calls and for unsampled calls without the client's trace id.
+    """
+    return getattr(_local, 'trace', None)
+
+
+def new_id():
+    return '{0:016x}'.format(random.getrandbits(64))
+
+
+class Trace(object):
+    """ Spans of the one call. Spans of the unsampled trace aren't recorded. """
+
+    __slots__ = ('id', 'call', 'serial', 'client', 'sampled', 'spans', 'error', 'tracer')
+
+    def __init__(self, tracer, trace_id, call, serial, client=None, sampled=True):
+        self.tracer = tracer
+        self.id = trace_id
+        self.call = call
+        self.serial = serial
+        self.client = client
+        self.sampled = sampled
+        self.spans = [] if sampled else None
+        self.error = None
+
+    def span(self, name, start, end=None):
+        if self.sampled:
+            self.spans.append((name, start, clock() if end is None else end))
+
+    def run(self, func):
+        previous = getattr(_local, 'trace', None)
+        _local.trace = self
+
+        try:
+            return func()
+        finally:
+            _local.trace = previous
+
+    @property
+    def duration(self):
+        if not self.spans:
+            return 0.0
+
+        return max(end for _, _, end in self.spans) - min(start for _, start, _ in self.spans)
+
+    def finish(self, error=None):
+        if error is not None:
+            self.error = error
+
+        if self.sampled:
+            self.tracer.export(self)
+
+    def to_dict(self):
+        started = min(start for _, start, _ in self.spans) if self.spans else 0.0
+
+        return {
+            'id': self.id,
+            'call': self.call,
+            'serial': self.serial,
+            'client': self.client,
+            'error': self.error,
+            'duration': self.duration,
+            # Offsets from the start of the trace
+            'spans': [(name, start - started, end - start) for name, start, end in self.spans or ()],
+        }
+
+    def __repr__(self):
+        return "<Trace {0}: {1}{2}>".format(self.id, self.call, '' if self.sampled else ' (unsampled)')
+
+
+class Sink(object):
+    """ Destination of the sampled traces """
+
+    def export(self, trace):
+        raise NotImplementedError
+
+
+class MemorySink(Sink):
+    """ Keeps the last ``limit`` traces, e.g. for tests or the debug page """
+
+    def __init__(self, limit=1000):
+        self.traces = collections.deque(maxlen=limit)
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+    def clear(self):
+        self.traces.clear()
+
+
+class LogSink(Sink):
+    """ Writes the traces as JSON lines to the logger """
+
+    def __init__(self, logger=log, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def export(self, trace):
+        self.logger.log(self.level, json.dumps(trace.to_dict(), sort_keys=True))
+
+
+class Tracer(object):
+    """ Samples ``rate`` (0.0 - 1.0) of the calls and exports them to the ``sink`` """
+
+    def __init__(self, sink, rate=0.01):
+        if not 0 <= rate <= 1:
+            raise ValueError('Sampling rate must be between 0 and 1')
+
+        self.sink = sink
+        self.rate = rate
+
+    def start(self, trace_id, call, serial, client=None):
+        """ Returns the trace of the call or None when the call isn't sampled
+        and the client didn't pass the trace id. """
+
+        sampled = self.rate > 0 and random.random() < self.rate
+
+        if not sampled and trace_id is None:
+            return
+
+        return Trace(self, trace_id or new_id(), call, serial, client, sampled)
+
+    def export(self, trace):
+        try:
+            self.sink.export(trace)
+        except Exception:
+            log.exception("Trace sink %r failed", self.sink)